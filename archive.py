@@ -0,0 +1,234 @@
+from datetime import datetime
+import hashlib
+import io
+import os
+from pathlib import Path, PurePosixPath
+import tarfile
+import zipfile
+
+from page_xml import PageXMLParser
+
+# Names of the archives that convert.py can read a backup from
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+_CHUNK_SIZE = 1024 * 1024
+
+
+def is_archive(path):
+    """True if path is a file whose name shows it is a zip or tar archive."""
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES) and Path(path).is_file()
+
+
+def _copy(source, path):
+    """Writes the file object source to path.  Returns the SHA-1 hash of its contents."""
+    sha1 = hashlib.sha1()
+    with open(path, "wb") as f:
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+            f.write(chunk)
+    return sha1.hexdigest()
+
+def _hash(source):
+    sha1 = hashlib.sha1()
+    for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+        sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class _Member():
+    """A file in an archive.  open() returns a file object of its contents."""
+    def __init__(self, name, size, mtime, open):
+        self.name = name
+        # The parts of the name, without any leading './'
+        self.parts = [part for part in PurePosixPath(name).parts if part not in (".", "/")]
+        self.size = size
+        # In nanoseconds, as in the site catalog
+        self.mtime = mtime
+        self.open = open
+        # Set when the member has been set aside in a temporary file
+        self.path = None
+
+
+def _zip_members(archive):
+    """Yields each file in a zip archive, in order."""
+    for info in archive.infolist():
+        if not info.is_dir():
+            mtime = int(datetime(*info.date_time).timestamp()) * 10**9
+            yield _Member(info.filename, info.file_size, mtime, lambda info=info: archive.open(info))
+
+def _tar_members(archive):
+    """Yields each file in a tar archive, in order.
+
+    The archive is read as a stream, so each member must be read before the next.
+    """
+    for member in archive:
+        if member.isfile():
+            yield _Member(member.name, member.size, int(member.mtime) * 10**9, lambda member=member: archive.extractfile(member))
+
+
+class ArchivedBackup():
+    """A Wikidot backup read from a zip or tar archive, without unpacking it.
+
+    read() goes through the archive once.  It reads the metadata from the pages' .xml
+    files, and streams the pages' associated files straight into the upload directory
+    under their upload names.  The pages' .txt files are read again when they are
+    converted (from a zip archive) or kept in memory (from a tar archive, which can only be
+    read in order).
+
+    The backup's files may be at the top of the archive or inside a single directory.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.is_zip = zipfile.is_zipfile(self.path)
+        # {page: (size, mtime)} of the .txt and .xml files
+        self.text_files = {}
+        self.xml_files = {}
+        # {page: (fullname, title)}
+        self.metadata = {}
+        # {page: {name: (size, mtime)}} of the associated files
+        self.attachments = {}
+        # The files in the upload directory that hold the associated files
+        self.staged_paths = []
+        self._zip = None
+        self._text_members = {}
+        self._texts = {}
+        self._text_hashes = {}
+        self._staged_hashes = {}
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def read(self, upload_dir, include_xml_files=False):
+        """Reads the backup, staging its associated files in upload_dir.
+
+        Associated XML files are only staged if include_xml_files is true.  Files already in
+        upload_dir with the same size and modification time are not written again.
+        """
+        self._upload_dir = Path(upload_dir)
+        self._upload_dir.mkdir(parents=True, exist_ok=True)
+        self._include_xml_files = include_xml_files
+        if self.is_zip:
+            self._zip = zipfile.ZipFile(self.path)
+            members = list(_zip_members(self._zip))
+            # The archive's directory lists every file up front
+            wrapped = not any(len(member.parts) == 1 for member in members)
+            for member in members:
+                self._read_member(member, wrapped)
+        else:
+            with tarfile.open(self.path, "r|*") as archive:
+                self._read_tar(archive)
+
+    def _read_tar(self, archive):
+        # Whether the backup is inside a directory is only known once a file is found at
+        # the top of the archive (so not inside a directory) or three levels down (an
+        # associated file inside a directory).  Until then, files two levels down, which
+        # could be pages or associated files, are set aside.
+        wrapped = None
+        pending = []
+        try:
+            for member in _tar_members(archive):
+                if wrapped is None and len(member.parts) != 2:
+                    wrapped = len(member.parts) >= 3
+                    for pending_member in pending:
+                        self._read_member(pending_member, wrapped)
+                    pending = []
+                if wrapped is None:
+                    pending.append(self._set_aside(member))
+                else:
+                    self._read_member(member, wrapped)
+            # With no file at the top of the archive, the backup is inside a directory
+            for pending_member in pending:
+                self._read_member(pending_member, True)
+        finally:
+            for pending_member in pending:
+                if pending_member.path is not None and pending_member.path.exists():
+                    pending_member.path.unlink()
+
+    def _set_aside(self, member):
+        if member.parts[-1].endswith((".txt", ".xml")):
+            with member.open() as f:
+                contents = f.read()
+            member.open = lambda: io.BytesIO(contents)
+        else:
+            # Possibly a large associated file, so it is kept in the upload directory under
+            # a temporary name
+            member.path = self._upload_dir / f".{'__'.join(member.parts)}.pending"
+            with member.open() as f:
+                _copy(f, member.path)
+            member.open = lambda: open(member.path, "rb")
+        return member
+
+    def _read_member(self, member, wrapped):
+        parts = member.parts[1:] if wrapped else member.parts
+        if len(parts) == 1:
+            stem, extension = os.path.splitext(parts[0])
+            if extension == ".txt":
+                self.text_files[stem] = (member.size, member.mtime)
+                with member.open() as f:
+                    contents = f.read()
+                self._text_hashes[stem] = hashlib.sha1(contents).hexdigest()
+                if self.is_zip:
+                    self._text_members[stem] = member.name
+                else:
+                    self._texts[stem] = contents
+            elif extension == ".xml":
+                self.xml_files[stem] = (member.size, member.mtime)
+                with member.open() as f:
+                    parser = PageXMLParser(f.read())
+                self.metadata[stem] = (parser.fullname, parser.title)
+        elif len(parts) == 2:
+            page, name = parts
+            self.attachments.setdefault(page, {})[name] = (member.size, member.mtime)
+            if not name.endswith(".xml") or self._include_xml_files:
+                self._stage(page+"__"+name, member)
+        if member.path is not None and member.path.exists():
+            member.path.unlink()
+
+    def _stage(self, upload_name, member):
+        upload_path = self._upload_dir / upload_name
+        if upload_name in self._staged_hashes:
+            # Another page's file has already been staged under the same name
+            message = f"A file with the name {upload_name} already exists in {self._upload_dir}."
+            print("  "+message)
+            with member.open() as f:
+                identical = _hash(f) == self._staged_hashes[upload_name]
+            if identical:
+                print("  But the two files are identical.")
+                return
+            print("  And the two files are different.")
+            raise Exception(message)
+
+        try:
+            stat = os.stat(upload_path)
+            unchanged = stat.st_size == member.size and stat.st_mtime_ns == member.mtime
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            # Staged by a previous conversion; the hash is still needed to compare names
+            with member.open() as f:
+                self._staged_hashes[upload_name] = _hash(f)
+        else:
+            print(f"  Extracting {upload_path} from {self.path.name}")
+            # Do not leave a partly written file to be uploaded
+            partial_path = upload_path.with_name(upload_name + ".partial")
+            try:
+                with member.open() as f:
+                    self._staged_hashes[upload_name] = _copy(f, partial_path)
+                os.utime(partial_path, ns=(member.mtime, member.mtime))
+                os.replace(partial_path, upload_path)
+            except BaseException:
+                if partial_path.exists():
+                    partial_path.unlink()
+                raise
+        self.staged_paths.append(upload_path)
+
+    def text_hash(self, page):
+        """The SHA-1 hash of a page's .txt file."""
+        return self._text_hashes[page]
+
+    def read_text(self, page):
+        """The contents of a page's .txt file."""
+        if self.is_zip:
+            return self._zip.read(self._text_members[page]).decode("utf-8")
+        return self._texts[page].decode("utf-8")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# Times upload.py against a local mock MediaWiki API with each number of workers.
+
+import argparse
+import contextlib
+import io
+from pathlib import Path
+import random
+import tempfile
+import time
+
+from catalog import UPLOAD_DIRECTORY
+from mock_mediawiki import MockMediaWiki
+import upload
+
+
+def write_conversion(directory, pages, files, file_size, seed):
+    """Writes a converted site of the given numbers of pages and files, the same for a given seed."""
+    generator = random.Random(seed)
+    directory = Path(directory)
+    (directory / UPLOAD_DIRECTORY).mkdir(parents=True)
+    for page in range(pages):
+        words = " ".join(f"word{generator.randrange(1000)}" for _ in range(200))
+        (directory / f"Page {page}.mktxt").write_text(f"== Page {page} ==\n{words}\n")
+    for file in range(files):
+        (directory / UPLOAD_DIRECTORY / f"page-{file}__file.bin").write_bytes(generator.randbytes(file_size))
+
+
+def time_upload(source, secrets, workers, mock_options, extra_arguments):
+    """Uploads the site to a new mock wiki.  Returns the seconds taken and the mock wiki."""
+    with MockMediaWiki(**mock_options) as mock:
+        Path(secrets).write_text(
+            f"endpoint = {mock.endpoint!r}\n"
+            + "bot_username = 'Benchmark@bot'\n"
+            + "bot_password = 'password'\n"
+            + "verify = True\n"
+        )
+        arguments = [
+            str(source), "--secrets", str(secrets), "--workers", str(workers), "--no-journal"
+        ] + extra_arguments
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            upload.main(arguments)
+        elapsed = time.perf_counter() - start
+    return elapsed, mock
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200, help="Number of pages to upload (default 200)")
+    parser.add_argument("--files", type=int, default=50, help="Number of files to upload (default 50)")
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        default=256,
+        help="Size of each file in KiB (default 256)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Numbers of workers to time"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds the mock wiki takes to answer each request (default 0.05)"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="Requests per second that the mock wiki accepts before refusing them"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests that the mock wiki fails with HTTP 503"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=float,
+        default=None,
+        help="Size in MiB of the chunks in which large files are uploaded"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the site's contents and the mock's failures")
+    arguments = parser.parse_args()
+
+    mock_options = {
+        "latency": arguments.latency,
+        "rate_limit": arguments.rate_limit,
+        "error_rate": arguments.error_rate,
+        "retry_after": 0,
+        "seed": arguments.seed,
+    }
+    extra_arguments = []
+    if arguments.chunk_size is not None:
+        extra_arguments += ["--chunk-size", str(arguments.chunk_size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = Path(directory) / "conversion"
+        write_conversion(source, arguments.pages, arguments.files, arguments.file_size * 1024, arguments.seed)
+        secrets = Path(directory) / "SECRETS.py"
+
+        print(f"{'workers':>7} {'seconds':>9} {'requests':>9} {'requests/s':>11} {'MB/s':>8} {'retries':>8}")
+        for workers in arguments.workers:
+            elapsed, mock = time_upload(source, secrets, workers, mock_options, extra_arguments)
+            if len(mock.pages) != arguments.pages or len(mock.files) != arguments.files:
+                print(f"  Only {len(mock.pages)} pages and {len(mock.files)} files were uploaded")
+            print(
+                f"{workers:>7} {elapsed:>9.2f} {mock.requests:>9} {mock.requests / elapsed:>11.1f} "
+                + f"{mock.bytes_received / elapsed / 1e6:>8.2f} {mock.refused:>8}"
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# Times the conversion of synthetic Wikidot pages and sites by each conversion engine.
+
+import argparse
+import contextlib
+import io
+import json
+from pathlib import Path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import convert
+from generate_corpus import FEATURES, generate_backup, generate_page, parse_weights
+from wikidot import WikidotToMediaWiki, ENGINES
+
+
+def table_page(rows):
+    """A page holding one '||' table of the given number of rows, with coloured cells."""
+    lines = ["+ Data table", "", "||~ Station ||~ Date ||~ Ozone ||"]
+    for row in range(rows):
+        lines.append(f"|| Station {row} || 2022-01-{row % 28 + 1:02} || ##red|{row % 400}## DU ||")
+    lines.append("")
+    lines.append("End of the data.")
+    return "\n".join(lines)
+
+
+def feature_page(feature, blocks, seed):
+    """A page of the given number of blocks, all of one feature."""
+    text, _ = generate_page(random.Random(seed), 100, {feature: 1}, blocks)
+    return text
+
+
+def time_conversion(converter, text, repeat):
+    """Returns the fastest of repeat conversions of text, in seconds."""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            converter.convert(text)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_site(source, engine, repeat):
+    """Returns the fastest of repeat full conversions of a backup by convert.py, in seconds."""
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as dest:
+            arguments = convert.make_parser().parse_args([str(source), dest, "--engine", engine, "--force"])
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                convert.ConversionController(arguments).convert(arguments.source, arguments.dest)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_import(module, repeat):
+    """Returns the fastest of repeat imports of a module by a new interpreter, in seconds."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return min(
+        float(subprocess.run(
+            [sys.executable, "-c", code], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout)
+        for _ in range(repeat)
+    )
+
+
+def compare(results, baseline, tolerance, slack=0.005):
+    """Returns the names of the results more than tolerance (a fraction) slower than the baseline.
+
+    Differences of less than slack seconds are ignored, as the shortest times are mostly noise.
+    """
+    return [
+        name for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + tolerance) + slack
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="Numbers of table rows in the pages to convert"
+    )
+    parser.add_argument(
+        "--blocks",
+        type=int,
+        default=200,
+        help="Number of blocks in each single-feature page (default 200; 0 to skip them)"
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="*",
+        default=[100],
+        help="Numbers of pages in the generated sites converted by convert.py"
+    )
+    parser.add_argument(
+        "--weights",
+        default="",
+        help=f"How often features appear in the generated sites, for example 'table=5'.  Features are {', '.join(FEATURES)}"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to convert each page or site; the fastest time is reported"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        action="append",
+        help="Engine to time (may be given more than once; default is all engines)"
+    )
+    parser.add_argument(
+        "--imports",
+        nargs="*",
+        default=["wikidot", "check", "convert", "upload"],
+        help="Modules whose import time is measured, as each command must import them before it starts"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated pages and sites")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier times to compare against")
+    parser.add_argument(
+        "--save-baseline",
+        default=None,
+        help="JSON file in which to save the times, for later use with --baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Fraction by which a time may exceed the baseline before the benchmark fails (default 0.25)"
+    )
+    arguments = parser.parse_args()
+
+    weights = parse_weights(arguments.weights)
+    engines = arguments.engine or ENGINES
+    results = {}
+
+    def report(engine, kind, size, chars, seconds):
+        name = f"{engine}/{kind}/{size}"
+        results[name] = seconds
+        print(f"{engine:<12} {kind:<10} {size:>8} {chars:>10} {seconds:>9.3f}")
+
+    print(f"{'engine':<12} {'benchmark':<10} {'size':>8} {'chars':>10} {'seconds':>9}")
+    for engine in engines:
+        converter = WikidotToMediaWiki(engine=engine)
+        for rows in arguments.rows:
+            text = table_page(rows)
+            report(engine, "rows", rows, len(text), time_conversion(converter, text, arguments.repeat))
+        if arguments.blocks:
+            for feature in FEATURES:
+                text = feature_page(feature, arguments.blocks, arguments.seed)
+                report(engine, feature, arguments.blocks, len(text), time_conversion(converter, text, arguments.repeat))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in arguments.pages:
+            source = Path(directory) / f"site-{pages}"
+            generate_backup(source, pages, weights, seed=arguments.seed)
+            chars = sum(path.stat().st_size for path in source.glob("*.txt"))
+            for engine in engines:
+                report(engine, "site", pages, chars, time_site(source, engine, arguments.repeat))
+
+    for module in arguments.imports:
+        report("python", "import", module, 0, time_import(module, arguments.repeat))
+
+    if arguments.save_baseline is not None:
+        Path(arguments.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved the times to {arguments.save_baseline}")
+    if arguments.baseline is not None:
+        baseline = json.loads(Path(arguments.baseline).read_text())
+        slower = compare(results, baseline, arguments.tolerance)
+        for name in slower:
+            print(f"{name} took {results[name]:.3f}s, more than {arguments.tolerance:.0%} over the baseline's {baseline[name]:.3f}s")
+        if slower:
+            sys.exit(1)
+        print(f"No times are more than {arguments.tolerance:.0%} over the baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import re
+
+# A list item: indentation (one level for each space or tab) and then '*' or '#'
+_LIST_ITEM = re.compile(r"([ \t]*)([*#])(?=[ \t])")
+# The tags of a [[table]] block, opening ([[table]], [[row]], [[cell]], [[hcell]], any
+# of which may have attributes) or closing
+_TABLE_TAG = re.compile(r"\[\[(?P<closing>/?)(?P<name>table|row|cell|hcell)(?![\w-])(?P<attributes>[^\]]*)\]\]")
+# Wikidot aligns the text of a '||' cell by starting it with '<', '=' or '>' and a space
+_ALIGNMENT = re.compile(r"([<=>])(?=\s)")
+_ALIGNMENTS = {"<": "left", "=": "center", ">": "right"}
+# Anything in a '||' row other than plain cells: a spanning or header cell, or alignment
+_CELL_MARKUP = re.compile(r"\|\|(?:\||~|[<=>]\s)")
+# What a [[table]] block's opening tags start in MediaWiki
+_TABLE_OPENINGS = {"table": "{|", "row": "|-", "cell": "|", "hcell": "!"}
+
+
+class BlockParser():
+    """Converts Wikidot's tables and lists, reading the page once, a line at a time.
+
+    '||' tables (with '||||' spanning columns and '||~' header cells), [[table]] blocks
+    (with their attributes) and '*' and '#' lists (nested by indentation) are converted.
+    What is inside them is left as it is, so the rest of the page must be converted
+    before or after.  The parser keeps track of the table or list it is in from line to
+    line, so nothing is read twice.
+    """
+    def __init__(self):
+        # The number of tables and table tags, and of list items, converted
+        self.matches = 0
+
+    def convert(self, text):
+        """Returns the converted text."""
+        output = []
+        in_simple_table = False
+        # The markers of the list items that enclose the next item, outermost first
+        list_markers = []
+        # The number of [[table]] blocks that the current line is inside
+        table_depth = 0
+        for line in text.split("\n"):
+            if line.startswith("||"):
+                if in_simple_table:
+                    output.append("|-")
+                else:
+                    output.append("{| class=\"wikitable\"")
+                    in_simple_table = True
+                    self.matches += 1
+                output += self._simple_table_row(line)
+                list_markers = []
+                continue
+            if in_simple_table:
+                output.append("|}")
+                in_simple_table = False
+
+            item = _LIST_ITEM.match(line)
+            if item is not None:
+                indent, marker = item.groups()
+                # An item is nested in the items before it that are less indented; items
+                # without enclosing items are nested in items like themselves
+                list_markers = [
+                    list_markers[i] if i < len(list_markers) else marker for i in range(len(indent))
+                ] + [marker]
+                output.append("".join(list_markers) + line[item.end():])
+                self.matches += 1
+                continue
+            list_markers = []
+
+            if "[[" in line:
+                table_depth = self._table_tags(line, table_depth, output)
+            else:
+                output.append(line)
+        if in_simple_table:
+            output.append("|}")
+        return "\n".join(output)
+
+    def _simple_table_row(self, line):
+        """Returns the MediaWiki lines for one '||' row."""
+        line = line.rstrip()
+        if _CELL_MARKUP.search(line) is None:
+            # Plain cells are written as they are
+            return ["| " + line[2 : -2 if line.endswith("||") else None].strip()]
+        parts = line.split("||")[1:]
+        if len(parts) > 0 and parts[-1] == "":
+            parts.pop()
+        cells = []
+        span = 1
+        for part in parts:
+            # An empty cell makes the next cell span one more column
+            if part == "":
+                span += 1
+                continue
+            header = part.startswith("~")
+            if header:
+                part = part[1:]
+            attributes = []
+            if span > 1:
+                attributes.append(f"colspan=\"{span}\"")
+            alignment = _ALIGNMENT.match(part)
+            if alignment is not None:
+                attributes.append(f"style=\"text-align: {_ALIGNMENTS[alignment.group(1)]}\"")
+                part = part[alignment.end():]
+            cells.append((header, " ".join(attributes), part.strip()))
+            span = 1
+
+        formatted = [
+            (f"{attributes} | " if attributes else "") + contents
+            for _, attributes, contents in cells
+        ]
+        if len({header for header, _, _ in cells}) > 1:
+            # Header and ordinary cells cannot share a line
+            return [
+                ("! " if header else "| ") + cell for (header, _, _), cell in zip(cells, formatted)
+            ]
+        if len(cells) > 0 and cells[0][0]:
+            return ["! " + " !! ".join(formatted)]
+        return ["| " + " || ".join(formatted)]
+
+    def _table_tags(self, line, table_depth, output):
+        """Appends a line holding [[table]] tags to output, with each tag starting a line.
+
+        Tags other than [[table]] are only converted inside a [[table]] block.  Returns the
+        number of blocks the next line is inside.
+        """
+        current = ""
+        position = 0
+        for tag in _TABLE_TAG.finditer(line):
+            name = tag.group("name")
+            closing = tag.group("closing") != ""
+            if table_depth == 0 and (closing or name != "table"):
+                continue
+            current += line[position : tag.start()]
+            position = tag.end()
+            self.matches += 1
+            if closing:
+                if name == "table":
+                    if current.strip() != "":
+                        output.append(current.rstrip())
+                    output.append("|}")
+                    current = ""
+                    table_depth -= 1
+                # MediaWiki does not end rows or cells
+                continue
+            if current.strip() != "":
+                output.append(current.rstrip())
+            current = _TABLE_OPENINGS[name]
+            attributes = tag.group("attributes").strip()
+            if attributes != "":
+                current += " " + attributes + (" |" if name in ["cell", "hcell"] else "")
+            if name == "table":
+                table_depth += 1
+        if position == 0:
+            output.append(line)
+        elif (current + line[position:]).strip() != "":
+            output.append((current + line[position:]).rstrip())
+        return table_depth
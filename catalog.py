@@ -0,0 +1,241 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from page_xml import parse_xml_files
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    name TEXT PRIMARY KEY,
+    txt_size INTEGER,
+    txt_mtime INTEGER,
+    xml_size INTEGER,
+    xml_mtime INTEGER,
+    fullname TEXT,
+    title TEXT,
+    has_directory INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    page TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    PRIMARY KEY (page, name)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    name TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+"""
+
+# Kinds of output recorded in the catalog: converted pages and files staged for upload
+PAGE = "page"
+FILE = "file"
+UPLOAD_DIRECTORY = "files_to_upload"
+
+
+def _size_and_mtime(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _scan_files(directory):
+    """Returns {name: os.stat_result} for the regular files in a directory."""
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files[entry.name] = entry.stat()
+    return files
+
+
+class SiteCatalog():
+    """An index of a Wikidot backup and of the converter's output, kept in SQLite.
+
+    The backup is read with a single directory walk.  For every page the catalog holds the
+    sizes and modification times of its .txt and .xml files, its fullname and title, and
+    the names, sizes and modification times of its associated files.  An XML file is only
+    parsed again when its size or modification time has changed.  The catalog also lists
+    the converted pages and the files staged for upload, for use by upload.py.
+    """
+    FILENAME = "site_catalog.sqlite"
+
+    def __init__(self, dest_dir):
+        self.dest_dir = Path(dest_dir)
+        self.path = self.dest_dir / self.FILENAME
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(_SCHEMA)
+
+    @classmethod
+    def exists(cls, dest_dir):
+        return (Path(dest_dir) / cls.FILENAME).is_file()
+
+    def catalogues(self, source):
+        """True if the catalog is of the backup at source."""
+        row = self.connection.execute("SELECT value FROM settings WHERE key = 'source'").fetchone()
+        return row is not None and row[0] == str(Path(source).resolve())
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def scan(self, source_dir):
+        """Updates the catalog from a backup directory.  Returns the XML files that were parsed."""
+        source_dir = Path(source_dir)
+        text_files = {}
+        xml_files = {}
+        directories = set()
+        with os.scandir(source_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.add(entry.name)
+                elif entry.is_file():
+                    stem, extension = os.path.splitext(entry.name)
+                    if extension == ".txt":
+                        text_files[stem] = _size_and_mtime(entry.stat())
+                    elif extension == ".xml":
+                        xml_files[stem] = _size_and_mtime(entry.stat())
+
+        def attachments(name):
+            return {
+                attachment: _size_and_mtime(stat)
+                for attachment, stat in _scan_files(source_dir / name).items()
+            }
+
+        def read_metadata(names):
+            xml_paths = [source_dir / (name+".xml") for name in names]
+            return xml_paths, [(parser.fullname, parser.title) for parser in parse_xml_files(xml_paths)]
+
+        return self._update(source_dir.resolve(), text_files, xml_files, directories, attachments, read_metadata)
+
+    def scan_archive(self, archive):
+        """Updates the catalog from a backup that an ArchivedBackup has read.
+
+        Returns the (notional) paths of the XML files whose metadata changed.
+        """
+        def read_metadata(names):
+            return [archive.path / (name+".xml") for name in names], [archive.metadata[name] for name in names]
+
+        return self._update(
+            archive.path.resolve(),
+            archive.text_files,
+            archive.xml_files,
+            set(archive.attachments),
+            lambda name: archive.attachments[name],
+            read_metadata
+        )
+
+    def _update(self, source, text_files, xml_files, directories, attachments, read_metadata):
+        """Replaces the catalog's pages.
+
+        text_files and xml_files give the (size, mtime) of each page's files.  attachments
+        returns {name: (size, mtime)} for a page's directory, and read_metadata returns the
+        paths and the (fullname, title) of the given pages' XML files.
+        """
+        with self.connection:
+            # A catalog of a different backup cannot be reused
+            source = str(source)
+            row = self.connection.execute("SELECT value FROM settings WHERE key = 'source'").fetchone()
+            if row is None or row[0] != source:
+                self.connection.execute("DELETE FROM pages")
+                self.connection.execute("DELETE FROM attachments")
+                self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('source', ?)", (source,))
+
+            previous = {
+                row[0]: row[1:]
+                for row in self.connection.execute(
+                    "SELECT name, xml_size, xml_mtime, fullname, title FROM pages"
+                )
+            }
+            metadata = {}
+            changed_names = []
+            for name, (size, mtime) in sorted(xml_files.items()):
+                entry = previous.get(name)
+                if entry is not None and entry[0] == size and entry[1] == mtime:
+                    metadata[name] = entry[2:]
+                else:
+                    changed_names.append(name)
+            changed_xml_files, changed_metadata = read_metadata(changed_names)
+            metadata.update(zip(changed_names, changed_metadata))
+
+            self.connection.execute("DELETE FROM pages")
+            self.connection.execute("DELETE FROM attachments")
+            for name in sorted(text_files.keys() | xml_files.keys()):
+                text_size, text_mtime = text_files.get(name, (None, None))
+                xml_size, xml_mtime = xml_files.get(name, (None, None))
+                fullname, title = metadata.get(name, (None, None))
+                has_directory = text_size is not None and name in directories
+                self.connection.execute(
+                    "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (name, text_size, text_mtime, xml_size, xml_mtime, fullname, title, int(has_directory))
+                )
+                if has_directory:
+                    self.connection.executemany(
+                        "INSERT INTO attachments VALUES (?, ?, ?, ?)",
+                        (
+                            (name, attachment, size, mtime)
+                            for attachment, (size, mtime) in attachments(name).items()
+                        )
+                    )
+        return changed_xml_files
+
+    def page_names(self):
+        """The base filenames of the pages that have a .txt file, in order."""
+        return [
+            row[0] for row in
+            self.connection.execute("SELECT name FROM pages WHERE txt_size IS NOT NULL ORDER BY name")
+        ]
+
+    def metadata(self):
+        """(base filename, fullname, title) for every page that has an XML file, in order."""
+        return self.connection.execute(
+            "SELECT name, fullname, title FROM pages WHERE xml_size IS NOT NULL ORDER BY name"
+        ).fetchall()
+
+    def attachments(self, page):
+        """(name, size, mtime) of each of a page's associated files, or None if it has no directory."""
+        row = self.connection.execute("SELECT has_directory FROM pages WHERE name = ?", (page,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return self.connection.execute(
+            "SELECT name, size, mtime FROM attachments WHERE page = ? ORDER BY name", (page,)
+        ).fetchall()
+
+    def scan_outputs(self):
+        """Updates the catalog's list of converted pages and staged files from the destination."""
+        pages = {
+            name: stat for name, stat in _scan_files(self.dest_dir).items()
+            if name.endswith(".mktxt")
+        }
+        upload_dir = self.dest_dir / UPLOAD_DIRECTORY
+        files = _scan_files(upload_dir) if upload_dir.is_dir() else {}
+        with self.connection:
+            self.connection.execute("DELETE FROM outputs")
+            for kind, outputs in ((PAGE, pages), (FILE, files)):
+                self.connection.executemany(
+                    "INSERT INTO outputs VALUES (?, ?, ?, ?)",
+                    ((name, kind, stat.st_size, stat.st_mtime_ns) for name, stat in outputs.items())
+                )
+
+    def record_output(self, kind, path):
+        stat = os.stat(path)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+            (Path(path).name, kind, stat.st_size, stat.st_mtime_ns)
+        )
+
+    def output_sizes(self, kind):
+        """{name: size} of the converted pages (PAGE) or staged files (FILE)."""
+        return dict(self.connection.execute("SELECT name, size FROM outputs WHERE kind = ?", (kind,)))
+
+    def outputs(self, kind):
+        """The names of the converted pages (PAGE) or staged files (FILE), in order."""
+        return [
+            row[0] for row in
+            self.connection.execute("SELECT name FROM outputs WHERE kind = ? ORDER BY name", (kind,))
+        ]
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+# Reports the problems that converting Wikidot pages would find, without writing anything.
+# Quick enough to run on a page each time it is saved.
+
+import argparse
+from pathlib import Path
+
+from includes import Includer, PageSources
+from link_resolver import LinkResolver
+from page_xml import parse_xml_files
+from rules import site_rules
+from wikidot import WikidotToMediaWiki, ENGINES
+
+
+def read_metadata(source_dir):
+    """Returns (base filename, fullname, title) for every page in a backup directory."""
+    xml_files = sorted(source_dir.glob("*.xml"))
+    return [
+        (xml_file.stem, parser.fullname, parser.title)
+        for xml_file, parser in zip(xml_files, parse_xml_files(xml_files))
+    ]
+
+
+def read_catalog(source_dir, dest_dir):
+    """Returns the metadata and page names of a backup from the catalog of an earlier conversion.
+
+    The catalog is first brought up to date, reading only the XML files that have changed.
+    Returns None if dest_dir holds no catalog of the backup.
+    """
+    # Imported here, as most checks of a single page have no conversion to use
+    from catalog import SiteCatalog
+    if not SiteCatalog.exists(dest_dir):
+        return None
+    catalog = SiteCatalog(dest_dir)
+    try:
+        if not catalog.catalogues(source_dir):
+            return None
+        catalog.scan(source_dir)
+        return catalog.metadata(), set(catalog.page_names())
+    finally:
+        catalog.close()
+
+
+def check_page(converter, input_file, link_resolver):
+    """Converts a page without writing it, printing its problems.  Returns the number of problems."""
+    print(f"Checking page {input_file.stem}")
+    text = input_file.read_text(encoding="utf-8")
+    includer = converter.includer
+    failures = includer.failures
+    with link_resolver.recording() as resolved_links, includer.recording(input_file.stem):
+        _, _, linked_files = converter.convert(
+            text, file_prefix=input_file.stem+"__", link_resolver=link_resolver
+        )
+    # The converter has printed the links and includes that failed
+    problems = list(resolved_links.values()).count(None) + includer.failures - failures
+    associated_dir = input_file.parent / input_file.stem
+    for linked_file in linked_files:
+        if not (associated_dir / linked_file).is_file():
+            print("  Linked file not found in associated dir:", linked_file)
+            problems += 1
+    return problems
+
+
+def make_parser(prog=None):
+    """Returns the parser of check.py's command-line arguments."""
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument(
+        "source",
+        nargs="+",
+        help="Directory containing the Wikidot backup, or the .txt files of pages in a backup"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="cascade",
+        help="Conversion engine to check with (default cascade)"
+    )
+    parser.add_argument(
+        "--dest",
+        default=None,
+        help="Destination of an earlier conversion of the backup, whose catalog of page titles is "
+             "used instead of reading every page's XML file"
+    )
+    parser.add_argument(
+        "--rules",
+        default=None,
+        help="Python file that adds site-specific conversion rules to the registry 'rules'"
+    )
+    parser.add_argument(
+        "--disable-rule",
+        default=[],
+        action="append",
+        metavar="NAME",
+        help="Disable the named conversion rule (may be given more than once)"
+    )
+    return parser
+
+
+def main(argv=None, prog=None):
+    """Checks the pages.  Returns 1 if any problems were found, otherwise 0."""
+    arguments = make_parser(prog).parse_args(argv)
+    sources = [Path(source) for source in arguments.source]
+    if len(sources) == 1 and sources[0].is_dir():
+        source_dir = sources[0]
+        input_files = sorted(source_dir.glob("*.txt"))
+    else:
+        input_files = sources
+        source_dirs = {input_file.parent for input_file in input_files}
+        if len(source_dirs) != 1:
+            raise Exception("Pages to check should all be in the same backup directory")
+        source_dir = source_dirs.pop()
+
+    # Links and includes are resolved against the whole site, as by convert.py
+    catalogued = None if arguments.dest is None else read_catalog(source_dir, Path(arguments.dest))
+    if catalogued is not None:
+        metadata, page_names = catalogued
+    else:
+        if arguments.dest is not None:
+            print(f"No catalog of {source_dir} in {arguments.dest}, so reading every page's XML file")
+        metadata = read_metadata(source_dir)
+        page_names = {path.stem for path in source_dir.glob("*.txt")}
+    link_resolver = LinkResolver()
+    for filename, fullname, title in metadata:
+        link_resolver.add(fullname, title)
+        if fullname != filename:
+            link_resolver.add(filename, title)
+    page_sources = PageSources([row for row in metadata if row[0] in page_names], source_dir)
+    rules = site_rules(arguments.rules, arguments.disable_rule)
+    converter = WikidotToMediaWiki(engine=arguments.engine, rules=rules, includer=Includer(page_sources))
+
+    problems = 0
+    for input_file in input_files:
+        problems += check_page(converter, input_file, link_resolver)
+    print(f"Found {problems} problems in {len(input_files)} pages")
+    return 1 if problems > 0 else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -9,14 +9,51 @@
 
 import codecs			## for codecs.open()
 import argparse
+import hashlib
+import contextlib
+import io
 from pathlib import Path
-import shutil
 from datetime import datetime
 
-import regex
-
-from wikidot import WikidotToMediaWiki
-from page_xml import PageXMLParser
+from wikidot import WikidotToMediaWiki, ENGINES
+from catalog import SiteCatalog, PAGE, FILE, UPLOAD_DIRECTORY
+from includes import Includer, PageSources, include_targets
+from link_resolver import LinkResolver
+from manifest import ConversionManifest, hash_file
+from rules import site_rules
+from staging import StagedFiles, FileStager, STAGE_MODES
+
+
+# What is printed as each associated file is staged, for each stage mode
+_STAGE_MESSAGES = {
+    "copy": "Copying",
+    "hardlink": "Hard linking",
+    "reflink": "Cloning",
+    "symlink": "Symbolically linking",
+}
+
+
+class ConvertedPage():
+    """The result of converting one page, before anything is written to the destination."""
+    def __init__(self, title, file_prefix, converted_text, internal_links, linked_files, associated_paths,
+                 resolved_links):
+        self.title = title
+        self.file_prefix = file_prefix
+        self.converted_text = converted_text
+        self.internal_links = internal_links
+        self.linked_files = linked_files
+        self.associated_paths = associated_paths
+        # The title (or None) that each internal link resolved to
+        self.resolved_links = resolved_links
+        # Console output of the conversion, when it ran in a worker process
+        self.messages = None
+        # The page's PageProfile, when convert.py is run with --profile
+        self.profile = None
+        # The base filenames of the pages included in the page, directly or not
+        self.included_pages = []
+        # How many conversions of included pages were reused, and how many were made
+        self.include_hits = 0
+        self.include_misses = 0
 
 
 class ConversionController():
@@ -25,28 +62,39 @@ class ConversionController():
         # self.__output_directory = options.output_dir
         # self.__fill_blog = options.blog
         # self.__create_individual_files = options.individual
-        self.__converter = WikidotToMediaWiki()
+        if arguments.rules is not None:
+            print(f"Loading conversion rules from {arguments.rules}")
+        rules = site_rules(arguments.rules, arguments.disable_rule)
+        self.__converter = WikidotToMediaWiki(engine=arguments.engine, rules=rules)
+        self.__includer = None
         self.__args = arguments
 
-    def __get_xml_files(self, source):
+    def use_page_sources(self, page_sources):
+        """Expands the [[include]]s in pages with the pages found in page_sources."""
+        self.__includer = Includer(page_sources)
+        self.__converter.includer = self.__includer
+
+    def __get_source_dir(self, source):
         source = Path(source)
         if source.is_dir():
-            xml_files = sorted(source.glob("*.xml"))
+            return source
         elif source.is_file():
-            xml_files = [source.parent / (source.stem+".xml")]
+            if source.suffix != ".txt":
+                from archive import ArchivedBackup, is_archive
+                if is_archive(source):
+                    # Pages in an archive are named as if the archive were a directory
+                    self.__archive = ArchivedBackup(source)
+                    return source
+            return source.parent
         else:
             raise Exception(f"Source ({source}) should be either a directory or file")
 
-        return xml_files
-
-    def __get_text_files(self, source):
+    def __get_text_files(self, source, source_dir):
         source = Path(source)
-        if source.is_dir():
-            input_files = sorted(source.glob("*.txt"))
-        elif source.is_file():
-            input_files = [source]
+        if source.is_dir() or self.__archive is not None:
+            input_files = [source_dir / (name+".txt") for name in self.__catalog.page_names()]
         else:
-            raise Exception(f"Source ({source}) should be either a directory or file")
+            input_files = [source]
 
         print("Input files for pages:")
         for input_file in input_files:
@@ -66,9 +114,63 @@ class ConversionController():
         return dest_dir
 
     def convert(self, source, dest):
-        input_files = self.__get_text_files(source)
-        xml_files = self.__get_xml_files(source)
+        self.__archive = None
+        source_dir = self.__get_source_dir(source)
         dest_dir = self.__process_dest(dest)
+        self.__catalog = SiteCatalog(dest_dir)
+        self.__stager = FileStager(self.__args.stage_mode)
+        self.__staged_paths = []
+        self.__dump = None
+        try:
+            if self.__args.export_xml is not None:
+                # Modules that only some conversions need are imported when they are used,
+                # to keep the converter quick to start
+                from xml_export import DumpWriter
+                self.__dump = DumpWriter(self.__args.export_xml)
+            self.__convert(source, source_dir, dest_dir)
+        finally:
+            try:
+                self.__stager.close()
+            finally:
+                for upload_path in self.__staged_paths:
+                    if upload_path.exists():
+                        self.__catalog.record_output(FILE, upload_path)
+                if self.__dump is not None:
+                    self.__dump.close()
+                if self.__archive is not None:
+                    self.__archive.close()
+                self.__catalog.close()
+        if self.__dump is not None:
+            self.__write_import_instructions(dest_dir)
+
+    def __write_import_instructions(self, dest_dir):
+        from xml_export import FILE_MANIFEST, write_file_manifest, import_commands
+        upload_dir = dest_dir / UPLOAD_DIRECTORY
+        print(f"Wrote {self.__dump.pages} pages to {self.__dump.path}")
+        extensions = set()
+        if upload_dir.is_dir():
+            extensions = write_file_manifest(upload_dir, dest_dir / FILE_MANIFEST)
+            print(f"Listed the files to import in {dest_dir / FILE_MANIFEST}")
+        print("To import the site on the wiki's server, run from MediaWiki's directory:")
+        for command in import_commands(Path(self.__dump.path).resolve(), upload_dir.resolve(), extensions):
+            print(f"  {command}")
+
+    def __convert(self, source, source_dir, dest_dir):
+        # Even when converting a single page, the whole site is catalogued so links resolve
+        if self.__archive is not None:
+            # The associated files are staged as the archive is read, so they are copied
+            # whatever the stage mode
+            print(f"Reading {source_dir} and extracting its associated files")
+            self.__archive.read(dest_dir / UPLOAD_DIRECTORY, self.__args.include_associated_xml_files)
+            self.__staged_paths += self.__archive.staged_paths
+            print(f"Cataloguing {source_dir}")
+            parsed_xml_files = self.__catalog.scan_archive(self.__archive)
+        else:
+            print(f"Cataloguing {source_dir}")
+            parsed_xml_files = self.__catalog.scan(source_dir)
+        self.__catalog.scan_outputs()
+        self.__staged_files = StagedFiles(dest_dir / UPLOAD_DIRECTORY, self.__catalog.output_sizes(FILE))
+        input_files = self.__get_text_files(source, source_dir)
         internal_links_map = {}
 
         if self.__args.include_associated_xml_files:
@@ -78,105 +180,160 @@ class ConversionController():
 
         # Go through the xml files.  Obtain a map from filename to title
         print(f"Processing metadata from XML files:")
-        fullname_to_title = {}
-        for xml_file in xml_files:
+        link_resolver = LinkResolver()
+        metadata_hashes = {}
+        for xml_file in parsed_xml_files:
             print(f"  Processing {xml_file}")
-            page_xml_parser = PageXMLParser(xml_file.read_text())
-            title = page_xml_parser.title
+        for filename, fullname, title in self.__catalog.metadata():
             #title = regex.sub(" ", "_", title)
-            fullname = page_xml_parser.fullname
             print(f"  {fullname}: '{title}'")
-            fullname_to_title[fullname] = title
+            metadata_hashes[filename] = hashlib.sha1(f"{fullname}\n{title}".encode("utf-8")).hexdigest()
+            link_resolver.add(fullname, title)
             # It's possible the filename could be used as the fullname too,
             # just make sure it doesn't just exist in the map
-            filename = xml_file.stem
             if fullname != filename:
-                assert filename not in fullname_to_title
-                fullname_to_title[filename] = title
-
-        # Go through the txt files
+                assert filename not in link_resolver
+                link_resolver.add(filename, title)
+
+        # Included pages are read from the source directory, or from the archive below
+        page_names = set(self.__catalog.page_names())
+        page_sources = PageSources(
+            [row for row in self.__catalog.metadata() if row[0] in page_names],
+            None if self.__archive is not None else source_dir
+        )
+        self.use_page_sources(page_sources)
+
+        # Find the pages whose inputs have not changed since they were last converted
+        manifest = ConversionManifest(dest_dir)
+        if self.__args.force:
+            manifest.pages = {}
+        fingerprint = f"{self.__converter.fingerprint()}:{int(self.__args.include_associated_xml_files)}"
+        signatures = {}
+        associated_paths = {}
+        unchanged_files = set()
         for input_file in input_files:
-            print(f"Processing page {input_file.stem}")
+            attachments = self.__catalog.attachments(input_file.stem)
+            if attachments is None:
+                associated_paths[input_file] = None
+            else:
+                associated_paths[input_file] = [input_file.parent / input_file.stem / a[0] for a in attachments]
+            signature = ConversionManifest.signature(
+                input_file,
+                metadata_hashes.get(input_file.stem),
+                fingerprint,
+                attachments or [],
+                input_hash=None if self.__archive is None else self.__archive.text_hash(input_file.stem)
+            )
+            signatures[input_file] = signature
+        # A page is also converted again if any page it includes has changed
+        input_hashes = {f.stem: signatures[f]["input"] for f in input_files}
+        for input_file in input_files:
+            entry = manifest.pages.get(input_file.stem, {})
+            self.__add_input_hashes(input_hashes, entry.get("included_pages", {}), source_dir)
+            if manifest.is_current(input_file.stem, signatures[input_file], link_resolver, dest_dir, input_hashes):
+                unchanged_files.add(input_file)
+        changed_files = [f for f in input_files if f not in unchanged_files]
+        if len(unchanged_files) > 0:
+            print(f"{len(unchanged_files)} pages are unchanged since they were last converted")
+        if self.__archive is not None:
+            page_sources.texts = self.__read_included_texts(changed_files, page_sources)
+
+        # Go through the changed txt files, converting them in worker processes if requested
+        if self.__args.jobs > 1:
+            print(f"Converting pages with {self.__args.jobs} processes")
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(
+                max_workers=self.__args.jobs,
+                initializer=_init_worker,
+                initargs=(self.__args, link_resolver, page_sources)
+            )
+            chunksize = max(1, min(64, len(changed_files) // (self.__args.jobs * 4)))
+            pages = executor.map(
+                _convert_page_in_worker,
+                changed_files,
+                [associated_paths[f] for f in changed_files],
+                [self.__read_archived_text(f) for f in changed_files],
+                chunksize=chunksize
+            )
+        else:
+            executor = None
+            pages = (
+                self.convert_page(
+                    input_file, link_resolver, associated_paths[input_file], self.__read_archived_text(input_file)
+                )
+                for input_file in changed_files
+            )
 
-            # Read associated XML file to obtain the fullname and title.  Hypens and spaces make 
-            # it impossible to automatically convert from the fullname to the title.
+        profile = None
+        if self.__args.profile:
+            from profiling import ConversionProfile
+            profile = ConversionProfile()
+        try:
+            for input_file in input_files:
+                base_filename = input_file.stem
+                if input_file in unchanged_files:
+                    entry = manifest.pages[base_filename]
+                    print(f"Skipping unchanged page {base_filename}")
+                    internal_links_map[entry["title"]] = entry["internal_links"]
+                    if self.__dump is not None:
+                        # The page is exported from its earlier conversion
+                        output_file = dest_dir / (entry["title"]+'.mktxt')
+                        self.__dump.write_page(entry["title"], output_file.read_text(encoding="utf-8"))
+                    # Restore any staged files that have since been removed
+                    self.__stage_associated_files(
+                        base_filename+"__", associated_paths[input_file] or [], dest_dir, only_missing=True
+                    )
+                    continue
 
-            f = codecs.open(input_file, encoding='utf-8')
-            text = f.read()
-            base_filename = input_file.stem
-            assert base_filename in fullname_to_title
+                page = next(pages)
+                # Messages from worker processes are printed in page order
+                if page.messages is not None:
+                    print(page.messages, end="")
+                if executor is not None:
+                    # Each worker process has its own includer
+                    self.__includer.hits += page.include_hits
+                    self.__includer.misses += page.include_misses
+                internal_links_map[page.title] = page.internal_links
+                if profile is not None:
+                    profile.add(page.profile)
+                # Associated files that have not changed since the last run are not copied again
+                previous = manifest.pages.get(base_filename)
+                unchanged_associated = (
+                    previous is not None
+                    and previous["signature"]["associated"] == signatures[input_file]["associated"]
+                )
+                self.__stage_associated_files(
+                    page.file_prefix, page.associated_paths, dest_dir, only_missing=unchanged_associated
+                )
 
-            file_prefix = base_filename+"__"
-            converted_text, internal_links, linked_files = self.__converter.convert(
-                text, file_prefix=file_prefix, fullname_to_title=fullname_to_title
+                # Write converted text
+                output_file = dest_dir / (page.title+'.mktxt')
+                print(f"  Writing {output_file}")
+                self.write_unicode_file(output_file, page.converted_text)
+                self.__catalog.record_output(PAGE, output_file)
+                if self.__dump is not None:
+                    self.__dump.write_page(page.title, page.converted_text)
+                self.__add_input_hashes(input_hashes, page.included_pages or [], source_dir)
+                manifest.record(base_filename, signatures[input_file], page, input_hashes)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            # When a single page is converted, the other pages in the backup are kept
+            manifest.prune(page_names)
+            manifest.save()
+        if self.__includer.misses > 0:
+            print(
+                f"Converted {self.__includer.misses} included pages and reused "
+                + f"{self.__includer.hits} earlier conversions of them"
             )
-            internal_links_map[fullname_to_title[base_filename]] = internal_links
 
-            # Get associated files
-            associated_dir = input_file.parent / input_file.stem
-            if not associated_dir.is_dir():
-                print(f"  Did not find directory of associated files at {associated_dir}")
-                associated_files = []
-                associated_paths = []
-            else:
-                associated_paths = sorted(associated_dir.glob("*"))
-                associated_files = [f.name for f in associated_paths]
-
-            # Check that all files linked in the text can be found in the associated files
-            for linked_file in linked_files:
-                if linked_file not in associated_files:
-                    print("  Linked file not found in associated dir:", linked_file)
-
-            # Check that all associated files have been linked
-            unlinked_associated_files = []
-            for associated_file in associated_files:
-                if associated_file not in linked_files:
-                    xml_file = associated_file.split(".")[-1] == "xml"
-                    if xml_file and not self.__args.include_associated_xml_files:
-                        continue
-                    print("  Associated file not found in linked files:", associated_file)
-                    unlinked_associated_files.append(associated_file)
-
-            # Add any unlinked associated files to text
-            if len(unlinked_associated_files) > 0:
-                appendix = (
-                    "\n== Unlinked Associated Files ==\n"
-                    + "In Wikidot, there were files associated with this page that were not linked in the text above:\n"
-                )
-                for unlinked_associated_file in unlinked_associated_files:
-                    appendix += "* [[Media:"+file_prefix+unlinked_associated_file+"|"+unlinked_associated_file+"]]\n"
-                converted_text = converted_text + appendix
-                print("  Added appendix to converted text listing unlinked associated files")
-
-            # Copy all associated files to upload
-            upload_dir = dest_dir / "files_to_upload"
-            upload_dir.mkdir(parents=True, exist_ok=True)
-            existing_files = [f.name for f in sorted(upload_dir.glob("*"))]
-            for associated_path in associated_paths:
-                xml_file = associated_path.suffix == ".xml"
-                if xml_file and not self.__args.include_associated_xml_files:
-                    continue
-                if associated_path.name in existing_files:
-                    message = f"A file with the name {associated_path.name} already exists in {upload_dir}."
-                    print("  "+message)
-                    # Check if the files are identical
-                    associated_bytes = associated_path.read_bytes()
-                    upload_bytes = (upload_dir / associated_path.name).read_bytes()
-                    if associated_bytes == upload_bytes:
-                        print("  But the two files are identical.")
-                        continue
-                    else:
-                        print("  And the two files are different.")
-                        raise Exception(message)
-
-                upload_path = upload_dir / (file_prefix+associated_path.name)
-                print(f"  Copying {associated_path} to {upload_path}")
-                shutil.copy(associated_path, upload_path)
-
-            # Write converted text
-            output_file = dest_dir / (fullname_to_title[base_filename]+'.mktxt')
-            print(f"  Writing {output_file}")
-            self.write_unicode_file(output_file, converted_text)
+        # When a single page is converted, the report still lists the rest of the site, as
+        # it was when last converted
+        converted_names = {f.stem for f in input_files}
+        for base_filename in sorted(page_names - converted_names):
+            entry = manifest.pages.get(base_filename)
+            if entry is not None:
+                internal_links_map.setdefault(entry["title"], entry["internal_links"])
 
         # Find orphaned pages
         orphaned_pages = {page:True for page in internal_links_map.keys()}
@@ -188,7 +345,7 @@ class ConversionController():
         # Create page of pages that were processed, highlighting orphaned pages
         processed_pages = (
             "[https://github.com/bodekerscientific/wikidot-to-mediawiki Wikidot-to-MediaWiki] ran at "
-            + f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.  It processed the following {len(input_files)} pages:\n"
+            + f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.  It processed the following {len(internal_links_map)} pages:\n"
         )
         any_orphaned = False
         pages = sorted(orphaned_pages.keys(), key=str.lower)
@@ -204,7 +361,169 @@ class ConversionController():
         print("Writing report of conversion")
         output_file = dest_dir / "Wikidot_to_MediaWiki_report.mktxt"
         self.write_unicode_file(output_file, processed_pages)
+        self.__catalog.record_output(PAGE, output_file)
+        if self.__dump is not None:
+            self.__dump.write_page(output_file.stem, processed_pages)
+
+        if profile is not None:
+            from profiling import PROFILE_JSON, PROFILE_CSV
+            profile.print_summary()
+            profile.write(dest_dir)
+            print(f"Wrote profile of conversion to {dest_dir / PROFILE_JSON} and {dest_dir / PROFILE_CSV}")
+
+
+    def __add_input_hashes(self, input_hashes, base_filenames, source_dir):
+        """Adds the hashes of the .txt files of the given pages that are not in input_hashes.
+
+        When a single page is converted only its own hash is known, so the hashes of the
+        pages it includes are found when they are needed.
+        """
+        for base_filename in base_filenames:
+            if base_filename not in input_hashes:
+                input_file = source_dir / (base_filename+".txt")
+                input_hashes[base_filename] = hash_file(input_file) if input_file.is_file() else None
+
+    def __read_archived_text(self, input_file):
+        """The text of a page in an archive, or None if the source is not an archive."""
+        if self.__archive is None:
+            return None
+        return self.__archive.read_text(input_file.stem)
+
+    def __read_included_texts(self, changed_files, page_sources):
+        """Reads the text of every page in the archive that the changed pages include, directly or not."""
+        texts = {}
+        included = set()
+        pending = [f.stem for f in changed_files]
+        while len(pending) > 0:
+            name = pending.pop()
+            if name in texts:
+                continue
+            texts[name] = self.__archive.read_text(name)
+            for target in include_targets(texts[name]):
+                filename = page_sources.find(target)
+                if filename is not None:
+                    included.add(filename)
+                    pending.append(filename)
+        return {name: texts[name] for name in included}
+
+    def convert_page(self, input_file, link_resolver, associated_paths, text=None):
+        """Converts one page, without writing anything to the destination directory.
+
+        associated_paths lists the page's associated files, or is None if the page has no
+        directory of associated files.  text is the page's text, if it is not to be read
+        from input_file.
+        """
+        print(f"Processing page {input_file.stem}")
+
+        # Read associated XML file to obtain the fullname and title.  Hypens and spaces make 
+        # it impossible to automatically convert from the fullname to the title.
+
+        if text is None:
+            f = codecs.open(input_file, encoding='utf-8')
+            text = f.read()
+        base_filename = input_file.stem
+        assert base_filename in link_resolver
+
+        file_prefix = base_filename+"__"
+        profile = None
+        if self.__args.profile:
+            from profiling import PageProfile
+            profile = PageProfile(base_filename)
+        if self.__includer is not None:
+            recording_includes = self.__includer.recording(base_filename)
+            include_counts = (self.__includer.hits, self.__includer.misses)
+        else:
+            recording_includes = contextlib.nullcontext(set())
+        with link_resolver.recording() as resolved_links, recording_includes as included_pages:
+            converted_text, internal_links, linked_files = self.__converter.convert(
+                text, file_prefix=file_prefix, link_resolver=link_resolver, profile=profile
+            )
 
+        # Get associated files
+        if associated_paths is None:
+            associated_dir = input_file.parent / input_file.stem
+            print(f"  Did not find directory of associated files at {associated_dir}")
+            associated_paths = []
+        associated_files = [f.name for f in associated_paths]
+        associated_file_set = set(associated_files)
+        linked_file_set = set(linked_files)
+
+        # Check that all files linked in the text can be found in the associated files
+        for linked_file in linked_files:
+            if linked_file not in associated_file_set:
+                print("  Linked file not found in associated dir:", linked_file)
+
+        # Check that all associated files have been linked
+        unlinked_associated_files = []
+        for associated_file in associated_files:
+            if associated_file not in linked_file_set:
+                xml_file = associated_file.split(".")[-1] == "xml"
+                if xml_file and not self.__args.include_associated_xml_files:
+                    continue
+                print("  Associated file not found in linked files:", associated_file)
+                unlinked_associated_files.append(associated_file)
+
+        # Add any unlinked associated files to text
+        if len(unlinked_associated_files) > 0:
+            appendix = (
+                "\n== Unlinked Associated Files ==\n"
+                + "In Wikidot, there were files associated with this page that were not linked in the text above:\n"
+            )
+            for unlinked_associated_file in unlinked_associated_files:
+                appendix += "* [[Media:"+file_prefix+unlinked_associated_file+"|"+unlinked_associated_file+"]]\n"
+            converted_text = converted_text + appendix
+            print("  Added appendix to converted text listing unlinked associated files")
+
+        page = ConvertedPage(
+            title=link_resolver[base_filename],
+            file_prefix=file_prefix,
+            converted_text=converted_text,
+            internal_links=internal_links,
+            linked_files=linked_files,
+            associated_paths=associated_paths,
+            resolved_links=resolved_links
+        )
+        page.profile = profile
+        page.included_pages = sorted(included_pages)
+        if self.__includer is not None:
+            page.include_hits = self.__includer.hits - include_counts[0]
+            page.include_misses = self.__includer.misses - include_counts[1]
+        return page
+
+    def __stage_associated_files(self, file_prefix, associated_paths, dest_dir, only_missing=False):
+        if self.__archive is not None:
+            # Already extracted as the archive was read
+            return
+        # Copy all associated files to upload
+        upload_dir = dest_dir / UPLOAD_DIRECTORY
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        staged_files = self.__staged_files
+        for associated_path in associated_paths:
+            xml_file = associated_path.suffix == ".xml"
+            if xml_file and not self.__args.include_associated_xml_files:
+                continue
+            upload_name = file_prefix+associated_path.name
+            if only_missing and upload_name in staged_files and staged_files[upload_name].source is None:
+                # Already staged by a previous conversion
+                staged_files[upload_name].source = associated_path
+                continue
+            # Another page's file may already have been staged under the same name
+            if upload_name in staged_files and staged_files[upload_name].source not in (None, associated_path):
+                message = f"A file with the name {upload_name} already exists in {upload_dir}."
+                print("  "+message)
+                # Check if the files are identical
+                if staged_files.is_identical(upload_name, associated_path):
+                    print("  But the two files are identical.")
+                    continue
+                else:
+                    print("  And the two files are different.")
+                    raise Exception(message)
+
+            upload_path = upload_dir / upload_name
+            print(f"  {_STAGE_MESSAGES[self.__stager.mode]} {associated_path} to {upload_path}")
+            self.__stager.stage(associated_path, upload_path)
+            staged_files.add(upload_name, source=associated_path)
+            self.__staged_paths.append(upload_path)
 
     def write_unicode_file(self, path_to_file, content):
         try:
@@ -214,11 +533,34 @@ class ConversionController():
             print("Error on writing to file %s." % path_to_file)
 
 
-def main():
-    """ Main function called to start the conversion."""
-    parser = argparse.ArgumentParser()
+# Each worker process has its own controller and link resolver, set up once by _init_worker
+_worker_controller = None
+_worker_link_resolver = None
 
-    parser.add_argument('source', help="File or directory containing source files from Wikidot site")
+def _init_worker(arguments, link_resolver, page_sources):
+    global _worker_controller, _worker_link_resolver
+    # Rules files announce themselves when loaded; the parent has already said so
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_controller = ConversionController(arguments)
+    _worker_controller.use_page_sources(page_sources)
+    _worker_link_resolver = link_resolver
+
+def _convert_page_in_worker(input_file, associated_paths, text):
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        page = _worker_controller.convert_page(input_file, _worker_link_resolver, associated_paths, text)
+    page.messages = messages.getvalue()
+    return page
+
+
+def make_parser(prog=None):
+    """Returns the parser of convert.py's command-line arguments."""
+    parser = argparse.ArgumentParser(prog=prog)
+
+    parser.add_argument(
+        'source',
+        help="File or directory containing source files from Wikidot site, or a .zip or .tar(.gz) archive of them"
+    )
     parser.add_argument('dest', help="Directory to output files converted to MediaWiki format")
     parser.add_argument(
         "-x",
@@ -227,7 +569,64 @@ def main():
         action='store_true',
         help="Include any XML files in the files associated with source files"
     )
-    arguments = parser.parse_args()
+    parser.add_argument(
+        "--engine",
+        default="cascade",
+        choices=ENGINES,
+        help="Conversion engine: the original rule-by-rule cascade, or the single-pass tokenizer"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to convert pages (default 1)"
+    )
+    parser.add_argument(
+        "--stage-mode",
+        default="copy",
+        choices=STAGE_MODES,
+        help="How associated files are placed in files_to_upload: copied, or hard, copy-on-write or "
+             "symbolic links to the originals (falls back to copying if unsupported)"
+    )
+    parser.add_argument(
+        "--force",
+        default=False,
+        action="store_true",
+        help="Convert every page, even those unchanged since they were last converted"
+    )
+    parser.add_argument(
+        "--export-xml",
+        default=None,
+        metavar="FILE",
+        help="Also write the converted pages to FILE as a MediaWiki export (compressed if FILE ends "
+             "in .gz or .bz2) for importDump.php, and list the files to upload for importImages.php"
+    )
+    parser.add_argument(
+        "--profile",
+        default=False,
+        action="store_true",
+        help="Time each conversion rule on each page, print the slowest pages and rules, and write "
+             "the timings to JSON and CSV files in the destination (use with --force to profile every page)"
+    )
+    parser.add_argument(
+        "--rules",
+        default=None,
+        help="Python file that adds site-specific conversion rules to the registry 'rules'"
+    )
+    parser.add_argument(
+        "--disable-rule",
+        default=[],
+        action="append",
+        metavar="NAME",
+        help="Disable the named conversion rule (may be given more than once)"
+    )
+    return parser
+
+
+def main(argv=None, prog=None):
+    """ Main function called to start the conversion."""
+    arguments = make_parser(prog).parse_args(argv)
 
     converter = ConversionController(arguments)
     converter.convert(arguments.source, arguments.dest)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Generates a synthetic Wikidot backup, for benchmarking the converter.
+
+import argparse
+from pathlib import Path
+import random
+
+# How often each feature appears, relative to the others
+DEFAULT_WEIGHTS = {
+    "text": 10,
+    "heading": 3,
+    "list": 3,
+    "link": 4,
+    "table": 2,
+    "code": 1,
+    "math": 0.5,
+    "image": 1,
+    "gallery": 0.3,
+    "file": 1,
+}
+FEATURES = list(DEFAULT_WEIGHTS)
+
+_WORDS = (
+    "ozone column station measurement instrument record season calibration retrieval profile "
+    "stratosphere satellite dataset analysis trend model ensemble forcing anomaly climate"
+).split()
+
+
+def parse_weights(text):
+    """Returns the default weights, updated by a string such as "table=5,code=2"."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, text.split(",")):
+        feature, _, weight = item.partition("=")
+        feature = feature.strip()
+        if feature not in weights:
+            raise ValueError(f"Unknown feature '{feature}'; features are {', '.join(FEATURES)}")
+        weights[feature] = float(weight)
+    return weights
+
+
+class PageGenerator():
+    """Writes the blocks of a page.  Each method returns the block's text and its attachments."""
+    def __init__(self, generator, pages):
+        self.generator = generator
+        self.pages = pages
+
+    def words(self, count):
+        return " ".join(self.generator.choice(_WORDS) for _ in range(count))
+
+    def attachment(self, size=2048):
+        return self.generator.randbytes(self.generator.randrange(size // 2, size))
+
+    def text(self, index):
+        sentences = []
+        for _ in range(self.generator.randrange(3, 8)):
+            style = self.generator.choice(["**{}**", "//{}//", "__{}__", "^^{}^^", "{{{}}}", "{}", "{}"])
+            sentences.append(f"{self.words(6)} {style.format(self.words(2))} {self.words(5)}.")
+        return " ".join(sentences), {}
+
+    def heading(self, index):
+        return "+" * self.generator.randrange(1, 4) + " " + self.words(3).title(), {}
+
+    def list(self, index):
+        lines = [f"{'*' if i % 2 else '#'} {self.words(5)}" for i in range(self.generator.randrange(2, 8))]
+        return "\n".join(lines), {}
+
+    def link(self, index):
+        target = self.generator.randrange(self.pages)
+        return self.generator.choice([
+            f"See [[[page-{target}]]] for {self.words(3)}.",
+            f"The [[[page-{target}|{self.words(2)}]]] page describes {self.words(4)}.",
+            f"Details are at [http://example.com/{self.words(1)} {self.words(2)}].",
+        ]), {}
+
+    def table(self, index):
+        lines = ["||~ Station ||~ Date ||~ Value ||"]
+        for row in range(self.generator.randrange(5, 40)):
+            value = self.generator.randrange(400)
+            color = self.generator.choice(["red", "blue", "green"])
+            lines.append(f"|| {self.words(1)} {row} || 2022-01-{row % 28 + 1:02} || ##{color}|{value}## DU ||")
+        return "\n".join(lines), {}
+
+    def code(self, index):
+        lines = [f"x_{i} = {self.generator.randrange(100)} // 2  # **not bold**" for i in range(self.generator.randrange(3, 15))]
+        return '[[code type="python"]]\n' + "\n".join(lines) + "\n[[/code]]", {}
+
+    def math(self, index):
+        return "[[$ \\sum_{i=1}^{n} x_i^2 = " + str(self.generator.randrange(100)) + " $]]", {}
+
+    def image(self, index):
+        name = f"figure-{index}.png"
+        return f'[[image {name} size="medium" alt="{self.words(3)}"]]', {name: self.attachment()}
+
+    def gallery(self, index):
+        names = [f"photo-{index}-{i}.jpg" for i in range(self.generator.randrange(2, 6))]
+        text = "[[gallery size=\"small\"]]\n" + "\n".join(f": {name}" for name in names) + "\n[[/gallery]]"
+        return text, {name: self.attachment() for name in names}
+
+    def file(self, index):
+        name = f"report-{index}.pdf"
+        return f"[[file {name}|{self.words(2)}]]", {name: self.attachment()}
+
+
+def generate_page(generator, pages, weights, blocks):
+    """Returns the text and the attachments of one page of the given number of blocks."""
+    page_generator = PageGenerator(generator, pages)
+    features = [feature for feature in FEATURES if weights.get(feature, 0) > 0]
+    chosen = generator.choices(features, weights=[weights[feature] for feature in features], k=blocks)
+    texts = []
+    attachments = {}
+    for index, feature in enumerate(chosen):
+        text, block_attachments = getattr(page_generator, feature)(index)
+        texts.append(text)
+        attachments.update(block_attachments)
+    return "\n\n".join(texts) + "\n", attachments
+
+
+def generate_backup(directory, pages, weights=None, blocks=20, seed=0):
+    """Writes a backup of the given number of pages, as made by Wikidot-tools.
+
+    Each page has a .txt and a .xml file, and a directory of attachments if its images,
+    galleries or files need any.  The same seed gives the same backup.
+    """
+    generator = random.Random(seed)
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for page in range(pages):
+        fullname = f"page-{page}"
+        title = f"Page {page}"
+        text, attachments = generate_page(generator, pages, weights, generator.randrange(blocks // 2, blocks * 3 // 2 + 1))
+        (directory / (fullname+".txt")).write_text(text, encoding="utf-8")
+        (directory / (fullname+".xml")).write_text(
+            f"<data><fullname>{fullname}</fullname><title>{title}</title><title_shown>{title}</title_shown></data>",
+            encoding="utf-8"
+        )
+        if attachments:
+            (directory / fullname).mkdir(exist_ok=True)
+            for name, contents in attachments.items():
+                (directory / fullname / name).write_bytes(contents)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dest", help="Directory in which to write the backup")
+    parser.add_argument("--pages", type=int, default=100, help="Number of pages (default 100)")
+    parser.add_argument(
+        "--weights",
+        default="",
+        help=f"How often features appear, for example 'table=5,code=2,gallery=0'.  Features are {', '.join(FEATURES)}"
+    )
+    parser.add_argument("--blocks", type=int, default=20, help="Average number of blocks in a page (default 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random contents (default 0)")
+    arguments = parser.parse_args()
+
+    generate_backup(arguments.dest, arguments.pages, parse_weights(arguments.weights), arguments.blocks, arguments.seed)
+    print(f"Wrote {arguments.pages} pages to {arguments.dest}")
+
+if __name__ == '__main__':
+    main()
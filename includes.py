@@ -0,0 +1,147 @@
+import collections
+import contextlib
+
+import re
+
+from link_resolver import normalize_name
+
+# Wikidot replaces {$name} in an included page with the value given for name
+_VARIABLE = re.compile(r"\{\$([\w-]+)\}")
+# The target of an include, as found in any page's text
+_INCLUDE_TARGET = re.compile(r"\[\[include\s+([^\s\]|]+)")
+# Wikidot links and includes use hyphens where titles have underscores and at-signs
+_NAME_SEPARATORS = str.maketrans({"_": "-", "@": "-"})
+
+
+def include_targets(text):
+    """The names of the pages that a page's text includes."""
+    return _INCLUDE_TARGET.findall(text)
+
+
+def parse_arguments(arguments):
+    """Returns {name: value} for an include's arguments, such as " a=1 | b = two "."""
+    values = {}
+    for argument in arguments.split("|"):
+        name, separator, value = argument.partition("=")
+        if separator:
+            values[name.strip()] = value.strip()
+    return values
+
+
+def _read_source_text(source_dir, name):
+    with open(source_dir / (name+".txt"), encoding="utf-8") as f:
+        return f.read()
+
+
+class PageSources():
+    """Finds the Wikidot text of a site's pages, given the names used to include them.
+
+    Pages are read from the backup directory, or taken from texts, which holds the text of
+    each page (by base filename) that is not to be read from a file.  Instances can be
+    passed to worker processes.
+    """
+    def __init__(self, metadata, source_dir=None, texts=None):
+        # Each page's fullname, and the name Wikidot derives from its title, give the
+        # page's base filename
+        self.names = {}
+        for filename, fullname, title in metadata:
+            self.names.setdefault(fullname, filename)
+            self.names.setdefault(normalize_name(title), filename)
+        self.source_dir = source_dir
+        self.texts = texts if texts is not None else {}
+
+    def find(self, name):
+        """Returns the base filename of the page with the given name, or None."""
+        name = name.strip().translate(_NAME_SEPARATORS).lower()
+        return self.names.get(name, self.names.get(normalize_name(name)))
+
+    def text(self, filename):
+        if filename in self.texts:
+            return self.texts[filename]
+        return _read_source_text(self.source_dir, filename)
+
+
+class Includer():
+    """Expands Wikidot's [[include page |name=value]] with the converted text of the page.
+
+    Each included page is converted once for each set of arguments, and the converted text
+    kept in a cache of at most cache_size fragments; the least recently used are evicted.
+    An include of a page that is already being included (directly or through other pages)
+    is not expanded.
+    """
+    def __init__(self, sources, cache_size=256):
+        self.sources = sources
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        # Includes of missing pages, and of pages within themselves
+        self.failures = 0
+        # (filename, arguments): (converted text, internal links, resolved links, included filenames)
+        self._cache = collections.OrderedDict()
+        # The pages being expanded, outermost first, each with whether its expansion can
+        # be cached
+        self._stack = []
+        self._recording = None
+
+    @contextlib.contextmanager
+    def recording(self, filename):
+        """Converts the page filename, recording the pages it includes in the set yielded."""
+        self._stack = [[filename, True]]
+        self._recording = set()
+        try:
+            yield self._recording
+        finally:
+            self._stack = []
+            self._recording = None
+
+    def expand(self, target, arguments, converter, link_resolver):
+        """Returns the converted text of an include and the pages its text links to."""
+        filename = self.sources.find(target)
+        if filename is None:
+            self.failures += 1
+            print(f"  Failed to find page '{target.strip()}' to include")
+            return f"<!-- Wikidot included the page '{target.strip()}', which was not found -->", []
+        if any(frame[0] == filename for frame in self._stack):
+            self.failures += 1
+            chain = " includes ".join([frame[0] for frame in self._stack] + [filename])
+            print(f"  Not including page '{filename}' within itself ({chain})")
+            # What is expanded within the loop depends on where the loop was entered
+            for frame in self._stack:
+                frame[1] = False
+            return f"<!-- Wikidot included the page '{filename}' within itself -->", []
+
+        arguments = parse_arguments(arguments)
+        key = (filename, tuple(sorted(arguments.items())))
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            entry = self._convert(filename, arguments, converter, link_resolver)
+        text, internal_links, resolved_links, included = entry
+        # The page including this one depends on everything this one depended on
+        link_resolver.record(resolved_links)
+        if self._recording is not None:
+            self._recording.update(included)
+        return text, internal_links
+
+    def _convert(self, filename, arguments, converter, link_resolver):
+        text = _VARIABLE.sub(lambda match: arguments.get(match.group(1), match.group(0)), self.sources.text(filename))
+        frame = [filename, True]
+        self._stack.append(frame)
+        outer_recording, self._recording = self._recording, {filename}
+        try:
+            with link_resolver.recording() as resolved_links:
+                converted_text, internal_links, _ = converter.convert(
+                    text, file_prefix=filename+"__", link_resolver=link_resolver
+                )
+            entry = (converted_text, internal_links, resolved_links, frozenset(self._recording))
+        finally:
+            self._stack.pop()
+            self._recording = outer_recording
+        if frame[1]:
+            self._cache[(filename, tuple(sorted(arguments.items())))] = entry
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
@@ -0,0 +1,132 @@
+import contextlib
+import difflib
+
+import re
+
+# Wikidot converted underscores and at-signs in links to hypens
+_LINK_SEPARATORS = str.maketrans({"_": "-", "@": "-"})
+# Wikidot derives a page's fullname from its title by replacing runs of anything that is
+# not a letter, digit or category separator with a hypen
+_NOT_NAME_CHARACTERS = re.compile(r"[^a-z0-9:]+")
+
+
+def normalize_name(name):
+    """Returns the Wikidot-style fullname for a title or link."""
+    return _NOT_NAME_CHARACTERS.sub("-", name.lower()).strip("-")
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i : i+3] for i in range(len(padded) - 2)}
+
+
+class LinkResolver():
+    """Maps the targets of Wikidot internal links to MediaWiki page titles.
+
+    Built once for a site from the fullname and title of every page, so each link is
+    resolved with dictionary lookups rather than by rebuilding maps for every page.
+    """
+    def __init__(self, fullname_to_title=None):
+        self.fullname_to_title = {}
+        self.lower_title_to_title = {}
+        self.normalized_name_to_title = {}
+        self._resolved = {}
+        self._trigram_index = None
+        self._recording = None
+        for fullname, title in (fullname_to_title or {}).items():
+            self.add(fullname, title)
+
+    def add(self, fullname, title):
+        self.fullname_to_title[fullname] = title
+        self.lower_title_to_title[title.lower()] = title
+        self.normalized_name_to_title.setdefault(normalize_name(title), title)
+        self._resolved = {}
+        self._trigram_index = None
+
+    def __contains__(self, fullname):
+        return fullname in self.fullname_to_title
+
+    def __getitem__(self, fullname):
+        return self.fullname_to_title[fullname]
+
+    def __len__(self):
+        return len(self.fullname_to_title)
+
+    def titles(self):
+        return sorted(set(self.fullname_to_title.values()), key=str.lower)
+
+    def lookup(self, link):
+        """Returns the title of the page the link refers to, or None if there is no such page."""
+        try:
+            return self._resolved[link]
+        except KeyError:
+            pass
+        # Trim whitespace at either end
+        stripped_link = link.strip()
+        # Convert underscores and at-signs to hypens and lower case (because that's what
+        # Wikidot did)
+        fullname = stripped_link.translate(_LINK_SEPARATORS).lower()
+        title = self.fullname_to_title.get(fullname)
+        if title is None:
+            # Check if link references page title rather than its fullname (Wikidot seems to
+            # be case-insensitive)
+            title = self.lower_title_to_title.get(stripped_link.lower())
+        if title is None:
+            title = self.normalized_name_to_title.get(normalize_name(stripped_link))
+        self._resolved[link] = title
+        return title
+
+    def resolve(self, link):
+        """Returns the title of the page the link refers to.
+
+        If there is no such page, prints a warning with the closest titles and returns the
+        link unchanged.
+        """
+        title = self.lookup(link)
+        if self._recording is not None:
+            self._recording[link.strip()] = title
+        if title is not None:
+            return title
+        link = link.strip()
+        message = f"  Failed to find page given the link '{link}'"
+        suggestions = self.suggest(link)
+        if len(suggestions) > 0:
+            message += "; did you mean " + " or ".join(f"'{s}'" for s in suggestions) + "?"
+        print(message)
+        return link
+
+    @contextlib.contextmanager
+    def recording(self):
+        """Records, in the dictionary it yields, the title (or None) each resolved link gave.
+
+        Recordings may be nested; links resolved within the inner one are not recorded in
+        the outer one.
+        """
+        outer_recording, self._recording = self._recording, {}
+        try:
+            yield self._recording
+        finally:
+            self._recording = outer_recording
+
+    def record(self, resolved_links):
+        """Adds links resolved earlier (as yielded by recording()) to the current recording."""
+        if self._recording is not None:
+            self._recording.update(resolved_links)
+
+    def suggest(self, link, count=3, cutoff=0.6):
+        """Returns up to count titles that are closest to the link."""
+        if self._trigram_index is None:
+            self._trigram_index = {}
+            for normalized_name, title in self.normalized_name_to_title.items():
+                for trigram in _trigrams(normalized_name):
+                    self._trigram_index.setdefault(trigram, []).append(normalized_name)
+
+        # Only compare the link in full with the names that share the most trigrams with it
+        name = normalize_name(link)
+        shared = {}
+        for trigram in _trigrams(name):
+            for candidate in self._trigram_index.get(trigram, []):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        candidates = sorted(shared, key=shared.get, reverse=True)[:50]
+        matches = difflib.get_close_matches(name, candidates, n=count, cutoff=cutoff)
+        return [self.normalized_name_to_title[match] for match in matches]
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def hash_file(path):
+    """Returns the SHA-1 hash of a file's contents."""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024*1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ConversionManifest():
+    """Records what each converted page was made from, so unchanged pages can be skipped.
+
+    For each page (keyed by the page's base filename) the manifest holds a signature of
+    its inputs (hashes of the .txt file and of the page's XML metadata, the converter's
+    fingerprint and the names, sizes and modification times of its associated files), the
+    title each of its internal links resolved to, the hash of each page it included, and
+    the results needed for the report.
+    """
+    FILENAME = "conversion_manifest.json"
+
+    def __init__(self, dest_dir):
+        self.path = Path(dest_dir) / self.FILENAME
+        self.pages = {}
+        if self.path.is_file():
+            try:
+                self.pages = json.loads(self.path.read_text(encoding="utf-8"))["pages"]
+            except (ValueError, KeyError):
+                print(f"  Ignoring unreadable manifest {self.path}")
+
+    @staticmethod
+    def signature(input_file, metadata_hash, fingerprint, attachments, input_hash=None):
+        """attachments gives the (name, size, mtime) of each associated file, as in the site catalog.
+
+        input_hash is the hash of the .txt file's contents, if it is already known.
+        """
+        return {
+            "input": input_hash or hash_file(input_file),
+            "metadata": metadata_hash,
+            "converter": fingerprint,
+            "associated": [list(attachment) for attachment in attachments],
+        }
+
+    def is_current(self, base_filename, signature, link_resolver, dest_dir, input_hashes=None):
+        """True if the page was converted from the same inputs and its links resolve the same way.
+
+        input_hashes gives the current hash of each page's .txt file, by base filename, so
+        that a page is converted again when a page it includes has changed.
+        """
+        entry = self.pages.get(base_filename)
+        if entry is None or entry["signature"] != signature:
+            return False
+        if not (Path(dest_dir) / (entry["title"]+".mktxt")).is_file():
+            return False
+        for link, title in entry["resolved_links"].items():
+            if link_resolver.lookup(link) != title:
+                return False
+        for included_page, input_hash in entry.get("included_pages", {}).items():
+            if (input_hashes or {}).get(included_page) != input_hash:
+                return False
+        return True
+
+    def record(self, base_filename, signature, page, input_hashes=None):
+        """input_hashes gives the hash of each page's .txt file, as for is_current()."""
+        self.pages[base_filename] = {
+            "signature": signature,
+            "title": page.title,
+            "internal_links": page.internal_links,
+            "linked_files": page.linked_files,
+            "resolved_links": page.resolved_links,
+            "included_pages": {name: (input_hashes or {}).get(name) for name in page.included_pages or []},
+        }
+
+    def prune(self, base_filenames):
+        """Forgets pages that are no longer in the source."""
+        keep = set(base_filenames)
+        self.pages = {name: entry for name, entry in self.pages.items() if name in keep}
+
+    def save(self):
+        # Write to a temporary file first so an interrupted run cannot leave a broken manifest
+        temporary_path = self.path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps({"pages": self.pages}, indent=1), encoding="utf-8")
+        os.replace(temporary_path, self.path)
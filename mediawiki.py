@@ -1,10 +1,107 @@
+import json
+import os
+from pathlib import Path
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from throttle import Throttle, THROTTLE_ERRORS, THROTTLE_STATUSES
+
+# Errors that mean the CSRF token is no longer valid, or the session has expired
+_BAD_TOKEN_ERRORS = ("badtoken",)
+_SESSION_ERRORS = ("assertuserfailed", "assertbotfailed", "notloggedin")
+# Errors that mean a chunked upload's stashed chunks can no longer be added to
+_STASH_ERRORS = ("stashfailed", "stashnosuchfilekey", "stashfilenotfound")
+
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
 
 class MediaWiki:
-    def __init__(self, endpoint, verify):
+    """A client for a MediaWiki site's API.
+
+    The client may be shared by several threads.  They share one connection pool, and at
+    most max_requests requests are sent at the same time.
+    """
+    def __init__(self, endpoint, verify, max_requests=10, chunk_size=DEFAULT_CHUNK_SIZE,
+                 chunked_upload_threshold=None, throttle=None):
         self._endpoint = endpoint
         self._verify = verify
         self._session = requests.Session()
+        self._session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_requests)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._requests = threading.BoundedSemaphore(max_requests)
+        # Held while the token is refreshed or the client logs in again
+        self._lock = threading.Lock()
+        self._csrf_token = None
+        self._credentials = None
+        self._session_path = None
+        self._batch_size = None
+        # Files larger than the threshold (by default, one chunk) are uploaded in chunks
+        self.chunk_size = chunk_size
+        self.chunked_upload_threshold = chunk_size if chunked_upload_threshold is None else chunked_upload_threshold
+        self.chunk_retries = 3
+        # Ask the wiki to refuse requests when its database replicas lag by more than this many
+        # seconds, so that a heavy upload does not slow the wiki down for its other users
+        self.maxlag = 5
+        self.throttle = Throttle() if throttle is None else throttle
+
+    def _get(self, params):
+        return self._request("GET", params)
+
+    def _post(self, params, files=None):
+        return self._request("POST", params, files)
+
+    def _request(self, method, params, files=None):
+        """Sends a request, retrying it while the wiki asks the client to slow down.
+
+        maxlag is sent with every request.  The throttle paces requests and decides how long
+        to wait before retrying.  Open files are rewound before they are sent again.
+        """
+        if self.throttle.job_check_due():
+            self.throttle.job_queue(self.job_queue_size())
+
+        params = dict(params, maxlag=self.maxlag)
+        for attempt in range(self.throttle.max_retries + 1):
+            for file in (files or {}).values():
+                if hasattr(file[1], "seek"):
+                    file[1].seek(0)
+            self.throttle.wait()
+            try:
+                with self._requests:
+                    if method == "GET":
+                        response = self._session.get(url=self._endpoint, params=params, verify=self._verify)
+                    else:
+                        response = self._session.post(
+                            self._endpoint, data=params, files=files, verify=self._verify
+                        )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.throttle.max_retries:
+                    raise
+                self.throttle.backoff(attempt)
+                continue
+
+            if response.status_code in THROTTLE_STATUSES:
+                data = None
+            else:
+                data = response.json()
+                error_code = data.get("error", {}).get("code") if isinstance(data, dict) else None
+                if error_code not in THROTTLE_ERRORS:
+                    self.throttle.success()
+                    return data
+            if attempt == self.throttle.max_retries:
+                break
+            self.throttle.backoff(attempt, response.headers.get("Retry-After"))
+
+        if data is None:
+            response.raise_for_status()
+        return data
+
+    def job_queue_size(self):
+        """The number of jobs waiting in the wiki's job queue."""
+        params = {"meta": "siteinfo", "siprop": "statistics"}
+        return next(self._query(params))["statistics"]["jobs"]
 
     def _get_login_token(self):
         params = {
@@ -14,37 +111,70 @@ class MediaWiki:
             "format": "json"
         }
 
-        response = self._session.get(
-            url=self._endpoint, 
-            params=params,
-            verify=self._verify
-        )
-        data = response.json()
+        data = self._get(params)
 
         login_token = data['query']['tokens']['logintoken']
 
         return login_token
 
-    def _get_edit_token(self):
+    def _get_edit_token(self, refresh=False):
+        """Returns the CSRF token, which is only requested from the server once per session."""
+        if self._csrf_token is not None and not refresh:
+            return self._csrf_token
+
         params = {
             "action": "query",
             "meta": "tokens",
             "format": "json"
         }
 
-        response = self._session.get(url=self._endpoint, params=params)
-        data = response.json()
+        data = self._get(params)
 
         try:
-            edit_token = data['query']['tokens']['csrftoken']
+            self._csrf_token = data['query']['tokens']['csrftoken']
         except:
             print("Failed to get edit token:")
             print(data)
             raise
 
-        return edit_token
+        return self._csrf_token
+
+    def _post_with_token(self, params, files=None):
+        """Posts an action that needs the CSRF token.
+
+        If the server rejects the token, the token is requested again; if the session has
+        expired, the client logs in again (when it has logged in before).  The action is then
+        retried once.  Open files are rewound before they are sent again.
+        """
+        # Ask the server to fail, rather than edit anonymously, if the session has expired
+        used_token = self._get_edit_token()
+        params = dict(params, token=used_token, **{"assert": "user"})
+        data = self._post(params, files)
+
+        error_code = data.get("error", {}).get("code")
+        expired = error_code in _SESSION_ERRORS and self._credentials is not None
+        if not expired and error_code not in _BAD_TOKEN_ERRORS:
+            return data
+
+        with self._lock:
+            # Another thread may already have logged in again or refreshed the token
+            if self._csrf_token in (None, used_token):
+                if expired:
+                    print("  Session has expired; logging in again")
+                    self.login(*self._credentials, session_path=self._session_path)
+                self._get_edit_token(refresh=True)
+            params["token"] = self._csrf_token
+        return self._post(params, files)
+
+    def login(self, bot_username, bot_password, session_path=None):
+        """Logs in.  With session_path, a saved login is reused if it is still valid, and a new
+        login is saved for next time.
+        """
+        self._credentials = (bot_username, bot_password)
+        self._session_path = session_path
+        if session_path is not None and self.load_session(session_path):
+            return {"login": {"result": "Success", "reused": True}}
 
-    def login(self, bot_username, bot_password):
         login_token = self._get_login_token()
 
         params = {
@@ -55,23 +185,145 @@ class MediaWiki:
             'format':"json"
         }
 
-        response = self._session.post(self._endpoint, data=params, verify=self._verify)
-        data = response.json()
+        data = self._post(params)
+        # A new session needs a new token
+        self._csrf_token = None
+        if session_path is not None and data.get("login", {}).get("result") == "Success":
+            self.save_session(session_path)
 
         return data
 
-    def create_page(self, title, text):
-        edit_token = self._get_edit_token()
+    def is_logged_in(self):
+        params = {
+            "action": "query",
+            "meta": "userinfo",
+            "format": "json"
+        }
+        data = self._get(params)
+        return "anon" not in data["query"]["userinfo"]
+
+    def _query(self, params):
+        """Sends a query, following continuations.  Yields the "query" part of each response.
+
+        Queries are posted, as a batch of titles can be too long for a URL.
+        """
+        params = dict(params, action="query", format="json", formatversion=2)
+        continuation = {}
+        while True:
+            data = self._post(dict(params, **continuation))
+            if "error" in data:
+                raise Exception("Query failed: "+str(data))
+            if "query" in data:
+                yield data["query"]
+            if "continue" not in data:
+                return
+            continuation = data["continue"]
+
+    def batch_size(self):
+        """How many titles can be given in one query: 500 with the apihighlimits right, else 50."""
+        if self._batch_size is None:
+            params = {"meta": "userinfo", "uiprop": "rights"}
+            rights = next(self._query(params))["userinfo"].get("rights", [])
+            self._batch_size = 500 if "apihighlimits" in rights else 50
+        return self._batch_size
 
+    def _query_titles(self, titles, params):
+        """Queries the given titles in batches.  Yields (requested title, page) pairs."""
+        titles = list(titles)
+        batch_size = self.batch_size()
+        for start in range(0, len(titles), batch_size):
+            batch = titles[start : start+batch_size]
+            pages = {}
+            renamed = {}
+            for query in self._query(dict(params, titles="|".join(batch))):
+                for normalized in query.get("normalized", []):
+                    renamed[normalized["from"]] = normalized["to"]
+                for page in query.get("pages", []):
+                    # Continued responses add to the pages of earlier ones
+                    entry = pages.setdefault(page["title"], {})
+                    for key, value in page.items():
+                        entry.setdefault(key, value)
+            for title in batch:
+                yield title, pages.get(renamed.get(title, title))
+
+    def page_sha1s(self, titles):
+        """Returns {title: SHA-1 of the latest revision's text, or None if there is no such page}."""
+        sha1s = {}
+        params = {"prop": "revisions", "rvprop": "sha1", "rvslots": "main"}
+        for title, page in self._query_titles(titles, params):
+            sha1s[title] = None
+            if page is not None and "revisions" in page:
+                revision = page["revisions"][0]
+                sha1s[title] = revision.get("slots", {}).get("main", {}).get("sha1", revision.get("sha1"))
+        return sha1s
+
+    def file_sha1s(self, filenames):
+        """Returns {filename: SHA-1 of the file on the wiki, or None if there is no such file}."""
+        sha1s = {}
+        params = {"prop": "imageinfo", "iiprop": "sha1"}
+        titles = {"File:"+filename: filename for filename in filenames}
+        for title, page in self._query_titles(titles, params):
+            sha1s[titles[title]] = None
+            if page is not None and "imageinfo" in page:
+                sha1s[titles[title]] = page["imageinfo"][0]["sha1"]
+        return sha1s
+
+    def all_file_sha1s(self):
+        """Returns {name: SHA-1} for every file on the wiki.  Names are as the wiki stores them
+        (with underscores for spaces, for example).
+        """
+        sha1s = {}
+        params = {"list": "allimages", "aiprop": "sha1", "ailimit": "max"}
+        for query in self._query(params):
+            for image in query["allimages"]:
+                sha1s[image["name"]] = image["sha1"]
+        return sha1s
+
+    def file_count(self):
+        params = {"meta": "siteinfo", "siprop": "statistics"}
+        return next(self._query(params))["statistics"]["images"]
+
+    def save_session(self, path):
+        """Saves the session's cookies, so that a later run can reuse the login."""
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires,
+            }
+            for cookie in self._session.cookies
+        ]
+        fd = os.open(path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        # The mode given to os.open() only applies to a new file, so an existing one is
+        # made private before the cookies are written to it
+        os.chmod(path, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({"endpoint": self._endpoint, "cookies": cookies}))
+
+    def load_session(self, path):
+        """Loads cookies saved by save_session().  Returns True if they are still logged in."""
+        path = Path(path)
+        if not path.is_file():
+            return False
+        saved = json.loads(path.read_text())
+        if saved["endpoint"] != self._endpoint:
+            return False
+        for cookie in saved["cookies"]:
+            self._session.cookies.set(**cookie)
+        self._csrf_token = None
+        return self.is_logged_in()
+
+    def create_page(self, title, text):
         params = {
             "action": "edit",
             "format": "json",
             "title": title,
             "text": text,
-            "token": edit_token
         }
-        response = self._session.post(self._endpoint, data=params, verify=False)
-        data = response.json()
+        data = self._post_with_token(params)
 
         try:
             result = data["edit"]["result"]
@@ -79,38 +331,102 @@ class MediaWiki:
         except:
             raise Exception("Failed to create page: "+str(data))
 
-    def upload_file(self, filename, path, exists_ok=True):
-        edit_token = self._get_edit_token()
-
-        params = {
-            "action": "upload",
-            "filename": filename,
-            "format": "json",
-            "token": edit_token,
-            "ignorewarnings": 1
-        }
-
-        files = {
-            'file': (filename, open(path, 'rb'), 'multipart/form-data')
-        }
+    def upload_file(self, filename, path, exists_ok=True, resume_from=None, progress=None):
+        """Uploads a file.  Returns False if an identical copy had already been uploaded.
 
-        response = self._session.post(
-            self._endpoint, 
-            files=files, 
-            data=params
-        )
+        Files larger than the chunked upload threshold are sent in chunks.  For those,
+        resume_from may give the (filekey, offset) reached by an earlier, interrupted upload of
+        the same file, and progress is called with the filekey and offset after each chunk.
+        """
+        if os.stat(path).st_size > self.chunked_upload_threshold:
+            data = self._upload_chunked(filename, path, resume_from, progress)
+        else:
+            params = {
+                "action": "upload",
+                "filename": filename,
+                "format": "json",
+                "ignorewarnings": 1
+            }
 
-        data = response.json()
+            with open(path, 'rb') as f:
+                files = {
+                    'file': (filename, f, 'multipart/form-data')
+                }
+                data = self._post_with_token(params, files)
 
         try:
             # If an identical copy already exists on the server, we'll consider that success
             if "error" in data:
                 error_code = data["error"]["code"]
                 if error_code == "fileexists-no-change":
-                    print("  An identical copy of the file has already been uploaded")
-                    return
+                    return False
             # Check for success
             result = data["upload"]["result"]
             assert result == "Success"
+            return True
         except:
             raise Exception("Failed to upload file: "+str(data))
+
+    def _upload_chunked(self, filename, path, resume_from=None, progress=None):
+        """Sends a file to the upload stash in chunks, then publishes it.  Returns the final response.
+
+        Only one chunk is held in memory at a time.  A chunk that fails is sent again, up to
+        chunk_retries times, from the last offset the server accepted.
+        """
+        filesize = os.stat(path).st_size
+        filekey, offset = resume_from if resume_from is not None else (None, 0)
+        failures = 0
+        with open(path, "rb") as f:
+            while offset < filesize:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                params = {
+                    "action": "upload",
+                    "filename": filename,
+                    "format": "json",
+                    "stash": 1,
+                    "filesize": filesize,
+                    "offset": offset,
+                    "ignorewarnings": 1
+                }
+                if filekey is not None:
+                    params["filekey"] = filekey
+                files = {
+                    "chunk": (filename, chunk, "multipart/form-data")
+                }
+                try:
+                    data = self._post_with_token(params, files)
+                except requests.RequestException as e:
+                    data = {"error": {"code": "http", "info": str(e)}}
+
+                if "error" in data:
+                    if data["error"]["code"] in _STASH_ERRORS and filekey is not None:
+                        # The stashed chunks have expired, so start again
+                        print(f"  Restarting chunked upload of {filename}: {data['error']['code']}")
+                        filekey, offset = None, 0
+                        continue
+                    failures += 1
+                    if failures > self.chunk_retries:
+                        return data
+                    continue
+
+                result = data["upload"]["result"]
+                if result not in ("Continue", "Success"):
+                    return data
+                failures = 0
+                filekey = data["upload"]["filekey"]
+                offset = data["upload"].get("offset", offset + len(chunk))
+                if progress is not None:
+                    progress(filekey, offset)
+                if result == "Success":
+                    break
+
+        # Publish the stashed file
+        params = {
+            "action": "upload",
+            "filename": filename,
+            "format": "json",
+            "filekey": filekey,
+            "ignorewarnings": 1
+        }
+        return self._post_with_token(params)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+# A local stand-in for the parts of the MediaWiki Action API that mediawiki.MediaWiki uses,
+# for testing and benchmarking uploads without a real wiki.
+
+import argparse
+from collections import deque
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+
+def normalize_title(title):
+    title = re.sub(r"[ _]+", " ", title).strip()
+    return title[:1].upper() + title[1:]
+
+def file_key(title):
+    """The name under which a file is stored, as returned by list=allimages."""
+    return normalize_title(title).replace(" ", "_")
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+def parse_multipart(body, content_type):
+    """Returns {name: bytes} for the fields of a multipart/form-data body."""
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode()
+    fields = {}
+    for part in body.split(b"--"+boundary)[1:]:
+        if part.startswith(b"--"):
+            break
+        headers, _, content = part[2:].partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', headers).group(1).decode()
+        # Remove the line break that comes before the next boundary
+        fields[name] = content[:-2]
+    return fields
+
+
+class MockMediaWiki():
+    """An in-memory wiki that answers API requests over HTTP on a local port.
+
+    It supports login and CSRF tokens, edits, uploads (whole and chunked), SHA-1 queries of
+    pages and files, user rights and site statistics.  Query results use formatversion=2.
+    To imitate a busy wiki it can add latency to each request, refuse requests beyond a
+    rate limit (with a ratelimited error, or HTTP 429 if rate_limit_status is 429), report
+    database lag (refusing requests sent with a smaller maxlag), grow a job queue with each
+    write and fail a fraction of requests with HTTP 503.  Random failures come from a
+    seeded generator, so runs are repeatable.
+    """
+    def __init__(self, latency=0.0, rate_limit=None, rate_limit_status=200, lag=0.0, error_rate=0.0,
+                 retry_after=1, jobs_per_write=0, jobs_run_per_second=0.0, high_limits=True,
+                 max_upload_size=None, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_status = rate_limit_status
+        self.lag = lag
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.jobs_per_write = jobs_per_write
+        self.jobs_run_per_second = jobs_run_per_second
+        self.high_limits = high_limits
+        self.max_upload_size = max_upload_size
+        self.random = random.Random(seed)
+
+        self.pages = {}
+        self.files = {}
+        self.stash = {}
+        self.sessions = {}
+        self.jobs = 0.0
+        self.requests = 0
+        self.refused = 0
+        self.edits = 0
+        self.uploads = 0
+        self.bytes_received = 0
+        self._recent = deque()
+        self._last_job_time = time.monotonic()
+        self._session_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api.php"
+
+    def start(self, port=0):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._respond(urllib.parse.urlsplit(self.path).query.encode())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(self.rfile.read(length))
+
+            def _respond(self, body):
+                status, headers, data = mock.handle(self.command, self.path, self.headers, body)
+                content = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exception):
+        self.stop()
+
+    def handle(self, method, path, headers, body):
+        """Returns the status, extra headers and JSON data of the response to a request."""
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        content_type = headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            fields = parse_multipart(body, content_type)
+            params = {name: value.decode("utf-8") for name, value in fields.items() if name not in ("file", "chunk")}
+        else:
+            fields = {}
+            params = dict(urllib.parse.parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+        params.update(urllib.parse.parse_qsl(urllib.parse.urlsplit(path).query, keep_blank_values=True))
+
+        cookie = re.search(r"mocksession=(\d+)", headers.get("Cookie", ""))
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+
+            refusal = self._refusal(params)
+            if refusal is not None:
+                self.refused += 1
+                return refusal
+
+            response_headers = {}
+            session_id = cookie.group(1) if cookie else None
+            if session_id not in self.sessions:
+                session_id = str(next(self._session_ids))
+                self.sessions[session_id] = {"user": None, "login_token": None}
+                response_headers["Set-Cookie"] = f"mocksession={session_id}; Path=/"
+            session = self.sessions[session_id]
+            session["csrf_token"] = f"{sha1(session_id.encode())}+\\" if session["user"] else "+\\"
+
+            action = params.get("action")
+            if action == "query":
+                data = self._query(params, session)
+            elif action == "login":
+                data = self._login(params, session)
+            elif action in ("edit", "upload"):
+                data = self._check_token(params, session)
+                if data is None and action == "edit":
+                    data = self._edit(params)
+                elif data is None:
+                    data = self._upload(params, fields)
+            else:
+                data = {"error": {"code": "badvalue", "info": f"Unrecognized action: {action}"}}
+        if isinstance(data, tuple):
+            status, data = data
+            return status, response_headers, data
+        return 200, response_headers, data
+
+    def _refusal(self, params):
+        now = time.monotonic()
+        retry_after = {"Retry-After": str(self.retry_after)}
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            return 503, {}, {"error": {"code": "internal_api_error", "info": "Service unavailable"}}
+        if self.rate_limit is not None:
+            while self._recent and self._recent[0] < now - 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                data = {"error": {"code": "ratelimited", "info": "You've exceeded your rate limit."}}
+                return self.rate_limit_status, retry_after if self.rate_limit_status == 429 else {}, data
+            self._recent.append(now)
+        if "maxlag" in params and self.lag > float(params["maxlag"]):
+            data = {"error": {"code": "maxlag", "info": f"Waiting for a database server: {self.lag} seconds lagged."}}
+            return 200, dict(retry_after, **{"X-Database-Lag": str(self.lag)}), data
+        return None
+
+    def _current_jobs(self):
+        now = time.monotonic()
+        self.jobs = max(0.0, self.jobs - (now - self._last_job_time) * self.jobs_run_per_second)
+        self._last_job_time = now
+        return int(self.jobs)
+
+    def _check_token(self, params, session):
+        if params.get("assert") == "user" and session["user"] is None:
+            return {"error": {"code": "assertuserfailed", "info": "You are no longer logged in"}}
+        if params.get("token") != session["csrf_token"]:
+            return {"error": {"code": "badtoken", "info": "Invalid CSRF token."}}
+        return None
+
+    def _login(self, params, session):
+        if params.get("lgtoken") != session["login_token"]:
+            return {"login": {"result": "Failed", "reason": "Unable to continue login. Your session most likely timed out."}}
+        session["user"] = params.get("lgname")
+        return {"login": {"result": "Success", "lgusername": session["user"]}}
+
+    def _edit(self, params):
+        title = normalize_title(params["title"])
+        text = params.get("text", "").rstrip()
+        self.edits += 1
+        if self.pages.get(title) == text:
+            return {"edit": {"result": "Success", "title": title, "nochange": True}}
+        self.pages[title] = text
+        self.jobs += self.jobs_per_write
+        return {"edit": {"result": "Success", "title": title}}
+
+    def _store_file(self, filename, contents):
+        key = file_key(filename)
+        if self.files.get(key) == contents:
+            return {"error": {"code": "fileexists-no-change", "info": "The upload is an exact duplicate."}}
+        self.files[key] = contents
+        self.uploads += 1
+        self.jobs += self.jobs_per_write
+        return {"upload": {"result": "Success", "filename": key}}
+
+    def _upload(self, params, fields):
+        filename = params["filename"]
+        if "chunk" in fields:
+            offset = int(params["offset"])
+            filekey = params.get("filekey")
+            if filekey is None:
+                filekey = f"{sha1(filename.encode())[:12]}.{len(self.stash)}"
+                self.stash[filekey] = bytearray()
+            if filekey not in self.stash:
+                return {"error": {"code": "stashnosuchfilekey", "info": "No such filekey"}}
+            if offset != len(self.stash[filekey]):
+                return {"error": {"code": "stashfailed", "info": "Chunk at the wrong offset"}}
+            self.stash[filekey] += fields["chunk"]
+            offset = len(self.stash[filekey])
+            result = "Success" if offset >= int(params["filesize"]) else "Continue"
+            return {"upload": {"result": result, "filekey": filekey, "offset": offset}}
+        if "filekey" in params:
+            if params["filekey"] not in self.stash:
+                return {"error": {"code": "stashnosuchfilekey", "info": "No such filekey"}}
+            return self._store_file(filename, bytes(self.stash.pop(params["filekey"])))
+        contents = fields.get("file", b"")
+        if self.max_upload_size is not None and len(contents) > self.max_upload_size:
+            return 413, {"error": {"code": "file-too-large", "info": "The file is too large"}}
+        return self._store_file(filename, contents)
+
+    def _query(self, params, session):
+        limit = 500 if self.high_limits else 50
+        query = {}
+        data = {"batchcomplete": True, "query": query}
+        titles = params["titles"].split("|") if params.get("titles") else []
+        if len(titles) > limit:
+            return {"error": {"code": "toomanyvalues", "info": f"Too many values supplied for parameter \"titles\". The limit is {limit}."}}
+
+        for meta in params.get("meta", "").split("|"):
+            if meta == "tokens":
+                if params.get("type") == "login":
+                    session["login_token"] = f"{sha1(str(time.time()).encode())}+\\"
+                    query["tokens"] = {"logintoken": session["login_token"]}
+                else:
+                    query["tokens"] = {"csrftoken": session["csrf_token"]}
+            elif meta == "userinfo":
+                if session["user"] is None:
+                    query["userinfo"] = {"id": 0, "name": "127.0.0.1", "anon": True}
+                else:
+                    rights = ["read", "edit", "upload"] + (["apihighlimits"] if self.high_limits else [])
+                    query["userinfo"] = {"id": 1, "name": session["user"]}
+                    if "rights" in params.get("uiprop", ""):
+                        query["userinfo"]["rights"] = rights
+            elif meta == "siteinfo":
+                query["statistics"] = {
+                    "pages": len(self.pages),
+                    "images": len(self.files),
+                    "jobs": self._current_jobs(),
+                }
+
+        if titles:
+            normalized = []
+            pages = []
+            for title in titles:
+                name = normalize_title(title)
+                if name != title:
+                    normalized.append({"from": title, "to": name})
+                page = {"title": name}
+                if params.get("prop") == "imageinfo":
+                    key = file_key(name.split(":", 1)[-1])
+                    if key in self.files:
+                        page["imageinfo"] = [{"sha1": sha1(self.files[key])}]
+                    else:
+                        page["missing"] = True
+                elif params.get("prop") == "revisions":
+                    if name in self.pages:
+                        page["revisions"] = [{"slots": {"main": {"sha1": sha1(self.pages[name].encode("utf-8"))}}}]
+                    else:
+                        page["missing"] = True
+                pages.append(page)
+            if normalized:
+                query["normalized"] = normalized
+            query["pages"] = pages
+
+        if params.get("list") == "allimages":
+            requested = params.get("ailimit", "10")
+            count = limit if requested == "max" else min(int(requested), limit)
+            names = sorted(name for name in self.files if name >= params.get("aicontinue", ""))
+            query["allimages"] = [{"name": name, "sha1": sha1(self.files[name])} for name in names[:count]]
+            if len(names) > count:
+                data["continue"] = {"aicontinue": names[count], "continue": "-||"}
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for a MediaWiki API")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default 8080)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each request")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Requests per second before refusing them")
+    parser.add_argument("--lag", type=float, default=0.0, help="Database lag in seconds reported for maxlag")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with HTTP 503")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random failures")
+    arguments = parser.parse_args()
+
+    mock = MockMediaWiki(
+        latency=arguments.latency,
+        rate_limit=arguments.rate_limit,
+        lag=arguments.lag,
+        error_rate=arguments.error_rate,
+        seed=arguments.seed
+    )
+    mock.start(arguments.port)
+    print(f"Mock MediaWiki API listening at {mock.endpoint}; any username and password will log in")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,104 @@
-from xml.dom.minidom import parseString
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from xml.etree.ElementTree import XMLPullParser
 
-def get_text(nodelist):
-    rc = []
-    for node in nodelist:
-        if node.nodeType == node.TEXT_NODE:
-            rc.append(node.data)
-    return ''.join(rc)
+# The fields of a page's <data> element that the converter needs
+_FIELDS = ("fullname", "title")
+_CHUNK_SIZE = 64 * 1024
+
+def _local_name(tag):
+    # Ignore any namespace, as getElementsByTagName did
+    return tag.rsplit("}", 1)[-1]
+
+def _direct_text(element):
+    # The text directly inside the element, leaving out that of any child elements, as the
+    # original minidom parser did
+    return (element.text or "") + "".join(child.tail or "" for child in element)
+
+def _extract_fields(chunks):
+    """Reads the fields from an XML document given as chunks of text or bytes.
+
+    When <data> is the document's root element, nothing after it can be another element,
+    so reading stops at its end.  Otherwise the whole document is read.  Returns the number
+    of <data> elements seen and, for each field, the texts of the matching elements inside
+    <data>.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    data_count = 0
+    data_depth = 0
+    depth = 0
+    fields = {field: [] for field in _FIELDS}
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            tag = _local_name(element.tag)
+            if event == "start":
+                depth += 1
+                if tag == "data":
+                    data_count += 1
+                    data_depth += 1
+                continue
+            depth -= 1
+            if tag == "data":
+                data_depth -= 1
+                if depth == 0:
+                    return data_count, fields
+            elif data_depth > 0 and tag in fields:
+                fields[tag].append(_direct_text(element))
+    parser.close()
+    return data_count, fields
+
+def _read_chunks(path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            yield chunk
 
 class PageXMLParser:
     def __init__(self, xml):
-        self._dom = parseString(xml)
+        self._chunks = lambda: [xml]
+        self._extracted = None
+
+    @classmethod
+    def from_file(cls, path):
+        """Reads the page's metadata from an XML file, stopping after its <data> root element."""
+        instance = cls.__new__(cls)
+        instance._chunks = lambda: _read_chunks(path)
+        instance._extracted = None
+        return instance
+
+    def _extract(self):
+        if self._extracted is None:
+            self._extracted = _extract_fields(self._chunks())
+        return self._extracted
+
+    def _field(self, field):
+        data_count, fields = self._extract()
+        assert data_count == 1
+        assert len(fields[field]) == 1
+        return fields[field][0]
 
     @property
     def fullname(self):
-        data_elements = self._dom.getElementsByTagName("data")
-        assert len(data_elements) == 1
-        fullnames = data_elements[0].getElementsByTagName("fullname")
-        assert len(fullnames) == 1
-        fullname_node = fullnames[0]
-        return get_text(fullname_node.childNodes)
+        return self._field("fullname")
 
     @property
     def title(self):
-        data_elements = self._dom.getElementsByTagName("data")
-        assert len(data_elements) == 1
-        fullnames = data_elements[0].getElementsByTagName("title")
-        assert len(fullnames) == 1
-        fullname_node = fullnames[0]
-        return get_text(fullname_node.childNodes)
+        return self._field("title")
+
+def parse_xml_files(xml_files, max_workers=8):
+    """Reads the metadata of each XML file using a pool of threads.
+
+    Returns an iterator over a PageXMLParser for each file, in the order given.
+    """
+    def parse(xml_file):
+        parser = PageXMLParser.from_file(xml_file)
+        parser._extract()
+        return parser
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(parse, xml_files)
 
+def scan_directory(directory, max_workers=8):
+    """Returns (path, PageXMLParser) for every XML file in a backup directory."""
+    xml_files = sorted(Path(directory).glob("*.xml"))
+    return list(zip(xml_files, parse_xml_files(xml_files, max_workers)))
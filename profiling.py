@@ -0,0 +1,102 @@
+import csv
+import json
+import time
+
+# Written next to Wikidot_to_MediaWiki_report.mktxt when convert.py is run with --profile
+PROFILE_JSON = "Wikidot_to_MediaWiki_profile.json"
+PROFILE_CSV = "Wikidot_to_MediaWiki_profile.csv"
+
+
+class PageProfile():
+    """The time taken and the matches found by each step of one page's conversion.
+
+    The steps are the registry's rules and the converter's structural conversions (titles,
+    links, images and so on).  The single-pass engine converts everything at once, so its
+    rules and structures have match counts but share a single time.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.input_size = None
+        self.output_size = None
+        self.seconds = 0.0
+        # Step name: [seconds, matches]
+        self.steps = {}
+        self._start = None
+        self._lap_start = None
+
+    def start(self, input_size):
+        self.input_size = input_size
+        self._start = self._lap_start = time.perf_counter()
+
+    def lap(self, step, matches=0):
+        """Charges the time since the last lap (or the start) to step, with its matches."""
+        now = time.perf_counter()
+        entry = self.steps.setdefault(step, [0.0, 0])
+        entry[0] += now - self._lap_start
+        entry[1] += matches
+        self._lap_start = now
+
+    def count(self, step, matches=1):
+        """Adds matches to step without charging it any time."""
+        self.steps.setdefault(step, [0.0, 0])[1] += matches
+
+    def finish(self, output_size):
+        self.output_size = output_size
+        self.seconds = time.perf_counter() - self._start
+
+
+class ConversionProfile():
+    """The profiles of all the pages converted in one run."""
+    def __init__(self):
+        self.pages = []
+
+    def add(self, page_profile):
+        self.pages.append(page_profile)
+
+    def step_totals(self):
+        """Returns {step: [seconds, matches]} summed over all pages."""
+        totals = {}
+        for page in self.pages:
+            for step, (seconds, matches) in page.steps.items():
+                total = totals.setdefault(step, [0.0, 0])
+                total[0] += seconds
+                total[1] += matches
+        return totals
+
+    def print_summary(self, count=10):
+        """Prints the slowest pages and steps."""
+        print(f"Slowest of {len(self.pages)} pages:")
+        for page in sorted(self.pages, key=lambda page: page.seconds, reverse=True)[:count]:
+            slowest_step = max(page.steps, key=lambda step: page.steps[step][0], default="")
+            print(
+                f"  {page.seconds:9.4f}s  {page.input_size:>9} -> {page.output_size:>9} chars  "
+                + f"{page.name} (mostly {slowest_step})"
+            )
+        print("Slowest steps:")
+        totals = self.step_totals()
+        for step in sorted(totals, key=lambda step: totals[step][0], reverse=True)[:count]:
+            seconds, matches = totals[step]
+            print(f"  {seconds:9.4f}s  {matches:>9} matches  {step}")
+
+    def write(self, dest_dir):
+        """Writes the profile as JSON (one object per page) and CSV (one row per step of each page)."""
+        pages = [
+            {
+                "page": page.name,
+                "seconds": page.seconds,
+                "input_size": page.input_size,
+                "output_size": page.output_size,
+                "steps": {step: {"seconds": seconds, "matches": matches} for step, (seconds, matches) in page.steps.items()},
+            }
+            for page in self.pages
+        ]
+        with open(dest_dir / PROFILE_JSON, "w", encoding="utf-8") as f:
+            json.dump({"pages": pages}, f, indent=1)
+        with open(dest_dir / PROFILE_CSV, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["page", "input_size", "output_size", "page_seconds", "step", "step_seconds", "matches"])
+            for page in self.pages:
+                for step, (seconds, matches) in page.steps.items():
+                    writer.writerow([
+                        page.name, page.input_size, page.output_size, f"{page.seconds:.6f}", step, f"{seconds:.6f}", matches
+                    ])
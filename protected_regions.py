@@ -0,0 +1,88 @@
+import functools
+
+import re
+
+# Each protected region is represented in the text being converted by a single code point
+# from the supplementary private use areas, so rules have nothing to match inside it and
+# it can be put back in one pass.
+_FIRST_MARKER = 0xF0000
+_LAST_MARKER = 0x10FFFF
+MARKER_PATTERN = "[\U000F0000-\U0010FFFF]"
+_MARKER = re.compile(MARKER_PATTERN)
+
+def _render_code(match):
+    # A code block starts a new paragraph, unless it already follows a blank line
+    before = "" if match.string.endswith("\n\n", 0, match.start()) else "\n"
+    return before + " <nowiki>" + match.group("code_body") + "</nowiki>"
+
+def _render_math(match):
+    return "<math>" + match.group("math_body").strip() + "</math>"
+
+def _render_raw(match):
+    return "<nowiki>" + match.group("raw_body") + "</nowiki>"
+
+def _render_nowiki(match):
+    return match.group(0)
+
+def _render_include(match):
+    # Left as it is, unless the converter is given an Includer (see includes.py)
+    return match.group(0)
+
+# Kinds of protected region: the pattern that finds them and how each is rendered
+PROTECTED_KINDS = {
+    "code": (r'\[\[code(?: type="[\S]+")?\]\](?P<code_body>[\s\S]*?)\[\[/code\]\]', _render_code),
+    "math": (r"\[\[\$(?P<math_body>[\s\S]*?)\$\]\]", _render_math),
+    "raw": (r"@@(?P<raw_body>[^\n]*?)@@", _render_raw),
+    "nowiki": (r"<nowiki>[\s\S]*?</nowiki>", _render_nowiki),
+    "include": (r"\[\[include\s+(?P<include_page>[^\s\]|]+)(?P<include_arguments>[^\]]*)\]\]", _render_include),
+}
+
+@functools.lru_cache(maxsize=None)
+def _compile_kinds(kinds):
+    # Code points that are already in the range used for markers are protected as
+    # themselves, so they cannot be mistaken for markers
+    alternatives = [f"(?P<literal>{MARKER_PATTERN})"]
+    alternatives += [f"(?P<{kind}>{PROTECTED_KINDS[kind][0]})" for kind in kinds]
+    return re.compile("|".join(alternatives))
+
+
+class ProtectedRegions():
+    """Regions of a page that conversion rules must not change.
+
+    The regions are found in one scan of the page and rendered straight away.  The attribute
+    'text' is the page with each region replaced by a marker: a single private-use code
+    point, which no rule matches.  Rules still scan the whole of 'text', markers included;
+    restore() then puts each region's converted text back in place of its marker.
+    renderers may replace how any kind of region is rendered.
+    """
+    def __init__(self, text, kinds=tuple(PROTECTED_KINDS), renderers=None):
+        self.replacements = []
+        pieces = []
+        position = 0
+        for match in _compile_kinds(tuple(kinds)).finditer(text):
+            if len(self.replacements) > _LAST_MARKER - _FIRST_MARKER:
+                raise Exception("Too many protected regions in the page")
+            kind = match.lastgroup
+            pieces.append(text[position : match.start()])
+            pieces.append(chr(_FIRST_MARKER + len(self.replacements)))
+            position = match.end()
+            if kind == "literal":
+                self.replacements.append(match.group(0))
+            else:
+                render = (renderers or {}).get(kind, PROTECTED_KINDS[kind][1])
+                self.replacements.append(render(match))
+        pieces.append(text[position:])
+        self.text = "".join(pieces)
+
+    def __len__(self):
+        return len(self.replacements)
+
+    def replacement(self, marker):
+        """Returns the converted text of the region represented by marker."""
+        return self.replacements[ord(marker) - _FIRST_MARKER]
+
+    def restore(self, text):
+        """Replaces every marker in text with the converted text of its region."""
+        if not self.replacements:
+            return text
+        return _MARKER.sub(lambda match: self.replacement(match.group(0)), text)
@@ -0,0 +1,126 @@
+import re
+
+
+def compile_pattern(pattern, flags=0):
+    """Compiles a pattern with Python's re module, or the regex module if re cannot compile it.
+
+    Patterns only need the regex module (which takes a while to import) for its extra
+    syntax, such as \\p{L} or variable-length lookbehind.
+    """
+    try:
+        return re.compile(pattern, flags)
+    except (re.error, ValueError):
+        import regex
+        return regex.compile(pattern, flags)
+
+
+class Rule():
+    """A regex replacement applied to the text of every page.
+
+    The replacement may be a template (such as r"<sup>\\1</sup>") or a function taking
+    the match, as for re.sub.  Rules run in ascending order of priority.
+    """
+    def __init__(self, name, pattern, replacement, priority=100, enabled=True, flags=re.MULTILINE):
+        self.name = name
+        self.pattern = pattern
+        self.replacement = replacement
+        self.priority = priority
+        self.enabled = enabled
+        self.regex = compile_pattern(pattern, flags)
+
+    def __repr__(self):
+        return f"Rule({self.name!r}, priority={self.priority}, enabled={self.enabled})"
+
+
+class RuleRegistry():
+    """An ordered, named collection of rules, compiled once when each rule is added."""
+    def __init__(self, rules=None):
+        self._rules = {}
+        self._active = None
+        # Incremented on every change, so converters know when to rebuild anything derived
+        # from the active rules
+        self.version = 0
+        for rule in rules or []:
+            self._insert(rule)
+
+    def _insert(self, rule):
+        if rule.name in self._rules:
+            raise ValueError(f"A rule named '{rule.name}' is already registered")
+        self._rules[rule.name] = rule
+        self._changed()
+
+    def _changed(self):
+        self._active = None
+        self.version += 1
+
+    def add(self, name, pattern, replacement, priority=100, enabled=True, flags=re.MULTILINE):
+        rule = Rule(name, pattern, replacement, priority, enabled, flags)
+        self._insert(rule)
+        return rule
+
+    def remove(self, name):
+        del self._rules[name]
+        self._changed()
+
+    def enable(self, name):
+        self._rules[name].enabled = True
+        self._changed()
+
+    def disable(self, name):
+        self._rules[name].enabled = False
+        self._changed()
+
+    def __getitem__(self, name):
+        return self._rules[name]
+
+    def __contains__(self, name):
+        return name in self._rules
+
+    def __iter__(self):
+        return iter(sorted(self._rules.values(), key=lambda rule: rule.priority))
+
+    def __len__(self):
+        return len(self._rules)
+
+    @property
+    def active(self):
+        """Enabled rules in the order they should be applied."""
+        if self._active is None:
+            self._active = [rule for rule in self if rule.enabled]
+        return self._active
+
+    def load(self, path):
+        """Executes a Python file of site-specific rules.
+
+        The file is given this registry as the variable 'rules', so it can call, for
+        example, rules.add("smiley", r":-\\)", "☺") or rules.disable("underline").
+        """
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        exec(compile(source, str(path), "exec"), {"rules": self})
+
+
+def default_rules():
+    """Returns a new registry holding the built-in Wikidot-to-MediaWiki rules."""
+    registry = RuleRegistry()
+    registry.add("toc", r"\[\[toc\]\]", "", priority=10) # no equivalent for table of contents
+    registry.add("italics", r"(?<!:)//([\s\S]*?[^:])//", r"''\1''", priority=20)
+    registry.add("bold", r"(?<!:)\*\*([\s\S]*?)\*\*", r"'''\1'''", priority=30)
+    registry.add("comments", r"(?<!:)\[!--([\s\S]*?)--\]", r"<!--\1-->", priority=40)
+    registry.add("underline", r"(?<!:)__([\s\S]*?)__", r"'''\1'''", priority=50) # underlining → bold
+    registry.add("superscript", r"\^\^([\s\S]*?)\^\^", r"<sup>\1</sup>", priority=60)
+    registry.add("size", r"\[\[size\s*\S*?\]\]", "", priority=70) # ignore text sizing
+    registry.add("size_end", r"\[\[/size\s*?\]\]", "", priority=80) # ignore text sizing
+    return registry
+
+
+def site_rules(path=None, disabled=()):
+    """Returns the built-in rules, with a site's rules loaded from path and the named rules disabled."""
+    registry = default_rules()
+    if path is not None:
+        registry.load(path)
+    for name in disabled:
+        if name not in registry:
+            raise ValueError(f"Cannot disable unknown conversion rule '{name}'")
+        registry.disable(name)
+    return registry
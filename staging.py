@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import os
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from manifest import hash_file
+
+
+class StagedFile():
+    """A file in files_to_upload.  Its hash is only calculated when it is needed.
+
+    The hash of a file staged during this conversion is taken from the file it was staged
+    from, as the staged copy may still be being written.
+    """
+    def __init__(self, path, size, source=None):
+        self.path = Path(path)
+        self.size = size
+        # The associated file it was copied from during this conversion, if any
+        self.source = source
+        self._hash = None
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hash_file(self.source or self.path)
+        return self._hash
+
+
+class StagedFiles():
+    """An index of the files staged for upload, keyed by upload name.
+
+    Files are compared by size first, and their contents are only read (in chunks, to
+    calculate a hash) when the sizes are the same.
+    """
+    def __init__(self, upload_dir, sizes=None):
+        self.upload_dir = Path(upload_dir)
+        self.files = {
+            name: StagedFile(self.upload_dir / name, size)
+            for name, size in (sizes or {}).items()
+        }
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def __getitem__(self, name):
+        return self.files[name]
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, name, source):
+        """Records a file that is being staged from source."""
+        path = self.upload_dir / name
+        self.files[name] = StagedFile(path, os.stat(source).st_size, source)
+        return self.files[name]
+
+    def is_identical(self, name, path):
+        """True if the staged file has the same contents as the file at path."""
+        staged_file = self.files[name]
+        if os.stat(path).st_size != staged_file.size:
+            return False
+        return hash_file(path) == staged_file.hash
+
+
+# How associated files can be placed in files_to_upload
+STAGE_MODES = ["copy", "hardlink", "reflink", "symlink"]
+# The Linux ioctl that makes a copy-on-write clone of a file
+_FICLONE = 0x40049409
+# Errors that mean the filesystem cannot stage a file in the requested way
+_UNSUPPORTED_ERRORS = {
+    errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.EMLINK,
+}
+
+
+def _copy(source, destination):
+    import shutil
+    if hasattr(os, "copy_file_range"):
+        # Copy within the kernel, which some filesystems do without duplicating the data
+        try:
+            with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+                remaining = os.fstat(source_file.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(source_file.fileno(), destination_file.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copymode(source, destination)
+                return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRORS:
+                raise
+    shutil.copy(source, destination)
+
+def _hardlink(source, destination):
+    os.link(source, destination)
+
+def _reflink(source, destination):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "Reflinks are not supported on this platform")
+    import shutil
+    try:
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+        shutil.copymode(source, destination)
+    except OSError:
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        raise
+
+def _symlink(source, destination):
+    os.symlink(Path(source).resolve(), destination)
+
+_STAGE_FUNCTIONS = {
+    "copy": _copy,
+    "hardlink": _hardlink,
+    "reflink": _reflink,
+    "symlink": _symlink,
+}
+
+
+class FileStager():
+    """Places associated files in files_to_upload by copying or linking them.
+
+    If the filesystem does not support the requested mode, files are copied instead.  The
+    first file is staged straight away, so that an unsupported mode is found (and reported)
+    in the calling thread; later files are staged by a pool of threads.  Call wait() to
+    finish staging and raise any error.
+    """
+    def __init__(self, mode="copy", max_workers=4):
+        if mode not in STAGE_MODES:
+            raise ValueError(f"Unknown stage mode '{mode}'")
+        self.mode = mode
+        self._mode_checked = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+
+    def stage(self, source, destination):
+        # Replace, rather than write through, anything already staged under the same name
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        if not self._mode_checked:
+            self._mode_checked = True
+            try:
+                _STAGE_FUNCTIONS[self.mode](source, destination)
+                return
+            except OSError as e:
+                if self.mode == "copy" or e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+                print(f"  Cannot stage files with mode '{self.mode}' ({e.strerror}); copying instead")
+                self.mode = "copy"
+                _copy(source, destination)
+                return
+        self._futures.append(self._executor.submit(self._stage, self.mode, source, destination))
+
+    @staticmethod
+    def _stage(mode, source, destination):
+        try:
+            try:
+                _STAGE_FUNCTIONS[mode](source, destination)
+            except OSError as e:
+                # A file on another filesystem, for example
+                if mode == "copy" or e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+                _copy(source, destination)
+        except BaseException:
+            # Do not leave a partly staged file to be uploaded
+            if os.path.lexists(destination):
+                os.unlink(destination)
+            raise
+
+    def wait(self):
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(cancel_futures=True)
@@ -0,0 +1,76 @@
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from archive import ArchivedBackup, is_archive
+from catalog import SiteCatalog
+
+FILES = {
+    "start.txt": b"Hello [[[page-one]]]",
+    "start.xml": b"<data><fullname>start</fullname><title>Start</title></data>",
+    "page-one.txt": b"One",
+    "page-one.xml": b"<data><fullname>page-one</fullname><title>Page One</title></data>",
+    "start/pic.png": b"12345",
+    "start/notes.xml": b"<notes/>",
+}
+
+def make_archive(tmp_path, name, wrapped):
+    path = tmp_path / name
+    prefix = "backup/" if wrapped else ""
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(path, "w") as archive:
+            for member, contents in FILES.items():
+                archive.writestr(prefix+member, contents)
+    else:
+        source = tmp_path / "source"
+        for member, contents in FILES.items():
+            (source / member).parent.mkdir(parents=True, exist_ok=True)
+            (source / member).write_bytes(contents)
+        with tarfile.open(path, "w:gz") as archive:
+            # Associated files first, so the layout is only known at the end of a flat archive
+            for member in sorted(FILES, key=lambda member: "/" not in member):
+                archive.add(source / member, prefix+member)
+    return path
+
+@pytest.mark.parametrize("name", ["backup.zip", "backup.tar.gz"])
+@pytest.mark.parametrize("wrapped", [False, True])
+def test_read(tmp_path, name, wrapped):
+    path = make_archive(tmp_path, name, wrapped)
+    assert is_archive(path)
+    upload_dir = tmp_path / "files_to_upload"
+    backup = ArchivedBackup(path)
+    backup.read(upload_dir)
+    assert sorted(backup.text_files) == ["page-one", "start"]
+    assert backup.metadata["page-one"] == ("page-one", "Page One")
+    assert backup.read_text("start") == "Hello [[[page-one]]]"
+    assert set(backup.attachments["start"]) == {"pic.png", "notes.xml"}
+    # Associated XML files are not staged unless asked for, and nothing temporary is left
+    assert os.listdir(upload_dir) == ["start__pic.png"]
+    assert (upload_dir / "start__pic.png").read_bytes() == b"12345"
+    backup.close()
+
+    catalog = SiteCatalog(tmp_path)
+    assert [p.name for p in catalog.scan_archive(backup)] == ["page-one.xml", "start.xml"]
+    assert catalog.page_names() == ["page-one", "start"]
+    assert [name for name, _, _ in catalog.attachments("start")] == ["notes.xml", "pic.png"]
+
+def test_staged_files_are_not_extracted_again(tmp_path, capsys):
+    path = make_archive(tmp_path, "backup.zip", wrapped=False)
+    ArchivedBackup(path).read(tmp_path / "files_to_upload", include_xml_files=True)
+    assert "Extracting" in capsys.readouterr().out
+    backup = ArchivedBackup(path)
+    backup.read(tmp_path / "files_to_upload", include_xml_files=True)
+    assert "Extracting" not in capsys.readouterr().out
+    assert sorted(p.name for p in backup.staged_paths) == ["start__notes.xml", "start__pic.png"]
+
+def test_name_collision(tmp_path):
+    path = tmp_path / "backup.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a.txt", "")
+        archive.writestr("a/b__c.png", b"1")
+        archive.writestr("a__b.txt", "")
+        archive.writestr("a__b/c.png", b"2")
+    with pytest.raises(Exception):
+        ArchivedBackup(path).read(tmp_path / "files_to_upload")
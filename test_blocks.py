@@ -0,0 +1,69 @@
+from blocks import BlockParser
+
+def convert(text):
+    return BlockParser().convert(text)
+
+def test_star_list():
+    assert convert("* one\n * nested\n  * more nested\n* two") == "* one\n** nested\n*** more nested\n* two"
+
+def test_hash_list():
+    assert convert("# one\n # nested\n# two") == "# one\n## nested\n# two"
+
+def test_mixed_list():
+    text = "# one\n * bullet\n  # numbered\n# two"
+    expected = "# one\n#* bullet\n#*# numbered\n# two"
+    assert convert(text) == expected
+
+def test_list_ends_at_other_line():
+    assert convert("# one\n\n * bullet") == "# one\n\n** bullet"
+
+def test_not_a_list():
+    text = "*not a list*\n#hashtag\n 2 * 3"
+    assert convert(text) == text
+
+def test_simple_table():
+    text = "Before\n||~ A ||~ B ||\n|| 1 || 2 ||\nAfter"
+    expected = "Before\n{| class=\"wikitable\"\n! A !! B\n|-\n| 1 || 2\n|}\nAfter"
+    assert convert(text) == expected
+
+def test_simple_table_colspan():
+    assert convert("|||| wide ||\n|| a |||||| wider ||") == (
+        "{| class=\"wikitable\"\n| colspan=\"2\" | wide\n|-\n| a || colspan=\"3\" | wider\n|}"
+    )
+
+def test_simple_table_mixed_header_row():
+    assert convert("||~ Row || value ||") == "{| class=\"wikitable\"\n! Row\n| value\n|}"
+
+def test_simple_table_alignment():
+    assert convert("||< left ||= centre ||~> right ||") == (
+        "{| class=\"wikitable\"\n"
+        + "| style=\"text-align: left\" | left\n"
+        + "| style=\"text-align: center\" | centre\n"
+        + "! style=\"text-align: right\" | right\n|}"
+    )
+
+def test_consecutive_tables_are_separate():
+    assert convert("|| a ||\n\n|| b ||") == "{| class=\"wikitable\"\n| a\n|}\n\n{| class=\"wikitable\"\n| b\n|}"
+
+def test_table_block():
+    text = (
+        "[[table style=\"width: 100%\"]]\n[[row]]\n"
+        + "[[hcell]]Name[[/hcell]] [[cell class=\"value\"]]42[[/cell]]\n"
+        + "[[/row]]\n[[/table]]"
+    )
+    expected = "{| style=\"width: 100%\"\n|-\n!Name\n| class=\"value\" |42\n|}"
+    assert convert(text) == expected
+
+def test_nested_table_block():
+    text = "[[table]][[row]][[cell]]\n[[table]][[row]][[cell]]inner[[/cell]][[/row]][[/table]]\n[[/cell]][[/row]][[/table]]"
+    expected = "{|\n|-\n|\n{|\n|-\n|inner\n|}\n|}"
+    assert convert(text) == expected
+
+def test_table_tags_outside_table_block():
+    text = "[[/cell]] and [[row]] and [[tabview]]"
+    assert convert(text) == text
+
+def test_matches():
+    parser = BlockParser()
+    parser.convert("* a\n * b\n|| c ||\n|| d ||\n[[table]][[/table]]")
+    assert parser.matches == 5
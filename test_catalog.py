@@ -0,0 +1,62 @@
+import os
+
+from catalog import SiteCatalog, PAGE, FILE, UPLOAD_DIRECTORY
+
+def write_page(source, name, fullname, title):
+    (source / (name+".txt")).write_text("text")
+    (source / (name+".xml")).write_text(f"<data><fullname>{fullname}</fullname><title>{title}</title></data>")
+
+def make_backup(tmp_path):
+    source = tmp_path / "backup"
+    source.mkdir()
+    write_page(source, "start", "start", "Start")
+    write_page(source, "page-one", "page-one", "Page One")
+    (source / "start").mkdir()
+    (source / "start" / "pic.png").write_bytes(b"12345")
+    (source / "start" / "doc.pdf").write_bytes(b"1")
+    return source
+
+def test_scan(tmp_path):
+    source = make_backup(tmp_path)
+    catalog = SiteCatalog(tmp_path)
+    parsed = catalog.scan(source)
+    assert [path.name for path in parsed] == ["page-one.xml", "start.xml"]
+    assert catalog.page_names() == ["page-one", "start"]
+    assert catalog.metadata() == [("page-one", "page-one", "Page One"), ("start", "start", "Start")]
+    attachments = catalog.attachments("start")
+    assert [(name, size) for name, size, _ in attachments] == [("doc.pdf", 1), ("pic.png", 5)]
+    assert catalog.attachments("page-one") is None
+    assert catalog.attachments("missing") is None
+
+def test_rescan_only_parses_changed_xml(tmp_path):
+    source = make_backup(tmp_path)
+    SiteCatalog(tmp_path).scan(source)
+
+    # The catalog persists between runs
+    catalog = SiteCatalog(tmp_path)
+    assert catalog.scan(source) == []
+
+    write_page(source, "start", "start", "Start Again")
+    stat = os.stat(source / "start.xml")
+    os.utime(source / "start.xml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    (source / "page-one.txt").unlink()
+    (source / "page-one.xml").unlink()
+    assert [path.name for path in catalog.scan(source)] == ["start.xml"]
+    assert catalog.metadata() == [("start", "start", "Start Again")]
+    assert catalog.page_names() == ["start"]
+
+def test_outputs(tmp_path):
+    dest = tmp_path / "dest"
+    (dest / UPLOAD_DIRECTORY).mkdir(parents=True)
+    (dest / "Start.mktxt").write_text("text")
+    (dest / UPLOAD_DIRECTORY / "start__pic.png").write_bytes(b"12345")
+    catalog = SiteCatalog(dest)
+    catalog.scan_outputs()
+    assert catalog.outputs(PAGE) == ["Start.mktxt"]
+    assert catalog.outputs(FILE) == ["start__pic.png"]
+
+    (dest / "Page One.mktxt").write_text("text")
+    catalog.record_output(PAGE, dest / "Page One.mktxt")
+    catalog.close()
+    assert SiteCatalog.exists(dest)
+    assert SiteCatalog(dest).outputs(PAGE) == ["Page One.mktxt", "Start.mktxt"]
@@ -0,0 +1,58 @@
+import pytest
+
+import check
+import convert
+
+def write_page(directory, name, title, text):
+    (directory / (name+".txt")).write_text(text, encoding="utf-8")
+    (directory / (name+".xml")).write_text(
+        f"<data><fullname>{name}</fullname><title>{title}</title></data>", encoding="utf-8"
+    )
+
+def test_check_clean_backup(tmp_path, capsys):
+    write_page(tmp_path, "start", "Start", "See [[[page-one]]] and [[include footer]]")
+    write_page(tmp_path, "page-one", "Page One", "Back to [[[start]]] [[image photo.png]]")
+    write_page(tmp_path, "footer", "Footer", "The end")
+    (tmp_path / "page-one").mkdir()
+    (tmp_path / "page-one" / "photo.png").write_bytes(b"")
+    assert check.main([str(tmp_path)]) == 0
+    assert "Found 0 problems in 3 pages" in capsys.readouterr().out
+
+def test_check_reports_problems(tmp_path, capsys):
+    write_page(tmp_path, "start", "Start", "See [[[page-too]]], [[file report.pdf]] and [[include missing]]")
+    write_page(tmp_path, "page-one", "Page One", "Fine")
+    assert check.main([str(tmp_path / "start.txt")]) == 1
+    output = capsys.readouterr().out
+    assert "did you mean 'Page One'?" in output
+    assert "Linked file not found in associated dir: report.pdf" in output
+    assert "Failed to find page 'missing' to include" in output
+    assert "Found 3 problems in 1 pages" in output
+
+def test_check_writes_nothing(tmp_path):
+    write_page(tmp_path, "start", "Start", "Text")
+    before = sorted(tmp_path.iterdir())
+    check.main([str(tmp_path)])
+    assert sorted(tmp_path.iterdir()) == before
+
+def test_check_uses_catalog(tmp_path, monkeypatch, capsys):
+    source = tmp_path / "backup"
+    source.mkdir()
+    write_page(source, "start", "Start", "See [[[page-one]]]")
+    write_page(source, "page-one", "Page One", "Fine")
+    convert.main([str(source), str(tmp_path / "conversion")])
+    write_page(source, "page-two", "Page Two", "Back to [[[start]]]")
+    # Only the XML files that have changed since the conversion are read
+    monkeypatch.setattr(check, "read_metadata", None)
+    capsys.readouterr()
+    assert check.main([str(source), "--dest", str(tmp_path / "conversion")]) == 0
+    assert "Found 0 problems in 3 pages" in capsys.readouterr().out
+
+def test_check_with_site_rules(tmp_path, capsys):
+    write_page(tmp_path, "start", "Start", "See [[[old-name]]]")
+    write_page(tmp_path, "page-one", "Page One", "Fine")
+    assert check.main([str(tmp_path / "start.txt")]) == 1
+    rules_file = tmp_path / "site_rules.py"
+    rules_file.write_text('rules.add("renamed", r"old-name", "page-one", priority=5)\n')
+    assert check.main([str(tmp_path / "start.txt"), "--rules", str(rules_file)]) == 0
+    with pytest.raises(ValueError):
+        check.main([str(tmp_path / "start.txt"), "--disable-rule", "unknown"])
@@ -0,0 +1,96 @@
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import convert
+from manifest import hash_file
+
+def write_page(directory, name, title, text):
+    (directory / (name+".txt")).write_text(text, encoding="utf-8")
+    (directory / (name+".xml")).write_text(
+        f"<data><fullname>{name}</fullname><title>{title}</title></data>", encoding="utf-8"
+    )
+
+def write_site(directory):
+    directory.mkdir()
+    write_page(directory, "start", "Start", "See [[[page-one]]] and **bold**")
+    write_page(directory, "page-one", "Page One", "Back to [[[start]]]")
+    write_page(directory, "page-two", "Page Two", "//Nothing// links here")
+    return directory
+
+def read_manifest(dest):
+    return json.loads((dest / "conversion_manifest.json").read_text(encoding="utf-8"))["pages"]
+
+def test_single_page_keeps_rest_of_site(tmp_path, capsys):
+    source = write_site(tmp_path / "backup")
+    dest = tmp_path / "conversion"
+    convert.main([str(source), str(dest)])
+    (source / "start.txt").write_text("See [[[page-one]]] and //italic//", encoding="utf-8")
+    convert.main([str(source / "start.txt"), str(dest)])
+    assert sorted(read_manifest(dest)) == ["page-one", "page-two", "start"]
+    report = (dest / "Wikidot_to_MediaWiki_report.mktxt").read_text(encoding="utf-8")
+    assert "following 3 pages" in report
+    assert "* [[Page Two]] *\n" in report
+    # The page converted on its own is not converted again by the next run of the whole site
+    capsys.readouterr()
+    convert.main([str(source), str(dest)])
+    assert "3 pages are unchanged" in capsys.readouterr().out
+
+def test_single_page_records_included_pages(tmp_path, capsys):
+    source = write_site(tmp_path / "backup")
+    write_page(source, "footer", "Footer", "**The end**")
+    dest = tmp_path / "conversion"
+    convert.main([str(source), str(dest)])
+    (source / "start.txt").write_text("See [[[page-one]]]\n[[include footer]]", encoding="utf-8")
+    convert.main([str(source / "start.txt"), str(dest)])
+    assert read_manifest(dest)["start"]["included_pages"] == {"footer": hash_file(source / "footer.txt")}
+    capsys.readouterr()
+    convert.main([str(source), str(dest)])
+    assert "4 pages are unchanged" in capsys.readouterr().out
+
+def read_outputs(dest):
+    """The contents of the files in dest, by their paths relative to dest."""
+    outputs = {}
+    for path in sorted(dest.rglob("*")):
+        if path.is_file() and path.name != "site_catalog.sqlite":
+            outputs[str(path.relative_to(dest))] = path.read_bytes()
+    # The report is timestamped
+    report = "Wikidot_to_MediaWiki_report.mktxt"
+    outputs[report] = re.sub(rb"ran at [0-9: -]+", b"ran at", outputs[report])
+    return outputs
+
+def test_parallel_conversion_matches_serial(tmp_path, capsys):
+    source = write_site(tmp_path / "backup")
+    write_page(source, "footer", "Footer", "**The end** of {$page}")
+    for i in range(12):
+        text = f"Text\n[[include footer |page={i % 3}]]\n[[image a.png]]"
+        write_page(source, f"page-{i:02}", f"Page {i:02}", text)
+        (source / f"page-{i:02}").mkdir()
+        (source / f"page-{i:02}" / "a.png").write_bytes(b"%d" % i)
+    results = []
+    for jobs in ["1", "2"]:
+        dest = tmp_path / f"conversion-{jobs}"
+        capsys.readouterr()
+        convert.main(["--jobs", jobs, str(source), str(dest)])
+        counts = re.search(r"Converted (\d+) included pages and reused (\d+)", capsys.readouterr().out)
+        results.append((read_outputs(dest), int(counts.group(1)) + int(counts.group(2))))
+    assert results[0] == results[1]
+    assert results[0][1] == 12
+
+def test_import_does_not_load_optional_modules():
+    # Some of these are already loaded by the interpreter's site hooks, so only those
+    # that importing convert adds are counted
+    code = (
+        "import sys\n"
+        + "before = set(sys.modules)\n"
+        + "import convert\n"
+        + "sys.stdout.write(' '.join(set(sys.modules) - before))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+    )
+    modules = set(result.stdout.split())
+    assert "convert" in modules
+    assert not {"archive", "profiling", "shutil", "csv", "zipfile", "tarfile"} & modules
@@ -0,0 +1,37 @@
+import pytest
+
+from generate_corpus import generate_backup, parse_weights
+from wikidot import WikidotToMediaWiki
+
+
+def test_parse_weights():
+    weights = parse_weights("table=5, gallery=0")
+    assert weights["table"] == 5
+    assert weights["gallery"] == 0
+    assert weights["text"] == parse_weights("")["text"]
+    with pytest.raises(ValueError):
+        parse_weights("tabel=5")
+
+def test_backup_is_repeatable(tmp_path):
+    generate_backup(tmp_path / "one", 20, seed=3)
+    generate_backup(tmp_path / "two", 20, seed=3)
+    one = sorted(path.relative_to(tmp_path / "one") for path in (tmp_path / "one").rglob("*"))
+    assert one == sorted(path.relative_to(tmp_path / "two") for path in (tmp_path / "two").rglob("*"))
+    assert len([path for path in one if path.suffix == ".txt"]) == 20
+    for path in one:
+        if path.suffix:
+            assert (tmp_path / "one" / path).read_bytes() == (tmp_path / "two" / path).read_bytes()
+
+def test_weights_choose_features(tmp_path):
+    generate_backup(tmp_path, 5, weights={"table": 1, "gallery": 1}, seed=1)
+    text = (tmp_path / "page-0.txt").read_text()
+    assert "||~" in text and "[[gallery" in text
+    assert "[[code" not in text and "[[file" not in text
+    # Each gallery's images are attached to the page
+    assert any((tmp_path / "page-0").glob("photo-*.jpg"))
+
+def test_math_is_converted(tmp_path):
+    generate_backup(tmp_path, 1, weights={"math": 1}, seed=2)
+    text, _, _ = WikidotToMediaWiki().convert((tmp_path / "page-0.txt").read_text())
+    assert "<math>\\sum_{i=1}^{n} x_i^2 = " in text
+    assert "[[" not in text
@@ -0,0 +1,78 @@
+from includes import Includer, PageSources, include_targets, parse_arguments
+from link_resolver import LinkResolver
+from wikidot import WikidotToMediaWiki
+
+def make_converter(texts, cache_size=256):
+    metadata = [(name, name, name.replace("-", " ").title()) for name in texts]
+    includer = Includer(PageSources(metadata, texts=texts), cache_size=cache_size)
+    return WikidotToMediaWiki(includer=includer), includer
+
+def test_include_targets():
+    text = "[[include note]] and [[include :other-site:page | a=1]]"
+    assert include_targets(text) == ["note", ":other-site:page"]
+
+def test_parse_arguments():
+    assert parse_arguments(" |colour=red | text = Be careful | ignored") == {"colour": "red", "text": "Be careful"}
+
+def test_page_sources_find():
+    sources = PageSources([("note", "note", "Important Note")], texts={"note": ""})
+    assert sources.find("note") == "note"
+    assert sources.find("important-note") == "note"
+    assert sources.find("Important_Note") == "note"
+    assert sources.find("other") is None
+
+def test_include_is_converted_with_arguments():
+    converter, _ = make_converter({"note": "##{$colour}|{$text}## **bold**"})
+    text, _, _ = converter.convert("Before\n[[include note |colour=red|text=Careful]]\nAfter")
+    assert text == "Before\n<span style=\"color:red\">Careful</span> '''bold'''\nAfter"
+
+def test_include_links_are_returned():
+    converter, _ = make_converter({"note": "See [[[other-page]]]", "other-page": ""})
+    link_resolver = LinkResolver({"other-page": "Other Page"})
+    with link_resolver.recording() as resolved_links:
+        text, internal_links, _ = converter.convert("[[include note]]", link_resolver=link_resolver)
+    assert text == "See [[Other Page]]"
+    assert internal_links == ["Other Page"]
+    assert resolved_links == {"other-page": "Other Page"}
+
+def test_include_is_cached():
+    converter, includer = make_converter({"note": "Note {$n}"})
+    text, _, _ = converter.convert("[[include note |n=1]]\n[[include note |n=2]]\n[[include note | n=1 ]]")
+    assert text == "Note 1\nNote 2\nNote 1"
+    assert (includer.misses, includer.hits) == (2, 1)
+
+def test_cache_evicts_least_recently_used():
+    converter, includer = make_converter({"a": "A", "b": "B", "c": "C"}, cache_size=2)
+    converter.convert("[[include a]]\n[[include b]]\n[[include a]]\n[[include c]]\n[[include a]]\n[[include b]]")
+    # b was evicted when c was added, as a had been used more recently
+    assert (includer.misses, includer.hits) == (4, 2)
+
+def test_recording_includes_nested_pages():
+    converter, includer = make_converter({"outer": "[[include inner]]", "inner": "Inner"})
+    for _ in range(2):
+        with includer.recording("start") as included_pages:
+            text, _, _ = converter.convert("[[include outer]]")
+        assert text == "Inner"
+        assert included_pages == {"outer", "inner"}
+
+def test_include_cycle_is_not_expanded():
+    converter, includer = make_converter({"a": "A [[include b]]", "b": "B [[include a]]"})
+    with includer.recording("start"):
+        text, _, _ = converter.convert("[[include a]]")
+    assert text == "A B <!-- Wikidot included the page 'a' within itself -->"
+    # What a page expands to within a cycle depends on where the cycle was entered
+    assert includer._cache == {}
+    assert includer.failures == 1
+
+def test_missing_include():
+    converter, includer = make_converter({})
+    text, _, _ = converter.convert("[[include missing]]")
+    assert text == "<!-- Wikidot included the page 'missing', which was not found -->"
+    assert includer.failures == 1
+
+def test_single_pass_engine_expands_includes():
+    texts = {"note": "Note //{$n}//"}
+    includer = Includer(PageSources([("note", "note", "Note")], texts=texts))
+    converter = WikidotToMediaWiki(engine="single-pass", includer=includer)
+    text, _, _ = converter.convert("[[include note |n=1]]")
+    assert text == "Note ''1''"
@@ -0,0 +1,44 @@
+from link_resolver import LinkResolver, normalize_name
+
+fullname_to_title = {
+    "list-of-participants": "List Of Participants",
+    "meeting:2022-minutes": "Minutes of the 2022 Meeting",
+}
+
+def test_fullname():
+    instance = LinkResolver(fullname_to_title)
+    assert instance.lookup("list-of-participants") == "List Of Participants"
+
+def test_fullname_with_underscores():
+    instance = LinkResolver(fullname_to_title)
+    assert instance.lookup(" List_Of_Participants ") == "List Of Participants"
+
+def test_title():
+    instance = LinkResolver(fullname_to_title)
+    assert instance.lookup("minutes of the 2022 meeting") == "Minutes of the 2022 Meeting"
+
+def test_normalized_name():
+    instance = LinkResolver(fullname_to_title)
+    assert instance.lookup("List of participants!") == "List Of Participants"
+
+def test_missing_page():
+    instance = LinkResolver(fullname_to_title)
+    assert instance.lookup("agenda") is None
+    assert instance.resolve(" agenda ") == "agenda"
+
+def test_suggestions(capsys):
+    instance = LinkResolver(fullname_to_title)
+    assert instance.suggest("list of participant") == ["List Of Participants"]
+    instance.resolve("list of particpants")
+    assert "did you mean 'List Of Participants'?" in capsys.readouterr().out
+
+def test_normalize_name():
+    assert normalize_name("Minutes: 2022 -- Draft") == "minutes:-2022-draft"
+
+def test_recording():
+    instance = LinkResolver(fullname_to_title)
+    with instance.recording() as resolved_links:
+        instance.resolve("list-of-participants ")
+        instance.resolve("agenda")
+    instance.resolve("other")
+    assert resolved_links == {"list-of-participants": "List Of Participants", "agenda": None}
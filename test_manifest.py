@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from link_resolver import LinkResolver
+from manifest import ConversionManifest, hash_file
+
+def make_page(title, resolved_links, included_pages=()):
+    return SimpleNamespace(
+        title=title, internal_links=list(resolved_links.values()), linked_files=[],
+        resolved_links=resolved_links, included_pages=list(included_pages)
+    )
+
+def record_page(tmp_path, resolved_links, input_hashes=None):
+    input_file = tmp_path / "start.txt"
+    input_file.write_text("Hello [[[page-one]]]")
+    (tmp_path / "Start.mktxt").write_text("Hello [[Page One]]")
+    signature = ConversionManifest.signature(input_file, "metadata-hash", "converter", [])
+    manifest = ConversionManifest(tmp_path)
+    manifest.record("start", signature, make_page("Start", resolved_links, input_hashes or {}), input_hashes)
+    manifest.save()
+    return signature
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"abc")
+    assert hash_file(path) == "a9993e364706816aba3e25717850c26c9cd0d89d"
+
+def test_unchanged_page_is_current(tmp_path):
+    signature = record_page(tmp_path, {"page-one": "Page One"})
+    manifest = ConversionManifest(tmp_path)
+    link_resolver = LinkResolver({"page-one": "Page One"})
+    assert manifest.is_current("start", signature, link_resolver, tmp_path)
+
+def test_changed_input_is_not_current(tmp_path):
+    signature = record_page(tmp_path, {"page-one": "Page One"})
+    manifest = ConversionManifest(tmp_path)
+    link_resolver = LinkResolver({"page-one": "Page One"})
+    changed_signature = dict(signature, input="different")
+    assert not manifest.is_current("start", changed_signature, link_resolver, tmp_path)
+
+def test_renamed_link_target_is_not_current(tmp_path):
+    signature = record_page(tmp_path, {"page-one": "Page One"})
+    manifest = ConversionManifest(tmp_path)
+    link_resolver = LinkResolver({"page-one": "The First Page"})
+    assert not manifest.is_current("start", signature, link_resolver, tmp_path)
+
+def test_new_link_target_is_not_current(tmp_path):
+    signature = record_page(tmp_path, {"page-one": None})
+    manifest = ConversionManifest(tmp_path)
+    link_resolver = LinkResolver({"page-one": "Page One"})
+    assert not manifest.is_current("start", signature, link_resolver, tmp_path)
+
+def test_changed_included_page_is_not_current(tmp_path):
+    signature = record_page(tmp_path, {}, input_hashes={"footer": "footer-hash"})
+    manifest = ConversionManifest(tmp_path)
+    assert manifest.is_current("start", signature, LinkResolver(), tmp_path, {"footer": "footer-hash"})
+    assert not manifest.is_current("start", signature, LinkResolver(), tmp_path, {"footer": "changed"})
+    assert not manifest.is_current("start", signature, LinkResolver(), tmp_path, {})
+
+def test_prune(tmp_path):
+    record_page(tmp_path, {})
+    manifest = ConversionManifest(tmp_path)
+    manifest.prune(["other"])
+    assert manifest.pages == {}
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import stat
+import threading
+
+import requests
+
+from mediawiki import MediaWiki
+
+class FakeResponse():
+    def __init__(self, data):
+        self.status_code = 200
+        self.headers = {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+class FakeSession():
+    """Stands in for the client's requests.Session, answering as a MediaWiki API would."""
+    def __init__(self):
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.verify = True
+        self.logged_in = False
+        self.csrf_token = "first+\\"
+        self.pages = {}
+        self.logins = 0
+        self.token_requests = 0
+        self.edits = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params, verify=None):
+        return FakeResponse(self._answer(params))
+
+    def post(self, url, data, files=None, verify=None):
+        return FakeResponse(self._answer(data))
+
+    def _answer(self, params):
+        with self._lock:
+            action = params.get("action")
+            if action == "login":
+                self.logged_in = True
+                self.logins += 1
+                return {"login": {"result": "Success"}}
+            if action == "edit":
+                self.edits += 1
+                if params.get("assert") == "user" and not self.logged_in:
+                    return {"error": {"code": "assertuserfailed"}}
+                if params.get("token") != self.csrf_token:
+                    return {"error": {"code": "badtoken"}}
+                self.pages[params["title"]] = params["text"]
+                return {"edit": {"result": "Success"}}
+            meta = params.get("meta")
+            if meta == "tokens" and params.get("type") == "login":
+                return {"query": {"tokens": {"logintoken": "login+\\"}}}
+            if meta == "tokens":
+                self.token_requests += 1
+                return {"query": {"tokens": {"csrftoken": self.csrf_token if self.logged_in else "+\\"}}}
+            if meta == "siteinfo":
+                return {"query": {"statistics": {"jobs": 0}}}
+            return {"error": {"code": "badvalue"}}
+
+def connect():
+    wiki = MediaWiki("https://wiki.example/api.php", verify=True)
+    wiki._session = session = FakeSession()
+    wiki.login("User@bot", "password")
+    return wiki, session
+
+def test_edit_token_is_reused():
+    wiki, session = connect()
+    for i in range(3):
+        wiki.create_page(f"Page {i}", "text")
+    assert session.token_requests == 1
+    assert session.edits == 3
+
+def test_rejected_token_is_refreshed():
+    wiki, session = connect()
+    wiki.create_page("Start", "one")
+    session.csrf_token = "second+\\"
+    wiki.create_page("Start", "two")
+    assert session.pages["Start"] == "two"
+    assert session.token_requests == 2
+    assert session.logins == 1
+
+def test_expired_session_logs_in_again():
+    wiki, session = connect()
+    wiki.create_page("Start", "one")
+    session.logged_in = False
+    wiki.create_page("Start", "two")
+    assert session.pages["Start"] == "two"
+    assert session.logins == 2
+
+def test_rejected_token_is_refreshed_once_by_concurrent_edits():
+    wiki, session = connect()
+    wiki.create_page("Start", "text")
+    session.csrf_token = "second+\\"
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: wiki.create_page(f"Page {i}", "text"), range(8)))
+    assert len(session.pages) == 9
+    # Edits sent with the old token are sent again, but only one thread asks for a new token
+    assert session.token_requests == 2
+
+def test_saved_session_is_private(tmp_path):
+    path = tmp_path / "session.json"
+    path.write_text("")
+    path.chmod(0o644)
+    wiki = MediaWiki("https://wiki.example/api.php", verify=True)
+    wiki._session.cookies.set("session", "secret", domain="wiki.example")
+    wiki.save_session(path)
+    # The file existed with a more open mode, which the save does not keep
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert json.loads(path.read_text())["cookies"][0]["value"] == "secret"
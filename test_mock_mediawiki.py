@@ -0,0 +1,194 @@
+import pytest
+
+from catalog import SiteCatalog, PAGE
+from mediawiki import MediaWiki
+from mock_mediawiki import MockMediaWiki
+from throttle import Throttle
+import upload
+from upload_journal import UploadJournal
+
+@pytest.fixture
+def mock():
+    with MockMediaWiki(retry_after=0) as mock:
+        yield mock
+
+def fast_throttle(**kwargs):
+    # Keep the tests quick, however much the mock slows the client down
+    return Throttle(**dict(dict(base_delay=0.01, min_rate=50), **kwargs))
+
+def connect(mock, throttle=None, **kwargs):
+    wiki = MediaWiki(mock.endpoint, verify=True, throttle=throttle or fast_throttle(), **kwargs)
+    wiki.login("User@bot", "password")
+    return wiki
+
+def test_edit_token_is_reused(mock):
+    wiki = connect(mock)
+    requests_after_login = mock.requests
+    for i in range(3):
+        wiki.create_page(f"Page {i}", "text")
+    # One request for the token, then one for each edit
+    assert mock.requests - requests_after_login == 4
+    assert mock.pages["Page 0"] == "text"
+
+def test_bad_token_and_expired_session(mock):
+    wiki = connect(mock)
+    wiki.create_page("Start", "one")
+    wiki._csrf_token = "stale+\\"
+    wiki.create_page("Start", "two")
+    assert mock.pages["Start"] == "two"
+    for session in mock.sessions.values():
+        session["user"] = None
+    wiki.create_page("Start", "three")
+    assert mock.pages["Start"] == "three"
+
+def test_session_file(mock, tmp_path):
+    session_path = tmp_path / "session.json"
+    wiki = MediaWiki(mock.endpoint, verify=True)
+    assert "reused" not in wiki.login("User@bot", "password", session_path=session_path)["login"]
+    wiki = MediaWiki(mock.endpoint, verify=True)
+    assert wiki.login("User@bot", "password", session_path=session_path)["login"]["reused"]
+    wiki.create_page("Start", "text")
+    assert mock.pages["Start"] == "text"
+
+def test_upload_file(mock, tmp_path):
+    path = tmp_path / "pic.png"
+    path.write_bytes(b"\x89PNG\r\n" * 10)
+    wiki = connect(mock)
+    assert wiki.upload_file("start__pic.png", path)
+    assert mock.files["Start_pic.png"] == path.read_bytes()
+    assert not wiki.upload_file("start__pic.png", path)
+
+def test_chunked_upload(mock, tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    wiki = connect(mock, chunk_size=1000)
+    offsets = []
+    assert wiki.upload_file("big.bin", path, progress=lambda filekey, offset: offsets.append(offset))
+    assert mock.files["Big.bin"] == path.read_bytes()
+    assert offsets == [1000 * i for i in range(1, 11)] + [10240]
+
+def test_chunked_upload_resumes(mock, tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(bytes(range(256)) * 40)
+    mock.stash["key"] = bytearray(path.read_bytes()[:3000])
+    wiki = connect(mock, chunk_size=1000)
+    requests_before = mock.requests
+    assert wiki.upload_file("big.bin", path, resume_from=("key", 3000))
+    assert mock.files["Big.bin"] == path.read_bytes()
+    # A token, eight chunks and the request that publishes the file
+    assert mock.requests - requests_before == 10
+
+def test_sha1_queries(mock):
+    mock.high_limits = False
+    mock.pages["Start"] = "text"
+    for i in range(60):
+        mock.files[f"File_{i:02}.png"] = b"%d" % i
+    wiki = connect(mock)
+    assert wiki.batch_size() == 50
+    page_sha1s = wiki.page_sha1s(["start", "Missing page"])
+    assert page_sha1s["start"] == upload.page_text_sha1("text\n")
+    assert page_sha1s["Missing page"] is None
+    file_sha1s = wiki.file_sha1s([f"file {i:02}.png" for i in range(55)] + ["missing.png"])
+    assert len(file_sha1s) == 56
+    assert file_sha1s["missing.png"] is None
+    all_file_sha1s = wiki.all_file_sha1s()
+    assert len(all_file_sha1s) == 60
+    assert all_file_sha1s["File_10.png"] == file_sha1s["file 10.png"]
+    # The listing and the batched queries agree on every file that was queried
+    for i in range(55):
+        assert file_sha1s[f"file {i:02}.png"] is not None
+        assert all_file_sha1s[f"File_{i:02}.png"] == file_sha1s[f"file {i:02}.png"]
+
+def test_throttling(mock):
+    mock.rate_limit = 10
+    # The short delays of the fast throttle need more retries to outlast the mock's
+    # one-second window
+    wiki = connect(mock, throttle=fast_throttle(min_rate=1, max_retries=20))
+    for i in range(15):
+        wiki.create_page(f"Page {i}", "text")
+    assert len(mock.pages) == 15
+    assert wiki.throttle.retries > 0
+    assert wiki.throttle.rate is not None
+
+def test_maxlag():
+    with MockMediaWiki(lag=10, retry_after=0) as mock:
+        wiki = MediaWiki(mock.endpoint, verify=True, throttle=fast_throttle(max_retries=2))
+        with pytest.raises(Exception):
+            wiki.login("User@bot", "password")
+        assert mock.refused == 3
+        wiki.maxlag = 20
+        wiki.login("User@bot", "password")
+        assert wiki.is_logged_in()
+
+def test_errors_are_retried():
+    with MockMediaWiki(retry_after=0, error_rate=0.2, seed=1) as mock:
+        wiki = connect(mock)
+        for i in range(20):
+            wiki.create_page(f"Page {i}", "text")
+        assert len(mock.pages) == 20
+        assert mock.refused > 0
+
+def test_upload_all(mock, tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"Page {i}.mktxt"
+        path.write_text(f"text {i}")
+        paths.append(path)
+    wiki = connect(mock)
+    assert upload.upload_all(wiki, "page", paths, workers=4) == []
+    assert len(mock.pages) == 10
+    edits = mock.edits
+    # Unchanged pages are not edited again
+    assert upload.upload_all(wiki, "page", paths, workers=4) == []
+    assert mock.edits == edits
+
+def test_unchanged_files_with_repeated_spaces(mock, tmp_path):
+    paths = []
+    for name in ["photo  one.png", "_photo__two_.png", "notes.pdf"]:
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        paths.append(path)
+    wiki = connect(mock)
+    assert upload.upload_all(wiki, "file", paths) == []
+    assert sorted(mock.files) == ["Notes.pdf", "Photo_one.png", "Photo_two_.png"]
+    assert upload.find_unchanged(wiki, "file", paths) == set(paths)
+
+def test_unreadable_items_are_reported(mock, tmp_path):
+    for name in ["Start.mktxt", "Page One.mktxt", "Deleted.mktxt"]:
+        (tmp_path / name).write_text(name)
+    catalog = SiteCatalog(tmp_path)
+    catalog.scan_outputs()
+    names = catalog.outputs(PAGE)
+    catalog.close()
+    wiki = connect(mock)
+    journal = UploadJournal(tmp_path)
+    assert upload.upload_all(wiki, "page", upload.list_uploads(tmp_path, "*.mktxt", names), journal=journal) == []
+
+    (tmp_path / "Deleted.mktxt").unlink()
+    (tmp_path / "Added.mktxt").write_text("Added by hand")
+    (tmp_path / "Start.mktxt").write_text("Changed")
+    paths = upload.list_uploads(tmp_path, "*.mktxt", names)
+    assert [path.name for path in paths] == ["Added.mktxt", "Deleted.mktxt", "Page One.mktxt", "Start.mktxt"]
+    failed = upload.upload_all(wiki, "page", paths, workers=2, journal=journal, force=True)
+    failed += upload.upload_all(wiki, "page", paths, workers=2, journal=journal)
+    journal.close()
+    assert [failure["filename"] for failure in failed] == ["Deleted.mktxt", "Deleted.mktxt"]
+    assert mock.pages["Added"].strip() == "Added by hand"
+    assert mock.pages["Start"].strip() == "Changed"
+
+def test_concurrent_failures_are_collected(tmp_path):
+    paths = []
+    for i in range(12):
+        path = tmp_path / f"file_{i:02}.png"
+        path.write_bytes(b"x" * (100 if i % 4 == 0 else 10) + b"%d" % i)
+        paths.append(path)
+    with MockMediaWiki(retry_after=0, max_upload_size=50) as mock:
+        wiki = connect(mock, chunk_size=2**20)
+        journal = UploadJournal(tmp_path)
+        failed = upload.upload_all(wiki, "file", paths, workers=4, journal=journal, force=True)
+        failed_names = ["file_00.png", "file_04.png", "file_08.png"]
+        # Failures are listed in the order the paths were given, whichever thread finished first
+        assert [failure["filename"] for failure in failed] == failed_names
+        assert sorted(journal.failed("file")) == failed_names
+        journal.close()
+        assert len(mock.files) == 9
@@ -1,4 +1,6 @@
-from page_xml import PageXMLParser
+import pytest
+
+from page_xml import PageXMLParser, scan_directory
 
 xml="<data><fullname>list-of-participants</fullname><title>List Of Participants</title><title_shown>List Of Participants</title_shown></data>"
 
@@ -10,3 +12,45 @@ def test_title():
     instance = PageXMLParser(xml)
     assert instance.title == "List Of Participants"
 
+
+def test_from_file(tmp_path):
+    path = tmp_path / "list-of-participants.xml"
+    path.write_text(xml)
+    instance = PageXMLParser.from_file(path)
+    assert instance.fullname == "list-of-participants"
+    assert instance.title == "List Of Participants"
+
+def test_stops_reading_after_data():
+    # Anything after the <data> element is never read, so is not parsed
+    instance = PageXMLParser(xml + "<not well-formed")
+    assert instance.fullname == "list-of-participants"
+
+def test_duplicate_field():
+    instance = PageXMLParser("<data><fullname>a</fullname><fullname>b</fullname><title>A</title></data>")
+    with pytest.raises(AssertionError):
+        instance.fullname
+    assert instance.title == "A"
+
+def test_scan_directory(tmp_path):
+    (tmp_path / "b.xml").write_text("<data><fullname>b</fullname><title>B</title></data>")
+    (tmp_path / "a.xml").write_text("<data><fullname>a</fullname><title>A</title></data>")
+    results = scan_directory(tmp_path, max_workers=2)
+    assert [(path.name, parser.title) for path, parser in results] == [("a.xml", "A"), ("b.xml", "B")]
+
+def test_duplicate_data():
+    instance = PageXMLParser(
+        "<page><data><fullname>a</fullname><title>A</title></data>"
+        + "<data><fullname>b</fullname><title>B</title></data></page>"
+    )
+    with pytest.raises(AssertionError):
+        instance.fullname
+
+def test_nested_data():
+    instance = PageXMLParser("<data><fullname>a</fullname><title>A</title><data></data></data>")
+    with pytest.raises(AssertionError):
+        instance.title
+
+def test_title_with_child_elements():
+    # Only the text directly inside the title is kept, as by the original minidom parser
+    instance = PageXMLParser("<data><fullname>a</fullname><title>t<b>x</b>more</title></data>")
+    assert instance.title == "tmore"
@@ -0,0 +1,47 @@
+import csv
+import json
+
+import pytest
+
+from profiling import ConversionProfile, PageProfile, PROFILE_JSON, PROFILE_CSV
+from wikidot import WikidotToMediaWiki, ENGINES
+
+TEXT = "+ Title\n**bold** and **more** [[[page-one]]]\n[[code]]\n**not bold**\n[[/code]]\n|| a || ##red|b## ||\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_page_profile(engine):
+    converter = WikidotToMediaWiki(engine=engine)
+    profile = PageProfile("start")
+    result, _, _ = converter.convert(TEXT, profile=profile)
+    # Profiling does not change the conversion
+    assert result == converter.convert(TEXT)[0]
+    assert profile.input_size == len(TEXT)
+    assert profile.output_size == len(result)
+    assert profile.steps["bold"][1] == 2
+    assert profile.steps["titles"][1] == 1
+    assert profile.steps["links"][1] == 1
+    assert profile.steps["protect"][1] == 1
+    assert profile.steps["colors"][1] == 1
+    assert profile.steps["blocks"][1] == 1
+    assert profile.seconds >= sum(seconds for seconds, _ in profile.steps.values()) * 0.99
+
+def test_conversion_profile(tmp_path, capsys):
+    converter = WikidotToMediaWiki()
+    profile = ConversionProfile()
+    for name in ["start", "page-one"]:
+        page_profile = PageProfile(name)
+        converter.convert(TEXT, profile=page_profile)
+        profile.add(page_profile)
+    assert profile.step_totals()["bold"][1] == 4
+
+    profile.print_summary()
+    assert "Slowest of 2 pages" in capsys.readouterr().out
+
+    profile.write(tmp_path)
+    pages = json.loads((tmp_path / PROFILE_JSON).read_text())["pages"]
+    assert [page["page"] for page in pages] == ["start", "page-one"]
+    assert pages[0]["steps"]["bold"]["matches"] == 2
+    with open(tmp_path / PROFILE_CSV, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == sum(len(page["steps"]) for page in pages)
+    assert {row["page"] for row in rows} == {"start", "page-one"}
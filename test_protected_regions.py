@@ -0,0 +1,24 @@
+from protected_regions import ProtectedRegions
+
+def test_markers():
+    text = 'a [[code]]x[[/code]] b @@y@@ c'
+    instance = ProtectedRegions(text)
+    assert len(instance) == 2
+    assert instance.text == "a \U000F0000 b \U000F0001 c"
+
+def test_restore():
+    text = 'a [[code]]x[[/code]] b [[$ x^2 $]] c <nowiki>**z**</nowiki>'
+    instance = ProtectedRegions(text)
+    expected = 'a \n <nowiki>x</nowiki> b <math>x^2</math> c <nowiki>**z**</nowiki>'
+    assert instance.restore(instance.text) == expected
+
+def test_selected_kinds():
+    text = 'a @@y@@ [[$ x $]]'
+    instance = ProtectedRegions(text, kinds=["math"])
+    assert len(instance) == 1
+    assert instance.restore(instance.text) == 'a @@y@@ <math>x</math>'
+
+def test_marker_characters_in_text():
+    text = "a \U000F0000 @@y@@"
+    instance = ProtectedRegions(text)
+    assert instance.restore(instance.text) == "a \U000F0000 <nowiki>y</nowiki>"
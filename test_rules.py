@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+from rules import Rule, RuleRegistry, compile_pattern, default_rules
+from wikidot import WikidotToMediaWiki, ENGINES
+
+def test_rules_ordered_by_priority():
+    registry = RuleRegistry()
+    registry.add("second", "b", "B", priority=20)
+    registry.add("first", "a", "A", priority=10)
+    assert [rule.name for rule in registry.active] == ["first", "second"]
+
+def test_disabled_rule_not_active():
+    registry = default_rules()
+    registry.disable("bold")
+    assert "bold" not in [rule.name for rule in registry.active]
+    registry.enable("bold")
+    assert "bold" in [rule.name for rule in registry.active]
+
+def test_duplicate_rule_name():
+    registry = RuleRegistry([Rule("smiley", r":-\)", "☺")])
+    with pytest.raises(ValueError):
+        registry.add("smiley", r":\)", "☺")
+
+def test_version_changes():
+    registry = default_rules()
+    version = registry.version
+    registry.disable("toc")
+    assert registry.version != version
+
+def test_load(tmp_path):
+    path = tmp_path / "site_rules.py"
+    path.write_text('rules.add("smiley", r":-\\)", "☺")\nrules.disable("underline")\n')
+    registry = default_rules()
+    registry.load(path)
+    assert "smiley" in registry
+    assert not registry["underline"].enabled
+
+def test_compile_pattern_uses_re():
+    assert isinstance(compile_pattern(r"\*\*(.*?)\*\*"), re.Pattern)
+
+def test_compile_pattern_falls_back_to_regex():
+    regex = pytest.importorskip("regex")
+    pattern = compile_pattern(r"\p{Lu}+")
+    assert isinstance(pattern, regex.Pattern)
+    assert pattern.findall("abc ÉCOLE def") == ["ÉCOLE"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_regex_only_rule(engine):
+    pytest.importorskip("regex")
+    converter = WikidotToMediaWiki(engine=engine)
+    converter.rules.add("shout", r"!!(\p{Lu}+)!!", r"<b>\1</b>", priority=5)
+    assert converter.convert("Say !!ÉCOLE!! **now**")[0] == "Say <b>ÉCOLE</b> '''now'''"
@@ -0,0 +1,69 @@
+import pytest
+
+from staging import StagedFiles, FileStager, STAGE_MODES
+
+def test_index(tmp_path):
+    (tmp_path / "a__x.png").write_bytes(b"123")
+    staged_files = StagedFiles(tmp_path, {"a__x.png": 3})
+    assert "a__x.png" in staged_files
+    assert "b__x.png" not in staged_files
+    assert staged_files["a__x.png"].source is None
+
+    source = tmp_path / "source.png"
+    source.write_bytes(b"4567")
+    (tmp_path / "b__x.png").write_bytes(b"4567")
+    staged_file = staged_files.add("b__x.png", source)
+    assert staged_file.size == 4
+    assert staged_file.source == source
+    assert len(staged_files) == 2
+
+def test_is_identical(tmp_path):
+    (tmp_path / "a__x.png").write_bytes(b"123")
+    staged_files = StagedFiles(tmp_path, {"a__x.png": 3})
+    same = tmp_path / "same.png"
+    same.write_bytes(b"123")
+    different = tmp_path / "different.png"
+    different.write_bytes(b"124")
+    longer = tmp_path / "longer.png"
+    longer.write_bytes(b"1234")
+    assert staged_files.is_identical("a__x.png", same)
+    assert not staged_files.is_identical("a__x.png", different)
+    assert not staged_files.is_identical("a__x.png", longer)
+
+def test_size_mismatch_does_not_read_contents(tmp_path):
+    (tmp_path / "a__x.png").write_bytes(b"123")
+    staged_files = StagedFiles(tmp_path, {"a__x.png": 3})
+    longer = tmp_path / "longer.png"
+    longer.write_bytes(b"1234")
+    assert not staged_files.is_identical("a__x.png", longer)
+    assert staged_files["a__x.png"]._hash is None
+
+@pytest.mark.parametrize("mode", STAGE_MODES)
+def test_file_stager(tmp_path, mode):
+    sources = []
+    for i in range(5):
+        source = tmp_path / f"source{i}.png"
+        source.write_bytes(b"contents %d" % i)
+        sources.append(source)
+    stager = FileStager(mode)
+    for i, source in enumerate(sources):
+        stager.stage(source, tmp_path / f"staged{i}.png")
+    stager.close()
+    # Unsupported modes fall back to copying
+    assert stager.mode in (mode, "copy")
+    for i in range(5):
+        assert (tmp_path / f"staged{i}.png").read_bytes() == b"contents %d" % i
+
+def test_file_stager_replaces_links(tmp_path):
+    source = tmp_path / "source.png"
+    source.write_bytes(b"original")
+    staged = tmp_path / "staged.png"
+    staged.symlink_to(source)
+    other = tmp_path / "other.png"
+    other.write_bytes(b"other")
+    stager = FileStager("copy")
+    stager.stage(other, staged)
+    stager.close()
+    assert not staged.is_symlink()
+    assert staged.read_bytes() == b"other"
+    assert source.read_bytes() == b"original"
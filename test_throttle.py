@@ -0,0 +1,64 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import throttle
+from throttle import Throttle, parse_retry_after
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("soon") is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=100), usegmt=True)
+    assert 90 < parse_retry_after(date) <= 100
+
+def test_rate_is_unlimited_until_slowed_down(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(throttle.time, "sleep", sleeps.append)
+    instance = Throttle()
+    for _ in range(10):
+        instance.wait()
+        instance.success()
+    assert instance.rate is None
+    assert sleeps == []
+
+def test_aimd(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(throttle.time, "sleep", sleeps.append)
+    instance = Throttle(min_rate=0.5, decrease_interval=0.0)
+    instance.rate = 4.0
+    instance.slow_down()
+    assert instance.rate == 2.0
+    instance.success()
+    assert instance.rate == 2.5
+    for _ in range(10):
+        instance.slow_down()
+    assert instance.rate == 0.5
+
+def test_refusals_together_slow_down_once():
+    instance = Throttle(decrease_interval=60.0)
+    instance.rate = 4.0
+    for _ in range(8):
+        instance.slow_down()
+    assert instance.rate == 2.0
+
+def test_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(throttle.time, "sleep", sleeps.append)
+    instance = Throttle(base_delay=1.0, max_delay=10.0)
+    assert instance.backoff(0, retry_after="3") == 3.0
+    for attempt in range(10):
+        assert 0 <= instance.backoff(attempt) <= min(10.0, 2**attempt)
+    assert instance.retries == 11
+    assert len(sleeps) == 11
+    assert instance.rate is not None
+
+def test_job_queue(monkeypatch):
+    monkeypatch.setattr(throttle.time, "sleep", lambda delay: None)
+    instance = Throttle(max_jobs=100, job_check_interval=60.0)
+    assert instance.job_check_due()
+    assert not instance.job_check_due()
+    instance.job_queue(50)
+    assert instance.rate is None
+    instance.job_queue(500)
+    assert instance.rate is not None
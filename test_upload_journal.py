@@ -0,0 +1,85 @@
+import os
+
+from upload_journal import UploadJournal
+
+def record(journal, kind, path, error=None):
+    journal.record(kind, path, journal.content_hash(kind, path), os.stat(path), error)
+
+def test_resume(tmp_path):
+    page = tmp_path / "Start.mktxt"
+    page.write_text("text")
+    other = tmp_path / "Other.mktxt"
+    other.write_text("other")
+    journal = UploadJournal(tmp_path)
+    assert not journal.is_done("page", page)
+    record(journal, "page", page)
+    record(journal, "page", other, error="Failed to create page")
+    journal.close()
+
+    journal = UploadJournal(tmp_path)
+    assert journal.is_done("page", page)
+    assert not journal.is_done("file", page)
+    assert not journal.is_done("page", other)
+    assert journal.failed("page") == {"Other.mktxt"}
+    assert journal.failed("file") == set()
+
+    # Changed contents are uploaded again
+    page.write_text("new text")
+    assert not journal.is_done("page", page)
+    journal.close()
+
+def test_last_entry_counts(tmp_path):
+    page = tmp_path / "Start.mktxt"
+    page.write_text("text")
+    journal = UploadJournal(tmp_path)
+    record(journal, "page", page, error="Failed to create page")
+    record(journal, "page", page)
+    journal.close()
+    # An interrupted write leaves a partial line
+    with open(tmp_path / UploadJournal.FILENAME, "a") as f:
+        f.write('{"kind": "page", "na')
+
+    journal = UploadJournal(tmp_path)
+    assert journal.is_done("page", page)
+    assert journal.failed("page") == set()
+    journal.close()
+    assert len((tmp_path / UploadJournal.FILENAME).read_text().splitlines()) == 1
+
+def test_same_size_is_hashed(tmp_path):
+    page = tmp_path / "Start.mktxt"
+    page.write_text("text")
+    journal = UploadJournal(tmp_path)
+    record(journal, "page", page)
+    page.write_text("tent")
+    stat = os.stat(page)
+    os.utime(page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not journal.is_done("page", page)
+    journal.close()
+
+def test_resume_point(tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"0123456789")
+    journal = UploadJournal(tmp_path)
+    content_hash = journal.content_hash("file", path)
+    assert journal.resume_point("file", path, content_hash) is None
+    journal.record_progress("file", path, content_hash, os.stat(path), "key", 4)
+    journal.record("file", path, content_hash, os.stat(path), error="Failed to upload file")
+    journal.close()
+
+    journal = UploadJournal(tmp_path)
+    assert journal.resume_point("file", path, content_hash) == ("key", 4)
+    assert journal.resume_point("file", path, "other-hash") is None
+    assert journal.failed("file") == {"big.bin"}
+    journal.record("file", path, content_hash, os.stat(path))
+    assert journal.resume_point("file", path, content_hash) is None
+    journal.close()
+
+def test_interrupted_chunked_upload_is_retried(tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"0123456789")
+    journal = UploadJournal(tmp_path)
+    content_hash = journal.content_hash("file", path)
+    journal.record_progress("file", path, content_hash, os.stat(path), "key", 4)
+    assert not journal.is_done("file", path)
+    assert journal.failed("file") == {"big.bin"}
+    journal.close()
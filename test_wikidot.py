@@ -1,4 +1,6 @@
-from wikidot import WikidotToMediaWiki
+import pytest
+
+from wikidot import WikidotToMediaWiki, ENGINES
 
 def test_plain_text():
     text = "This is some plain text."
@@ -76,6 +78,59 @@ def test_code():
     print("result:", result)
     assert result == expected
 
+@pytest.mark.parametrize("engine", ENGINES)
+def test_code_protected_from_inline_markup(engine):
+    text = 'Unclosed // here [[code]]x = 1 // 2[[/code]]'
+    expected = "Unclosed // here \n <nowiki>x = 1 // 2</nowiki>"
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text, expected", [
+    ("Example:\n\n[[code]]\nx = 1\n[[/code]]", "Example:\n\n <nowiki>\nx = 1\n</nowiki>"),
+    ("Example:\n[[code]]\nx = 1\n[[/code]]", "Example:\n\n <nowiki>\nx = 1\n</nowiki>"),
+])
+def test_code_after_blank_line(engine, text, expected):
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_code_protected_from_tables(engine):
+    text = '[[code]]\n|| not a table ||\n\n\n[[/code]]'
+    expected = "<nowiki>\n|| not a table ||\n\n\n</nowiki>"
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+# Protected Text
+# ==============
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_math(engine):
+    text = "Einstein: [[$ E = mc^^2^^ $]]"
+    expected = "Einstein: <math>E = mc^^2^^</math>"
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_raw(engine):
+    text = "This is @@**not bold**@@."
+    expected = "This is <nowiki>**not bold**</nowiki>."
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_nowiki(engine):
+    text = "This is <nowiki>//not italic//</nowiki>."
+    expected = text
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
 # Image
 # =====
 
@@ -334,3 +389,136 @@ def test_file_excessive_matching():
     print("result:", result)
     assert result == expected
     assert linked_files == ["filename"]
+
+# Single-pass Engine
+# ==================
+@pytest.mark.parametrize("engine", ENGINES)
+def test_title_text_elsewhere_in_page(engine):
+    # Only the title is converted, not the same text later in a line
+    text = "+ Total\nThe running + Total is not a heading."
+    expected = "= Total =\nThe running + Total is not a heading."
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+# Colors and tables
+# =================
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_color(engine):
+    text = "This is ##red|hot## text."
+    expected = "This is <span style=\"color:red\">hot</span> text."
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text", ["##red|", "## a | b", "a ##red|b"])
+def test_unterminated_color(engine, text):
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == text
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_table_at_end_of_page(engine):
+    text = "Text\n\n\n\n|| a || b ||\n|| c || d ||"
+    expected = "Text\n\n{| class=\"wikitable\"\n| a || b\n|-\n| c || d\n|}"
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_every_run_of_newlines_collapsed(engine):
+    # More than eight runs, as the collapse once stopped after eight
+    text = "\n\n\n".join(["|| a ||", "Text"] * 6)
+    expected = "\n\n".join(["{| class=\"wikitable\"\n| a\n|}", "Text"] * 6)
+    instance = WikidotToMediaWiki(engine=engine)
+    result, _, _ = instance.convert(text)
+    assert result == expected
+
+
+single_pass_samples = [
+    "This is some plain text.",
+    "This is some [[size 180%]]re-sized text[[/size]].",
+    "This is an example of superscript: 2^^nd^^.",
+    "This is [[[some text]]] with a link to an [[[internal page]]].",
+    "[[[internal_page | alternative text]]]",
+    'This is a code block: [[code type="python"]]1 + 2 == 3[[/code]]',
+    'This is a link to an image: [[image filename.png size="medium" alt="alternative text"]]',
+    "This is a link to a floating-left-aligned image: [[f<image filename.png]]",
+    "This is a gallery of images:\n[[gallery]]\n: image1.png\n: image2.jpg\n[[/gallery]]",
+    "[[file proposal.pdf|Here]] is the proposal that was submitted.",
+    "|| [[file filename]] ||",
+    "* [[file filename with spaces-hypens_underscores.pdf| Description with spaces.]]",
+    "+ Title\n++ **Bold** and //italic// heading\n * item\n  * nested item",
+    "[[table]]\n[[row]]\n[[cell]]a[[/cell]]\n[[/row]]\n[[/table]]",
+    '[[table style="width: 50%"]]\n[[row]]\n[[cell]]**a** [[[b]]][[/cell]]\n[[/row]]\n[[/table]]',
+    "# one\n * **two**\n  # three",
+    "||~ A |||| B ||\n||< [[[link]]] ||= //x// ||",
+    "||~ Heading ||\n|| ##red|hot## || [[$ x^2 $]] ||",
+    "See http://example.com//path and [!-- a comment --].",
+]
+
+@pytest.mark.parametrize("text", single_pass_samples)
+def test_single_pass_matches_cascade(text):
+    cascade = WikidotToMediaWiki(engine="cascade")
+    single_pass = WikidotToMediaWiki(engine="single-pass")
+    assert single_pass.convert(text, file_prefix="page__") == cascade.convert(text, file_prefix="page__")
+
+single_pass_rule_samples = [
+    # The whole match, which must not be converted again
+    ("wrap", r"TODO", r"<b>\g<0></b>", "TODO: **this**", "<b>TODO</b>: '''this'''"),
+    # Escapes in the template
+    ("newline", r"<br>", r"a\nb\\c", "x<br>y", "xa\nb\\cy"),
+    ("octal", r"(x)(y)", r"\2\0\1\101", "xy", "y\x00xA"),
+    ("groups", r"\{(?P<word>[^}]+)\}", r"[\g<word>|\1]", "{**x**}", "['''x'''|'''x''']"),
+]
+
+@pytest.mark.parametrize("name, pattern, replacement, text, expected", single_pass_rule_samples)
+def test_single_pass_rule_templates_match_cascade(name, pattern, replacement, text, expected):
+    results = []
+    for engine in ENGINES:
+        converter = WikidotToMediaWiki(engine=engine)
+        converter.rules.add(name, pattern, replacement, priority=5)
+        results.append(converter.convert(text))
+    assert results[0] == results[1]
+    assert results[0][0] == expected
+
+# The engines differ where the README says they do
+def test_single_pass_leaves_overlapping_link():
+    text = "**a [[[foo|b**c]]]"
+    assert WikidotToMediaWiki(engine="cascade").convert(text) == ("'''a [[foo|b'''c]]", ["foo"], [])
+    assert WikidotToMediaWiki(engine="single-pass").convert(text) == ("'''a [[[foo|b'''c]]]", [], [])
+
+def test_single_pass_keeps_text_between_galleries():
+    text = "[[gallery]]\n: a.png\n[[/gallery]]\nmiddle\n[[gallery]]\n: b.png\n[[/gallery]]"
+    assert WikidotToMediaWiki(engine="cascade").convert(text)[0] == "<gallery>\na.png\nb.png\n</gallery>"
+    assert WikidotToMediaWiki(engine="single-pass").convert(text)[0] == (
+        "<gallery>\na.png\n</gallery>\nmiddle\n<gallery>\nb.png\n</gallery>"
+    )
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        WikidotToMediaWiki(engine="unknown")
+
+# Rule Registry
+# =============
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_site_rule(engine):
+    text = "See [[[wp:Ozone layer]]] and [[[internal page]]]."
+    expected = "See [[wikipedia:Ozone layer]] and [[internal page]]."
+    instance = WikidotToMediaWiki(engine=engine)
+    instance.rules.add("interwiki", r"\[\[\[wp:([^\]|]*)\]\]\]", r"[[wikipedia:\1]]", priority=5)
+    result, links, _ = instance.convert(text)
+    assert result == expected
+    assert links == ["internal page"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_disabled_rule(engine):
+    text = "This is an example of superscript: 2^^nd^^ and **bold**."
+    expected = "This is an example of superscript: 2^^nd^^ and '''bold'''."
+    instance = WikidotToMediaWiki(engine=engine)
+    instance.rules.disable("superscript")
+    result, _, _ = instance.convert(text)
+    assert result == expected
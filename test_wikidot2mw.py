@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import wikidot2mw
+
+def imported_modules(command):
+    """The modules imported by running a command's main() with --help."""
+    code = (
+        "import sys, wikidot2mw\n"
+        + "try:\n"
+        + f"    wikidot2mw.main([{command!r}, '--help'])\n"
+        + "except SystemExit:\n"
+        + "    pass\n"
+        + "sys.stderr.write(' '.join(sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+    )
+    return set(result.stderr.split())
+
+def test_convert_does_not_load_upload_modules():
+    modules = imported_modules("convert")
+    assert "convert" in modules
+    assert not {"requests", "mediawiki", "regex", "xml.sax.saxutils"} & modules
+
+def test_check_does_not_load_convert_modules():
+    modules = imported_modules("check")
+    assert "check" in modules
+    assert not {"convert", "catalog", "sqlite3", "requests", "regex"} & modules
+
+def test_command_runs(tmp_path):
+    (tmp_path / "start.txt").write_text("Hello")
+    (tmp_path / "start.xml").write_text("<data><fullname>start</fullname><title>Start</title></data>")
+    assert wikidot2mw.main(["check", str(tmp_path)]) == 0
+
+def test_unknown_command():
+    with pytest.raises(SystemExit):
+        wikidot2mw.main(["unknown"])
@@ -0,0 +1,45 @@
+import gzip
+import xml.etree.ElementTree as ET
+
+from xml_export import DumpWriter, EXPORT_VERSION, write_file_manifest, import_commands
+
+NS = {"mw": f"http://www.mediawiki.org/xml/export-{EXPORT_VERSION}/"}
+
+def read_pages(f):
+    root = ET.parse(f).getroot()
+    return [
+        (page.find("mw:title", NS).text, page.find("mw:revision/mw:text", NS))
+        for page in root.findall("mw:page", NS)
+    ]
+
+def test_dump_writer(tmp_path):
+    path = tmp_path / "pages.xml"
+    with DumpWriter(path) as dump:
+        dump.write_page("Start", "== Start ==\n<span style=\"color:red\">A & B</span> é\x0b")
+        dump.write_page("Page <One>", "")
+    assert dump.pages == 2
+    pages = read_pages(path)
+    assert [title for title, _ in pages] == ["Start", "Page <One>"]
+    text = pages[0][1]
+    # Characters that XML does not allow are dropped
+    assert text.text == "== Start ==\n<span style=\"color:red\">A & B</span> é"
+    assert text.get("bytes") == str(len(text.text.encode("utf-8")))
+
+def test_compressed_dump(tmp_path):
+    path = tmp_path / "pages.xml.gz"
+    with DumpWriter(path) as dump:
+        dump.write_page("Start", "text")
+    with gzip.open(path) as f:
+        assert read_pages(f)[0][1].text == "text"
+
+def test_file_manifest(tmp_path):
+    upload_dir = tmp_path / "files_to_upload"
+    upload_dir.mkdir()
+    (upload_dir / "start__pic.PNG").write_bytes(b"12345")
+    (upload_dir / "page-one__notes.pdf").write_bytes(b"1")
+    extensions = write_file_manifest(upload_dir, tmp_path / "files.tsv")
+    assert extensions == {"png", "pdf"}
+    lines = (tmp_path / "files.tsv").read_text().splitlines()
+    assert lines == ["name\tsize\tpage", "page-one__notes.pdf\t1\tpage-one", "start__pic.PNG\t5\tstart"]
+    commands = import_commands("pages.xml", upload_dir, extensions)
+    assert "--extensions=pdf,png" in commands[1]
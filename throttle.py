@@ -0,0 +1,126 @@
+import collections
+import email.utils
+import random
+import threading
+import time
+
+# API errors that ask the client to slow down
+THROTTLE_ERRORS = ("maxlag", "ratelimited")
+# HTTP statuses that ask the client to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Returns the number of seconds given by a Retry-After header, or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class Throttle():
+    """Paces the requests sent to a wiki, adapting the rate to what the wiki will accept.
+
+    The rate grows additively while requests succeed and is halved whenever the wiki asks
+    the client to slow down (a maxlag or ratelimited error, HTTP 429 or 503, or a long job
+    queue), so it stays near the fastest rate the wiki accepts.  The rate is shared by all
+    the threads using the client.  Until the wiki first asks the client to slow down, the
+    rate is not limited.
+
+    Retries wait for the time given by Retry-After, or else back off exponentially with
+    jitter.
+    """
+    def __init__(self, max_retries=8, base_delay=1.0, max_delay=120.0, increase=1.0, decrease=0.5,
+                 min_rate=0.1, decrease_interval=1.0, max_jobs=1000, job_check_interval=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase = increase
+        self.decrease = decrease
+        self.min_rate = min_rate
+        self.decrease_interval = decrease_interval
+        self.max_jobs = max_jobs
+        self.job_check_interval = job_check_interval
+        # Requests per second, or None when not limited
+        self.rate = None
+        self.retries = 0
+        self._next_time = 0.0
+        self._last_job_check = None
+        self._last_decrease = None
+        self._completed = collections.deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Waits until the next request may be sent."""
+        with self._lock:
+            if self.rate is None:
+                return
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + 1.0/self.rate
+        if start > now:
+            time.sleep(start - now)
+
+    def success(self):
+        with self._lock:
+            now = time.monotonic()
+            self._completed.append(now)
+            # Keep the times of the last few seconds' requests, to measure the current rate
+            while self._completed and self._completed[0] < now - 5.0:
+                self._completed.popleft()
+            if self.rate is not None:
+                # About `increase` more requests per second each second, but never more than
+                # doubling at once when the rate is low
+                self.rate += min(self.increase / self.rate, self.rate)
+
+    def slow_down(self):
+        """Reduces the rate multiplicatively.
+
+        Requests refused together, such as those sent by several threads at once, only
+        reduce the rate once.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_decrease is not None and now - self._last_decrease < self.decrease_interval:
+                return
+            self._last_decrease = now
+            if self.rate is None:
+                # Start from the rate that the wiki has just refused
+                window = self._completed[-1] - self._completed[0] if len(self._completed) > 1 else 0.0
+                current_rate = len(self._completed) / window if window > 0 else 1.0
+                self.rate = current_rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+    def backoff(self, attempt, retry_after=None):
+        """Slows down, then waits before retrying a refused request.  Returns the delay."""
+        self.slow_down()
+        with self._lock:
+            self.retries += 1
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        time.sleep(delay)
+        return delay
+
+    def job_check_due(self):
+        """True (once) if it is time to check the size of the wiki's job queue."""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_job_check is not None and now - self._last_job_check < self.job_check_interval:
+                return False
+            self._last_job_check = now
+            return True
+
+    def job_queue(self, jobs):
+        """Slows down if the wiki's job queue holds more than max_jobs jobs."""
+        if jobs > self.max_jobs:
+            print(f"  The wiki's job queue holds {jobs} jobs; slowing down")
+            self.slow_down()
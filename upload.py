@@ -1,13 +1,166 @@
 #!/usr/bin/env python3
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
 from pathlib import Path
+import re
 import warnings
 
+import urllib3
+
+from catalog import SiteCatalog, PAGE, FILE, UPLOAD_DIRECTORY
+from manifest import hash_file
 import mediawiki
+from throttle import Throttle
+from upload_journal import UploadJournal
+
+def upload_one(wiki, kind, path, journal=None):
+    """Uploads a page or file.  Returns a note about the upload (or None) and the error (or None)."""
+    content_hash = None
+    try:
+        if journal is not None:
+            stat = os.stat(path)
+            content_hash = journal.content_hash(kind, path)
+        if kind == "page":
+            wiki.create_page(
+                title=path.stem,
+                text=path.read_text()
+            )
+            uploaded = True
+        elif journal is None:
+            uploaded = wiki.upload_file(filename=path.name, path=path)
+        else:
+            uploaded = wiki.upload_file(
+                filename=path.name,
+                path=path,
+                resume_from=journal.resume_point(kind, path, content_hash),
+                progress=lambda filekey, offset: journal.record_progress(
+                    kind, path, content_hash, stat, filekey, offset
+                )
+            )
+        if uploaded:
+            note = None
+        else:
+            note = "An identical copy of the file has already been uploaded"
+        error = None
+    except Exception as e:
+        note = None
+        error = e
+    if content_hash is not None:
+        journal.record(kind, path, content_hash, stat, error)
+    return note, error
+
+def page_text_sha1(text):
+    """The SHA-1 that MediaWiki would give the text, which it saves without trailing whitespace."""
+    return hashlib.sha1(text.rstrip(" \t\n\r\0\x0b").encode("utf-8")).hexdigest()
+
+def file_key(filename):
+    """A filename as MediaWiki stores it."""
+    filename = re.sub(r"[ _]+", "_", filename).strip("_")
+    return filename[:1].upper() + filename[1:]
+
+def find_unchanged(wiki, kind, paths, workers=1, journal=None):
+    """Returns the paths whose contents are already on the wiki, found with batched queries.
+
+    Paths that cannot be read are not unchanged, so that uploading them reports the error.
+    """
+    if len(paths) == 0:
+        return set()
+    if kind == "page":
+        content_hash = lambda path: page_text_sha1(path.read_text())
+    else:
+        content_hash = hash_file if journal is None else lambda path: journal.content_hash(kind, path)
+
+    def local_sha1(path):
+        try:
+            return content_hash(path)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        local_sha1s = list(executor.map(local_sha1, paths))
+    if kind == "page":
+        remote_sha1s = wiki.page_sha1s(path.stem for path in paths)
+        remote_sha1s = [remote_sha1s[path.stem] for path in paths]
+    elif wiki.file_count() <= len(paths):
+        # Fewer requests are needed to list every file on the wiki
+        remote_sha1s = wiki.all_file_sha1s()
+        remote_sha1s = [remote_sha1s.get(file_key(path.name)) for path in paths]
+    else:
+        remote_sha1s = wiki.file_sha1s(path.name for path in paths)
+        remote_sha1s = [remote_sha1s[path.name] for path in paths]
+    return {
+        path for path, local_sha1, remote_sha1 in zip(paths, local_sha1s, remote_sha1s)
+        if local_sha1 is not None and local_sha1 == remote_sha1
+    }
+
+def list_uploads(directory, pattern, catalogued_names=()):
+    """The paths in directory that match pattern, along with any catalogued names, in order.
 
-def main():
-    parser = argparse.ArgumentParser()
+    Catalogued pages or files that have since been deleted are kept, so that they are reported
+    as failed uploads, and files added to the directory since the conversion are included.
+    """
+    paths = set(directory.glob(pattern))
+    paths.update(directory / name for name in catalogued_names)
+    return sorted(paths)
+
+def upload_all(wiki, kind, paths, workers=1, journal=None, retry_failed=False, force=False):
+    """Uploads pages or files, using a pool of threads if workers > 1.
+
+    With a journal, items that have already been uploaded are skipped, or, with
+    retry_failed, only the items that failed last time are uploaded.  Unless force is
+    set, items whose contents are already on the wiki are skipped too.  Progress is
+    printed in the order the paths are given.  Returns a list of the failures.
+    """
+    if journal is not None:
+        if retry_failed:
+            failed = journal.failed(kind)
+            paths = [path for path in paths if path.name in failed]
+            print(f"Retrying {len(paths)} {kind}s that failed to upload")
+        elif not force:
+            remaining = [path for path in paths if not journal.is_done(kind, path)]
+            if len(remaining) < len(paths):
+                print(f"Skipping {len(paths) - len(remaining)} {kind}s that have already been uploaded")
+            paths = remaining
+
+    if not force:
+        unchanged = find_unchanged(wiki, kind, paths, workers, journal)
+        if len(unchanged) > 0:
+            print(f"Skipping {len(unchanged)} {kind}s that are unchanged on the wiki")
+            paths = [path for path in paths if path not in unchanged]
+            if journal is not None:
+                for path in sorted(unchanged):
+                    journal.record(kind, path, journal.content_hash(kind, path), os.stat(path))
+
+    failed_uploads = []
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        results = executor.map(lambda path: upload_one(wiki, kind, path, journal), paths)
+    else:
+        executor = None
+        results = (upload_one(wiki, kind, path, journal) for path in paths)
+
+    try:
+        for path, (note, error) in zip(paths, results):
+            print(f"Uploading {kind} {path.name}")
+            if note is not None:
+                print("  "+note)
+            if error is not None:
+                print("  Failed")
+                failed_uploads.append({
+                    "filename": path.name,
+                    "error": str(error)
+                })
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return failed_uploads
+
+def make_parser(prog=None):
+    """Returns the parser of upload.py's command-line arguments."""
+    parser = argparse.ArgumentParser(prog=prog)
 
     parser.add_argument("source", help="Directory containing files converted to MediaWiki format")
     parser.add_argument(
@@ -15,14 +168,76 @@ def main():
         default="SECRETS.py",
         help="File containing the location and credentials of the MediaWiki site"
     )
+    parser.add_argument(
+        "--session-file",
+        default=None,
+        help="File in which to save the login, so later runs can reuse it rather than logging in again"
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="Number of pages or files to upload at the same time (default 1)"
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="Maximum number of requests sent to the site at the same time (default: the number of workers)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=float,
+        default=mediawiki.DEFAULT_CHUNK_SIZE / 2**20,
+        help="Size in MiB of the chunks in which large files are uploaded (default %(default)g)"
+    )
+    parser.add_argument(
+        "--chunked-upload-threshold",
+        type=float,
+        default=None,
+        help="Files larger than this size in MiB are uploaded in chunks (default: the chunk size)"
+    )
+    parser.add_argument(
+        "--maxlag",
+        type=float,
+        default=5,
+        help="Wait whenever the wiki's database replicas lag by more than this many seconds (default 5)"
+    )
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=1000,
+        help="Slow down whenever the wiki's job queue holds more than this many jobs (default 1000)"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        default=False,
+        action="store_true",
+        help="Only upload the pages and files that the journal records as having failed"
+    )
+    parser.add_argument(
+        "--force",
+        default=False,
+        action="store_true",
+        help="Upload every page and file, even those the journal or the wiki show are unchanged"
+    )
+    parser.add_argument(
+        "--no-journal",
+        default=False,
+        action="store_true",
+        help="Upload everything, without reading or writing the journal of finished uploads"
+    )
     parser.add_argument(
         "--only-pages",
         default=False,
         action='store_true',
         help="Only upload pages (don't upload any files)"
     )
+    return parser
+
 
-    arguments = parser.parse_args()
+def main(argv=None, prog=None):
+    arguments = make_parser(prog).parse_args(argv)
 
     # Process secrets file
     secrets_path = Path(arguments.secrets)
@@ -33,54 +248,63 @@ def main():
     print(f"  Bot username: {secrets['bot_username']}")
 
     # Connect to MediaWiki site
-    wiki = mediawiki.MediaWiki(secrets["endpoint"], secrets["verify"])
-    wiki.login(secrets["bot_username"], secrets["bot_password"])
+    if not secrets["verify"]:
+        # Hide repeated SSL certificate warnings
+        warnings.simplefilter("ignore", urllib3.exceptions.InsecureRequestWarning)
+    max_requests = arguments.max_requests or arguments.workers
+    chunked_upload_threshold = arguments.chunked_upload_threshold or arguments.chunk_size
+    wiki = mediawiki.MediaWiki(
+        secrets["endpoint"],
+        secrets["verify"],
+        max_requests=max_requests,
+        chunk_size=int(arguments.chunk_size * 2**20),
+        chunked_upload_threshold=int(chunked_upload_threshold * 2**20),
+        throttle=Throttle(max_jobs=arguments.max_jobs)
+    )
+    wiki.maxlag = arguments.maxlag
+    login = wiki.login(secrets["bot_username"], secrets["bot_password"], session_path=arguments.session_file)
+    if login["login"].get("reused"):
+        print(f"Reusing the login saved in {arguments.session_file}")
 
     # Get pages and files to upload
     source = Path(arguments.source)
-    page_paths = sorted(source.glob("*.mktxt"))
-    file_paths = sorted((source / "files_to_upload").glob("*"))
+    if SiteCatalog.exists(source):
+        # The converter has catalogued its output
+        catalog = SiteCatalog(source)
+        page_paths = list_uploads(source, "*.mktxt", catalog.outputs(PAGE))
+        file_paths = list_uploads(source / UPLOAD_DIRECTORY, "*", catalog.outputs(FILE))
+        catalog.close()
+    else:
+        page_paths = list_uploads(source, "*.mktxt")
+        file_paths = list_uploads(source / UPLOAD_DIRECTORY, "*")
 
     print(f"Found {len(page_paths)} pages")
     print(f"Found {len(file_paths)} files")
 
     # Upload pages
-    for page_path in page_paths:
-        print(f"Uploading page {page_path.name}")
-        # Hide repeated SSL certificate warnings
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            wiki.create_page(
-                title=page_path.stem,
-                text=page_path.read_text()
+    journal = None if arguments.no_journal else UploadJournal(source)
+    try:
+        failed_uploads = upload_all(
+            wiki, "page", page_paths, arguments.workers, journal, arguments.retry_failed, arguments.force
+        )
+
+        if arguments.only_pages:
+            print("Not uploading any files as the option --only-pages was set")
+        else:
+            # Upload files
+            failed_uploads += upload_all(
+                wiki, "file", file_paths, arguments.workers, journal, arguments.retry_failed, arguments.force
             )
-    
-    if arguments.only_pages:
-        print("Not uploading any files as the option --only-pages was set")
-        return
-        
-    # Upload files
-    failed_uploads = []
-    for file_path in file_paths:
-        print(f"Uploading file {file_path.name}")
-        try:
-            # Hide repeated SSL certificate warnings
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                wiki.upload_file(
-                    filename=file_path.name,
-                    path=file_path
-                )
-        except Exception as e:
-            print("  Failed")
-            failed_uploads.append({
-                "filename":file_path.name, 
-                "error": str(e)
-            })
+    finally:
+        if journal is not None:
+            journal.close()
+
+    if wiki.throttle.retries > 0:
+        print(f"The wiki asked for {wiki.throttle.retries} requests to be sent again later")
 
     # Output list of failures
     if len(failed_uploads) > 0:
-        print("The following files failed to upload:")
+        print("The following pages and files failed to upload:")
         for failed_upload in failed_uploads:
             print(f"  {failed_upload['filename']}: {failed_upload['error']}")
 
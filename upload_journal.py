@@ -0,0 +1,121 @@
+import json
+import os
+from pathlib import Path
+import threading
+
+from manifest import hash_file
+
+DONE = "done"
+FAILED = "failed"
+# A chunked upload that has sent some of its chunks
+PARTIAL = "partial"
+
+
+class UploadJournal():
+    """Records each page and file as its upload finishes, so an interrupted upload can resume.
+
+    The journal is a file of JSON lines in the directory being uploaded.  Each line gives an
+    item's kind ("page" or "file"), name, the SHA-1 of the contents that were uploaded (and
+    their size and modification time, so unchanged files need not be hashed again) and
+    whether the upload succeeded.  The last line for an item is the one that counts.  For
+    a chunked upload, a line is also written after each chunk, so that an interrupted upload
+    can resume from the last chunk the wiki accepted.
+    """
+    FILENAME = "upload_journal.jsonl"
+
+    def __init__(self, source_dir):
+        self.path = Path(source_dir) / self.FILENAME
+        self.entries = {}
+        if self.path.is_file():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[(entry["kind"], entry["name"])] = entry
+                    except (ValueError, KeyError):
+                        # A line cut short when an upload was interrupted
+                        continue
+        self._lock = threading.Lock()
+        self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _compact(self):
+        # Keep only the last line for each item
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry)+"\n")
+        os.replace(temporary_path, self.path)
+
+    def close(self):
+        self._file.close()
+
+    def content_hash(self, kind, path):
+        """The SHA-1 of a file, reusing the journal's hash if its size and mtime are unchanged."""
+        stat = os.stat(path)
+        entry = self.entries.get((kind, Path(path).name))
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["hash"]
+        return hash_file(path)
+
+    def is_done(self, kind, path):
+        """True if the item was uploaded with the contents it has now."""
+        entry = self.entries.get((kind, Path(path).name))
+        if entry is None or entry["status"] != DONE:
+            return False
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            # Uploading it again reports the error
+            return False
+        if entry["size"] != size:
+            return False
+        return self.content_hash(kind, path) == entry["hash"]
+
+    def failed(self, kind):
+        """The names of the items whose last upload failed or was interrupted."""
+        return {
+            name for (entry_kind, name), entry in self.entries.items()
+            if entry_kind == kind and entry["status"] in (FAILED, PARTIAL)
+        }
+
+    def resume_point(self, kind, path, content_hash):
+        """The (filekey, offset) reached by an unfinished chunked upload of the same contents, or None."""
+        entry = self.entries.get((kind, Path(path).name))
+        if entry is None or entry["status"] == DONE or entry["hash"] != content_hash or "filekey" not in entry:
+            return None
+        return entry["filekey"], entry["offset"]
+
+    def record(self, kind, path, content_hash, stat, error=None):
+        """Records an upload of the contents with the given hash and os.stat() result."""
+        entry = self._entry(kind, path, content_hash, stat, DONE if error is None else FAILED)
+        if error is not None:
+            entry["error"] = str(error)
+            # Keep the point a failed chunked upload reached
+            resume_point = self.resume_point(kind, path, content_hash)
+            if resume_point is not None:
+                entry["filekey"], entry["offset"] = resume_point
+        self._write(entry)
+
+    def record_progress(self, kind, path, content_hash, stat, filekey, offset):
+        """Records the chunks of a file that the wiki has accepted."""
+        entry = self._entry(kind, path, content_hash, stat, PARTIAL)
+        entry["filekey"] = filekey
+        entry["offset"] = offset
+        self._write(entry)
+
+    def _entry(self, kind, path, content_hash, stat, status):
+        return {
+            "kind": kind,
+            "name": Path(path).name,
+            "hash": content_hash,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "status": status,
+        }
+
+    def _write(self, entry):
+        with self._lock:
+            self.entries[(entry["kind"], entry["name"])] = entry
+            self._file.write(json.dumps(entry)+"\n")
+            self._file.flush()
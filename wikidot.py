@@ -8,263 +8,462 @@
 # Improved 2022 by Matthew Walker
 # https://github.com/bodekerscientific/wikidot-to-mediawiki
 
-import regex as re
-import uuid			## to generate random UUIDs using uuid.uuid4()
+import functools
+import hashlib
+import re
+
+from blocks import BlockParser
+from link_resolver import LinkResolver
+from protected_regions import ProtectedRegions, PROTECTED_KINDS
+from rules import compile_pattern, default_rules
+
+# Increase when a change to the converter alters its output, so that incremental runs of
+# convert.py reconvert every page
+CONVERTER_VERSION = 6
+
+# Conversion engines available to WikidotToMediaWiki.  The cascade applies each rule to
+# the whole page in turn; the single-pass engine tokenizes the page once and builds the
+# output as it goes.
+ENGINES = ["cascade", "single-pass"]
+
+# Patterns used by the conversion, compiled once when the module is loaded
+_TITLE = re.compile(r"^(\++)([^\n]*)$", re.MULTILINE)
+_INTERNAL_LINK = re.compile(r"\[\[\[([\s\S]*?)\]\]\]")
+_ALT_TEXT = re.compile(r"([\S\s]*?)[\s]*\|[\s]*([\S\s]*?)")
+_IMAGE = re.compile(r"\[\[(f?[=<>]?)image\s*([\S\s]*?)\s*\]\]")
+_IMAGE_ATTRIBUTE = re.compile(r"(\S*?)=\"([\S\s]*?)\"", re.MULTILINE)
+_GALLERY = re.compile(r"\[\[gallery[ \S]*?\]\]([\S\s ]*)\[\[/gallery\]\]", re.MULTILINE)
+_GALLERY_ITEM = re.compile(r"^: ([\S]*)", re.MULTILINE)
+_FILE = re.compile(r"\[\[file[\s]*([\S\s]*?)[\s]*\]\]", re.MULTILINE)
+_COLOR = r"(?P<color>##(?P<color_name>(?:(?!##)[^|])*)\|(?P<color_body>[\s\S]*?)##)"
+_COLORS = re.compile(_COLOR)
+_MULTI_NEWLINES = re.compile(r"\n\n+")
+# An escape in a rule's replacement template, as re reads them: a named or numbered group,
+# an octal escape (which re reads in preference to a group number) or any other escape
+_TEMPLATE_ESCAPE = re.compile(
+    r"\\(?:g<(?P<name>\w+)>|(?P<octal>0[0-7]{0,2}|[0-7]{3})|(?P<number>\d\d?)|.)", re.DOTALL
+)
+
+# Tokens recognised by the single-pass engine.  Alternatives are tried in order at each
+# position: the registry's rules first (as the cascade applies them before any structural
+# conversion), then the structural tokens.  Constructs that share a prefix (such as "[[["
+# and "[[") are listed longest first.  Tables and lists are left to the BlockParser.
+_SINGLE_PASS_STRUCTURE = [
+    r"(?P<link>\[\[\[(?P<link_body>[\s\S]*?)\]\]\])",
+    r"(?P<image>\[\[(?P<image_format>f?[=<>]?)image\s*(?P<image_body>[\S\s]*?)\s*\]\])",
+    r"(?P<gallery>\[\[gallery[ \S]*?\]\](?P<gallery_body>[\S\s]*?)\[\[/gallery\]\])",
+    r"(?P<file>\[\[file[\s]*(?P<file_body>[\S\s]*?)[\s]*\]\])",
+    _COLOR,
+    r"(?P<title>^(?P<title_level>\++)(?P<title_body>[^\n]*)$)",
+]
+# Regex flags that are carried into the single-pass pattern as scoped inline flags (the
+# pattern as a whole is multiline)
+_SCOPED_FLAGS = [(re.IGNORECASE, "i"), (re.DOTALL, "s"), (re.VERBOSE, "x")]
+# The cascade's step that corresponds to each single-pass token, for profiling
+_SINGLE_PASS_STEPS = {
+    "link": "links",
+    "image": "images",
+    "gallery": "galleries",
+    "file": "files",
+    "color": "colors",
+    "title": "titles",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_template(template):
+    """Splits a rule's replacement template into (literal, group) pairs, one of which is None.
+
+    Literals may still hold escapes to be expanded.
+    """
+    pieces = []
+    literal_start = 0
+    for escape in _TEMPLATE_ESCAPE.finditer(template):
+        group = escape.group("name") or escape.group("number")
+        if group is None:
+            continue
+        if escape.start() > literal_start:
+            pieces.append((template[literal_start : escape.start()], None))
+        pieces.append((None, int(group) if group.isdigit() else group))
+        literal_start = escape.end()
+    if literal_start < len(template):
+        pieces.append((template[literal_start:], None))
+    return pieces
+
+
+class _SinglePassState():
+    def __init__(self, file_prefix, link_resolver, profile=None):
+        self.file_prefix = file_prefix
+        self.link_resolver = link_resolver
+        self.profile = profile
+        self.internal_links = []
+        # Kept apart so linked files are reported in the same order as the cascade
+        self.image_files = []
+        self.gallery_files = []
+        self.file_files = []
+
 
 class WikidotToMediaWiki():
-    def __init__(self):
-        # regex for URL found on http://regexlib.com/REDetails.aspx?regex_id=501
-        self.url_regex = r"(http|https|ftp)\://([a-zA-Z0-9\.\-]+(\:[a-zA-Z0-9\.&amp;%\$\-]+)*@)*((25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9])\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[0-9])|localhost|([a-zA-Z0-9\-]+\.)*[a-zA-Z0-9\-]+\.(com|edu|gov|int|mil|net|org|biz|arpa|info|name|pro|aero|coop|museum|[a-zA-Z]{2}))(\:[0-9]+)*(/($|[a-zA-Z0-9\.\,\?\'\\\+&amp;%\$#\=~_\-]+))*[/]?"
-
-        self.static_replacements = { '[[toc]]': '', # no equivalent for table of contents in Markdown
-                                   }
-        self.regex_replacements = { r'([^:])//([\s\S ]*?[^:])//': r"\1''\2''", # italics
-                                    r'([^:])\*\*([\s\S ]*?)\*\*': r"\1'''\2'''", # bold
-                                    r'([^:])\[!--([\s\S ]*?)--\]': r"\1<!--\2-->", # comments
-                                    r'([^:])__([\s\S ]*?)__': r"\1'''\2'''", # underlining → bold
-                                    #r'([^:]){{([\s\S ]*?)}}': r'\1`\2`', # inline monospaced text
-                                    r'\^\^([\S\s]*?)\^\^': r'<sup>\1</sup>', # superscript
-                                    r'\[\[size\s*\S*?\]\]': r'', # ignore text sizing
-                                    r'\[\[/size\s*?\]\]' : r'',  # ignore text sizing
-                                  }
+    def __init__(self, engine="cascade", rules=None, includer=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown conversion engine '{engine}'; expected one of {ENGINES}")
+        self.engine = engine
+
+        # The simpler regex replacements; sites may add, remove or disable rules here
+        self.rules = rules if rules is not None else default_rules()
+        # Regions that no rule may change (see protected_regions.py)
+        self.protected_kinds = list(PROTECTED_KINDS)
+        # Expands [[include]] (see includes.py); without one, includes are left as they are
+        self.includer = includer
+        self._single_pass_tokens = None
+        self._single_pass_rules = None
+        self._single_pass_version = None
         self.regex_split_condition = r"^\+ ([^\n]*)$"
 
-    def convert(self, text, file_prefix="", fullname_to_title={}):
+    def fingerprint(self):
+        """Returns a hash of everything about this converter that affects its output."""
+        parts = [str(CONVERTER_VERSION), self.engine, ",".join(self.protected_kinds), str(self.includer is not None)]
+        for rule in self.rules.active:
+            replacement = getattr(rule.replacement, "__qualname__", rule.replacement)
+            parts.append(f"{rule.name}:{rule.priority}:{rule.regex.flags}:{rule.pattern}:{replacement}")
+        return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def convert(self, text, file_prefix="", link_resolver=None, profile=None):
+        """Converts a page of Wikidot text to MediaWiki text.
+
+        Internal links are resolved to page titles by link_resolver (a LinkResolver built
+        once for the site); without one, links are left as they are written.  If given,
+        profile (a profiling.PageProfile) records the time and matches of each step.
+        Returns the converted text, the pages it links to and the files it links to.
+        """
+        if link_resolver is None:
+            link_resolver = LinkResolver()
+        if profile is not None:
+            profile.start(len(text))
+        if self.engine == "single-pass":
+            result = self._convert_single_pass(text, file_prefix, link_resolver, profile)
+        else:
+            result = self._convert_cascade(text, file_prefix, link_resolver, profile)
+        if profile is not None:
+            profile.finish(len(result[0]))
+        return result
+
+    def _protect(self, text, link_resolver):
+        """Returns the page's protected regions and the pages linked to by its includes."""
+        included_links = []
+        renderers = {}
+        if self.includer is not None:
+            def render_include(match):
+                converted_text, internal_links = self.includer.expand(
+                    match.group("include_page"), match.group("include_arguments"), self, link_resolver
+                )
+                included_links.extend(internal_links)
+                return converted_text
+            renderers["include"] = render_include
+        return ProtectedRegions(text, self.protected_kinds, renderers), included_links
+
+    def _convert_cascade(self, text, file_prefix, link_resolver, profile=None):
         text = '\n'+text+'\n'# add embed in newlines (makes regex replaces work better)
-        # first we search for [[code]] statements as we don't want any replacement to happen inside those code blocks!
-        code_blocks = dict()
-        code_blocks_found = re.findall(re.compile(r'(\[\[code( type="([\S]+)")?\]\]([\s\S ]*?)\[\[/code\]\])',re.MULTILINE), text)
-        for code_block_found in code_blocks_found:
-            tmp_hash = str(uuid.uuid4())
-            text = text.replace(code_block_found[0],tmp_hash,1) # replace code block with a hash - to fill it in later
-            code_blocks[tmp_hash] = code_block_found[-1]
-        for search, replacement in self.static_replacements.items():
-            text = text.replace(search,replacement,1)
-            
-        # search for any of the simpler replacements in the dictionary regex_replacements
-        for s_reg, r_reg in self.regex_replacements.items():
-            text = re.sub(re.compile(s_reg,re.MULTILINE),r_reg,text)
+        # first we protect [[code]] blocks (and math, raw text, <nowiki> and includes) as we
+        # don't want any replacement to happen inside them!
+        protected, included_links = self._protect(text, link_resolver)
+        text = protected.text
+        if profile is not None:
+            profile.lap("protect", len(protected))
+
+        # apply the simpler replacements from the rule registry
+        for rule in self.rules.active:
+            if profile is None:
+                text = rule.regex.sub(rule.replacement, text)
+            else:
+                text, matches = rule.regex.subn(rule.replacement, text)
+                profile.lap(rule.name, matches)
         # TITLES -- replace '+++ X' with '=== X ==='
-        for titles in re.finditer(r"^(\++)([^\n]*)$", text, re.MULTILINE):
-            header = ("=" * len(titles.group(1)))
-            text = text.replace(titles.group(0), header + (titles.group(2) + " ") + header)
-        # LISTS(*) -- replace '  *' with '***' and so on         
-        for stars in re.finditer(r"^([ \t]+)\*", text, re.MULTILINE):
-            text = text[:stars.start(1)] + ("*" * len(stars.group(1))) + text[stars.end(1):]
-        # LISTS(#) -- replace '  #' with '###' and so on
-        for hashes in re.finditer(r"^([ \t]+)\*", text, re.MULTILINE):
-            text = text[:hashes.start(1)] + ("#" * len(hashes.group(1))) + text[hashes.end(1):]
+        text, matches = _TITLE.subn(lambda title: self._convert_title(title.group(1), title.group(2)), text)
+        if profile is not None:
+            profile.lap("titles", matches)
 
         # Internal links -- replace [[[internal link]]] with [[internal link]], informed 
         # by mapping from fullname to title
-        lower_title_to_case_sensitive_title = {
-            title.lower(): title
-            for title in fullname_to_title.values()
-        }
-
-        def convert_internal_link(link: str):
-            # Trim whitespace at either end
-            link = link.strip()
-            # Convert underscores and at-signs to hypens (because that's what Wikidot did)
-            fullname = re.sub(r"[_@]", r"-", link)
-            # Convert link to lower case (because that's what Wikidot did)
-            fullname = fullname.lower()
-            if fullname in fullname_to_title:
-                return fullname_to_title[fullname]
-            else:
-                # Check if link references page title rather than its fullname
-                #title = re.sub(" ", "_", link)
-                lower_title = link.lower() # Wikidot seems to be case-insensitive
-                if lower_title in lower_title_to_case_sensitive_title:
-                    return lower_title_to_case_sensitive_title[lower_title]
-            print(f"  Failed to find page given the link '{link}'")
-            return link
-
         internal_links = []
-        for inlink in re.finditer(r"\[\[\[([\s\S]*?)\]\]\]", text):
-            inlink_contents = inlink.group(1)
-            # Check for existance of alternative text
-            pattern = re.compile(r"([\S\s]*?)[\s]*\|[\s]*([\S\s]*?)")
-            match = pattern.fullmatch(inlink_contents)
-            if match is not None:
-                # Contents contains alternative text
-                internal_page = convert_internal_link(match.group(1))
-                alt_text = match.group(2)
-                replacement_contents = f"[[{internal_page}|{alt_text}]]"
-            else:
-                # Contents must be only the name of the internal page
-                internal_page = convert_internal_link(inlink_contents)
-                replacement_contents = f"[[{internal_page}]]"
-            text = text.replace(inlink.group(0), replacement_contents)
+        def convert_internal_link(inlink):
+            replacement_contents, internal_page = self._convert_internal_link(inlink.group(1), link_resolver)
             internal_links.append(internal_page)
+            return replacement_contents
+        text = _INTERNAL_LINK.sub(convert_internal_link, text)
+        if profile is not None:
+            profile.lap("links", len(internal_links))
 
         # Image
         linked_files = []
-        for image in re.finditer(r"\[\[(f?[=<>]?)image\s*([\S\s]*?)\s*\]\]", text):
-            image_format = image.group(1)
-            image_contents = image.group(2)
-
-            # Process the horizontal alignment of the image
-            options = []
-            if image_format == "<" or image_format == "f<":
-                options.append("left")
-            if image_format == ">" or image_format == "f>":
-                options.append("right")
-            if image_format == "=":
-                options.append("center")
-            
-            # Process any attributes
-            filename = image_contents
-            for attribute in re.finditer(r"(\S*?)=\"([\S\s]*?)\"", image_contents, re.MULTILINE):
-                key = attribute.group(1)
-                value = attribute.group(2)
-                if key == "width":
-                    options.append(value)
-                if key == "height":
-                    options.append("x"+value)
-                if key == "size":
-                    if value == "square":
-                        options.append("75x75px")
-                    if value == "thumbnail":
-                        options.append("100px")
-                    if value == "small":
-                        options.append("240px")
-                    if value == "medium":
-                        options.append("500px")
-                    if value == "medium640":
-                        options.append("640px")
-                    if value == "large":
-                        options.append("1024px")
-                if key == "link":
-                    options.append(f"link={value.lstrip()}")
-                if key == "alt":
-                    options.append(f"alt={value.lstrip()}")
-                filename = re.sub(attribute.group(0), "", filename)
-
-            original_filename = filename.strip()
-            filename = file_prefix + original_filename
-            file_contents = "|".join([filename] + options)
-            text = text.replace(image.group(0), "[[File:" + file_contents + "]]")
+        def convert_image(image):
+            replacement_contents, original_filename = self._convert_image(
+                image.group(1), image.group(2), file_prefix
+            )
             linked_files.append(original_filename)
+            return replacement_contents
+        text, matches = _IMAGE.subn(convert_image, text)
+        if profile is not None:
+            profile.lap("images", matches)
 
         # Gallery
-        for gallery in re.finditer(r"\[\[gallery[ \S]*?\]\]([\S\s ]*)\[\[/gallery\]\]", text, re.MULTILINE):
-            replacement_gallery = "<gallery>\n"
-            gallery_content = gallery.group(1)
-            for filename_match in re.finditer(r"^: ([\S]*)", gallery_content, re.MULTILINE):
-                original_filename = filename_match.group(1)
-                filename = file_prefix + original_filename
-                replacement_gallery += filename + "\n"
-                linked_files.append(original_filename)
-            replacement_gallery += "</gallery>"
-            text = text.replace(gallery.group(0), replacement_gallery)
+        def convert_gallery(gallery):
+            replacement_gallery, original_filenames = self._convert_gallery(gallery.group(1), file_prefix)
+            linked_files.extend(original_filenames)
+            return replacement_gallery
+        text, matches = _GALLERY.subn(convert_gallery, text)
+        if profile is not None:
+            profile.lap("galleries", matches)
 
         # File
-        for file in re.finditer(r"\[\[file[\s]*([\S\s]*?)[\s]*\]\]", text, re.MULTILINE):
-            file_contents = file.group(1)
-            # Check for existance of alternative text
-            pattern = re.compile(r"([\S\s]*?)[\s]*\|[\s]*([\S\s]*?)")
-            match = pattern.fullmatch(file_contents)
-            if match is not None:
-                # Contents contains alternative text
-                original_filename = match.group(1)
-                filename = file_prefix + original_filename
-                alt_text = match.group(2)
-                replacement_contents = f"[[Media:{filename}|{alt_text}]]"
-            else:
-                # Contents must be only the filename
-                original_filename = file_contents
-                filename = file_prefix + original_filename
-                replacement_contents = f"[[Media:{filename}|{filename}]]"
-            text = text.replace(file.group(0), replacement_contents)
+        def convert_file(file):
+            replacement_contents, original_filename = self._convert_file(file.group(1), file_prefix)
             linked_files.append(original_filename)
+            return replacement_contents
+        text, matches = _FILE.subn(convert_file, text)
+        if profile is not None:
+            profile.lap("files", matches)
+
+        # Colors -- replace '##color|text##' with a span
+        text, matches = _COLORS.subn(
+            lambda color: self._convert_color(color.group("color_name"), color.group("color_body")), text
+        )
+        if profile is not None:
+            profile.lap("colors", matches)
+
+        # Tables and lists, line by line
+        text = self._convert_blocks(text, profile)
 
-        # START TABLE
-        for table in re.finditer(r"\[\[table([\s\S ]*?)\]\]", text):
-            #text = text.replace(table.group(0), "{|" + table.group(1))
-            text = text.replace(table.group(0), "{|")
-        # START ROW
-        for row in re.finditer(r"\[\[row([\s\S ]*?)\]\]", text):
-            #text = text.replace(row.group(0), "|-" + row.group(1))
-            text = text.replace(row.group(0), "|-")
-        # START CELL
-        for cell in re.finditer(r"\[\[cell([\s\S ]*?)\]\]", text):
-            #text = text.replace(cell.group(0), "|" + cell.group(1))
-            text = text.replace(cell.group(0), "|")
-        # ENDS
-        for end in re.finditer(r"\[\[/([\s\S ]*?)\]\]", text):
-            token = end.group(1)
-            if token == "table":
-                text = text.replace(end.group(0), "|}")
-            elif token == "row":
-                # end row tabs are not necessary in mediawiki
-                text = text.replace(end.group(0), "")
-            elif token == "cell":
-                # end cell tabs are not necessary in mediawiki
-                text = text.replace(end.group(0), "")
-
-        # Substitute back our code blocks
-        for tmp_hash, code in code_blocks.items():
-            code = "\n <nowiki>"+code+"</nowiki>"
-            text = text.replace(tmp_hash, code, 1)
-
-        # Process color corrections
-        startpos = 0
-        while -1 != startpos:
-            startpos = text.find("##", startpos)
-            pipepos = text.find("|", startpos + 2)
-            endpos = text.find("##", startpos + 2)
-            if startpos != -1 and pipepos != -1 and endpos != -1 and endpos > pipepos:
-                color = text[startpos + 2 : pipepos].strip()
-                colored = text[pipepos + 1 : endpos].strip()
-                text = text[: startpos] + "<span style=\"color:" + color + "\">" + colored + \
-                       "</span>" + text[endpos + 2 :]
-                startpos = endpos
-                
-        # Process math corrections
-        startpos = 0
-        while -1 != startpos:
-            startpos = text.find("[[$", startpos)
-            endpos = text.find("$]]", startpos)
-            if startpos != -1 and endpos != -1:
-                mathtext = text[startpos + 3 : endpos].strip()
-                text = text[: startpos] + "<math>" + mathtext + "</math>" + text[endpos + 3 :]
-                startpos = endpos
-
-        # Process table corrections
-        startpos = 0
-        while -1 != startpos:
-            startpos = text.find("\n||", startpos)
-            if startpos == -1:
-                break
-
-            # Find end of table
-            endpos = text.find("\n", startpos + 3)
-            while endpos < len(text) - 3 and "||" == text[endpos + 1: endpos + 3]:
-                endpos = text.find("\n", endpos + 3)
-
-            # Found bounds of text chunk: reformat table
-            fixup = text[startpos + 1 : endpos].replace("||~", "!!")
-            fixup = fixup.split("\n")
-            fixout = ["", "{| class=\"wikitable\""]
-            for i in range(len(fixup)):
-                if fixup[i][0 : 2] == "||" or fixup[i][0 : 2] == "!!":
-                    out = fixup[i].strip()[1 : ]
-                    fixout.append(out[ : -2 if out[-2 : ] in ["||", "!!"] else 0])
-                else:
-                    message = "Failed to parse item %d/%d: '%s'" % (i, len(fixup), fixup[i])
-                    raise Exception(message)
-                fixout.append("|}" if i == len(fixup) - 1 else "|-")
-
-            # Construct output table text
-            fullout = "\n".join(fixout)
-            text = text[ : startpos] + fullout + text[endpos : ]
-            startpos = startpos + len(fullout)
+        # Repair multi-newlines
+        text = _MULTI_NEWLINES.sub("\n\n", text)
+
+        # Substitute back our protected regions
+        text = protected.restore(text)
+
+        # Repair starting newlines
+        text = text.strip()
+        if profile is not None:
+            profile.lap("restore", len(protected))
+
+        return text, internal_links + included_links, linked_files
+
+    def _convert_blocks(self, text, profile=None):
+        """Converts '||' tables, [[table]] blocks and lists (see blocks.py)."""
+        parser = BlockParser()
+        text = parser.convert(text)
+        if profile is not None:
+            profile.lap("blocks", parser.matches)
+        return text
+
+    def _convert_title(self, level, title):
+        header = "=" * len(level)
+        return header + title + " " + header
+
+    def _convert_color(self, color, colored):
+        return "<span style=\"color:" + color.strip() + "\">" + colored.strip() + "</span>"
+
+    def _convert_internal_link(self, inlink_contents, link_resolver):
+        """Returns the MediaWiki link and the page it refers to."""
+        # Check for existance of alternative text
+        match = _ALT_TEXT.fullmatch(inlink_contents)
+        if match is not None:
+            # Contents contains alternative text
+            internal_page = link_resolver.resolve(match.group(1))
+            alt_text = match.group(2)
+            return f"[[{internal_page}|{alt_text}]]", internal_page
+        # Contents must be only the name of the internal page
+        internal_page = link_resolver.resolve(inlink_contents)
+        return f"[[{internal_page}]]", internal_page
+
+    def _convert_image(self, image_format, image_contents, file_prefix):
+        """Returns the MediaWiki image link and the name of the linked file."""
+        # Process the horizontal alignment of the image
+        options = []
+        if image_format == "<" or image_format == "f<":
+            options.append("left")
+        if image_format == ">" or image_format == "f>":
+            options.append("right")
+        if image_format == "=":
+            options.append("center")
+
+        # Process any attributes
+        filename = image_contents
+        for attribute in _IMAGE_ATTRIBUTE.finditer(image_contents):
+            key = attribute.group(1)
+            value = attribute.group(2)
+            if key == "width":
+                options.append(value)
+            if key == "height":
+                options.append("x"+value)
+            if key == "size":
+                if value == "square":
+                    options.append("75x75px")
+                if value == "thumbnail":
+                    options.append("100px")
+                if value == "small":
+                    options.append("240px")
+                if value == "medium":
+                    options.append("500px")
+                if value == "medium640":
+                    options.append("640px")
+                if value == "large":
+                    options.append("1024px")
+            if key == "link":
+                options.append(f"link={value.lstrip()}")
+            if key == "alt":
+                options.append(f"alt={value.lstrip()}")
+            filename = filename.replace(attribute.group(0), "")
+
+        original_filename = filename.strip()
+        filename = file_prefix + original_filename
+        file_contents = "|".join([filename] + options)
+        return "[[File:" + file_contents + "]]", original_filename
+
+    def _convert_gallery(self, gallery_content, file_prefix):
+        """Returns the MediaWiki gallery and the names of the linked files."""
+        replacement_gallery = "<gallery>\n"
+        original_filenames = []
+        for filename_match in _GALLERY_ITEM.finditer(gallery_content):
+            original_filename = filename_match.group(1)
+            filename = file_prefix + original_filename
+            replacement_gallery += filename + "\n"
+            original_filenames.append(original_filename)
+        replacement_gallery += "</gallery>"
+        return replacement_gallery, original_filenames
+
+    def _convert_file(self, file_contents, file_prefix):
+        """Returns the MediaWiki media link and the name of the linked file."""
+        # Check for existance of alternative text
+        match = _ALT_TEXT.fullmatch(file_contents)
+        if match is not None:
+            # Contents contains alternative text
+            original_filename = match.group(1)
+            filename = file_prefix + original_filename
+            alt_text = match.group(2)
+            return f"[[Media:{filename}|{alt_text}]]", original_filename
+        # Contents must be only the filename
+        original_filename = file_contents
+        filename = file_prefix + original_filename
+        return f"[[Media:{filename}|{filename}]]", original_filename
+
+    def _convert_single_pass(self, text, file_prefix, link_resolver, profile=None):
+        text = '\n'+text+'\n'# embed in newlines, as for the cascade
+        protected, included_links = self._protect(text, link_resolver)
+        text = protected.text
+        if profile is not None:
+            profile.lap("protect", len(protected))
+        state = _SinglePassState(file_prefix, link_resolver, profile)
+        output = []
+        self._render_range(text, 0, len(text), output, state)
+        text = "".join(output)
+        if profile is not None:
+            profile.lap("single-pass")
+        # Tables and lists span lines, so they are converted once the lines are complete
+        text = self._convert_blocks(text, profile)
 
         # Repair multi-newlines
-        text = re.sub(r"\n\n+", "\n\n", text, re.M)
+        text = _MULTI_NEWLINES.sub("\n\n", text)
+
+        # Substitute back our protected regions
+        text = protected.restore(text)
 
         # Repair starting newlines
         text = text.strip()
+        if profile is not None:
+            profile.lap("restore", len(protected))
+
+        linked_files = state.image_files + state.gallery_files + state.file_files
+        return text, state.internal_links + included_links, linked_files
+
+    def _render_range(self, text, start, end, output, state):
+        """Appends the conversion of text[start:end] to the list output."""
+        tokens, rules = self._get_single_pass_tokens()
+        position = start
+        for token in tokens.finditer(text, start, end):
+            output.append(text[position : token.start()])
+            position = token.end()
+            kind = token.lastgroup
+            if state.profile is not None:
+                state.profile.count(
+                    rules[int(kind[len("rule_"):])].name if kind.startswith("rule_") else _SINGLE_PASS_STEPS[kind]
+                )
+
+            if kind.startswith("rule_"):
+                rule = rules[int(kind[len("rule_"):])]
+                self._render_rule(rule, rule.regex.match(text, token.start(), end), output, state)
+            elif kind == "link":
+                replacement, internal_page = self._convert_internal_link(
+                    token.group("link_body"), state.link_resolver
+                )
+                output.append(replacement)
+                state.internal_links.append(internal_page)
+            elif kind == "image":
+                replacement, original_filename = self._convert_image(
+                    token.group("image_format"), token.group("image_body"), state.file_prefix
+                )
+                output.append(replacement)
+                state.image_files.append(original_filename)
+            elif kind == "gallery":
+                replacement, original_filenames = self._convert_gallery(
+                    token.group("gallery_body"), state.file_prefix
+                )
+                output.append(replacement)
+                state.gallery_files += original_filenames
+            elif kind == "file":
+                replacement, original_filename = self._convert_file(
+                    token.group("file_body"), state.file_prefix
+                )
+                output.append(replacement)
+                state.file_files.append(original_filename)
+            elif kind == "color":
+                output.append("<span style=\"color:" + token.group("color_name").strip() + "\">")
+                body_start, body_end = token.span("color_body")
+                # Match the cascade, which strips whitespace around the coloured text
+                while body_start < body_end and text[body_start].isspace():
+                    body_start += 1
+                while body_end > body_start and text[body_end - 1].isspace():
+                    body_end -= 1
+                self._render_range(text, body_start, body_end, output, state)
+                output.append("</span>")
+            elif kind == "title":
+                header = "=" * len(token.group("title_level"))
+                output.append(header)
+                self._render_range(text, token.start("title_body"), token.end("title_body"), output, state)
+                output.append(" " + header)
+
+        output.append(text[position : end])
+
+    def _get_single_pass_tokens(self):
+        """Returns the single-pass token pattern and the rules it includes.
+
+        The pattern is rebuilt only when the rule registry has changed.
+        """
+        if self._single_pass_version != self.rules.version:
+            rules = self.rules.active
+            alternatives = []
+            for i, rule in enumerate(rules):
+                flags = "".join(letter for flag, letter in _SCOPED_FLAGS if rule.regex.flags & flag)
+                if not rule.regex.flags & re.MULTILINE:
+                    flags += "-m"
+                pattern = f"(?{flags}:{rule.pattern})" if flags else rule.pattern
+                alternatives.append(f"(?P<rule_{i}>{pattern})")
+            alternatives += _SINGLE_PASS_STRUCTURE
+            self._single_pass_tokens = compile_pattern("|".join(alternatives), re.MULTILINE)
+            self._single_pass_rules = rules
+            self._single_pass_version = self.rules.version
+        return self._single_pass_tokens, self._single_pass_rules
 
-        return text, internal_links, linked_files
+    def _render_rule(self, rule, match, output, state):
+        """Appends a rule's replacement, converting the groups it copies from the match."""
+        if callable(rule.replacement):
+            output.append(rule.replacement(match))
+            return
+        for literal, group in _parse_template(rule.replacement):
+            if literal is not None:
+                # Escapes such as \n are expanded as by re.sub
+                output.append(match.expand(literal))
+            elif group == 0:
+                # Converting the whole match would apply the rule again, so it is copied as it is
+                output.append(match.group(0))
+            elif match.start(group) != -1:
+                self._render_range(match.string, match.start(group), match.end(group), output, state)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# A single entry point for converting a Wikidot site and uploading it to MediaWiki.  Each
+# command's module is only imported when the command is run, so that, for example,
+# converting a page does not load what uploading needs.
+
+import argparse
+import importlib
+
+# Command: (module that runs it, description)
+COMMANDS = {
+    "convert": ("convert", "Convert a Wikidot backup to MediaWiki pages and files"),
+    "upload": ("upload", "Upload converted pages and files to a MediaWiki site"),
+    "check": ("check", "Report the problems converting Wikidot pages would find, without writing anything"),
+}
+
+
+def make_parser():
+    """Returns the parser of wikidot2mw.py's command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="wikidot2mw",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(
+            f"  {command:<10} {description}" for command, (_, description) in COMMANDS.items()
+        ) + "\n\nRun 'wikidot2mw COMMAND --help' for the options of each command."
+    )
+    parser.add_argument("command", choices=COMMANDS, help="Command to run")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="Arguments of the command")
+    return parser
+
+
+def main(argv=None):
+    """Runs a command.  Returns the command's exit status."""
+    arguments = make_parser().parse_args(argv)
+    module = importlib.import_module(COMMANDS[arguments.command][0])
+    return module.main(arguments.arguments, prog=f"wikidot2mw {arguments.command}")
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+import bz2
+from datetime import datetime, timezone
+import gzip
+import os
+import re
+
+# The version of MediaWiki's export format that is written
+EXPORT_VERSION = "0.11"
+# Written to the destination with the export, listing the files for importImages.php
+FILE_MANIFEST = "files_to_import.tsv"
+
+# Characters that XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile("[^\t\n\r\u0020-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+def _open(path):
+    """Opens a file for writing text, compressed if its name ends in .gz or .bz2."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def _escape(text):
+    # As xml.sax.saxutils.escape, which takes much longer to import
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _xml_text(text):
+    return _escape(_INVALID_XML.sub("", text))
+
+
+class DumpWriter():
+    """Writes pages to a MediaWiki export XML file, as read by importDump.php.
+
+    Each page is written as soon as it is given, with a single revision, so memory use
+    does not grow with the size of the site.  Files ending in .gz or .bz2 are compressed,
+    which importDump.php also reads.
+    """
+    def __init__(self, path, username="Wikidot-to-MediaWiki", comment="Converted from Wikidot"):
+        self.path = path
+        self.username = username
+        self.comment = comment
+        self.pages = 0
+        self._file = _open(path)
+        self._file.write(
+            f'<mediawiki xmlns="http://www.mediawiki.org/xml/export-{EXPORT_VERSION}/" '
+            + f'version="{EXPORT_VERSION}" xml:lang="en">\n'
+        )
+
+    def write_page(self, title, text, timestamp=None):
+        """Writes a page in the main namespace.  timestamp is a datetime, by default now."""
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc)
+        text = _INVALID_XML.sub("", text)
+        self._file.write(
+            "  <page>\n"
+            + f"    <title>{_xml_text(title)}</title>\n"
+            + "    <ns>0</ns>\n"
+            + "    <revision>\n"
+            + f"      <timestamp>{timestamp.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}</timestamp>\n"
+            + f"      <contributor><username>{_xml_text(self.username)}</username></contributor>\n"
+            + f"      <comment>{_xml_text(self.comment)}</comment>\n"
+            + "      <model>wikitext</model>\n"
+            + "      <format>text/x-wiki</format>\n"
+            + f'      <text xml:space="preserve" bytes="{len(text.encode("utf-8"))}">'
+        )
+        self._file.write(_escape(text))
+        self._file.write("</text>\n    </revision>\n  </page>\n")
+        self.pages += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.write("</mediawiki>\n")
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_file_manifest(upload_dir, manifest_path):
+    """Lists the files in upload_dir, with their sizes and pages, in a tab-separated file.
+
+    Returns the set of the files' extensions, which importImages.php must be given.
+    """
+    extensions = set()
+    with os.scandir(upload_dir) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file())
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write("name\tsize\tpage\n")
+        for name in names:
+            page = name.split("__", 1)[0] if "__" in name else ""
+            f.write(f"{name}\t{os.path.getsize(os.path.join(upload_dir, name))}\t{page}\n")
+            if "." in name:
+                extensions.add(name.rsplit(".", 1)[1].lower())
+    return extensions
+
+
+def import_commands(dump_path, upload_dir, extensions):
+    """Returns the maintenance commands that import the dump and the files on the wiki's server."""
+    commands = [f"php maintenance/importDump.php --report=1000 {dump_path}"]
+    if extensions:
+        commands.append(
+            f"php maintenance/importImages.php --extensions={','.join(sorted(extensions))} --skip-dupes {upload_dir}"
+        )
+    commands.append("php maintenance/rebuildrecentchanges.php")
+    return commands